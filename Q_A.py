@@ -1,13 +1,14 @@
 from fastapi import FastAPI
-import boto3
 import json
 from botocore.exceptions import ClientError
 import os 
-import pandas as pd
-import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
 from rag import generate_embeddings
+from aws_clients import invoke_model_async, lazy_client, run_on_bedrock_pool, text_parses
+from knowledge_base import KnowledgeBaseCache
+from answer_cache import AnswerCallStats, SemanticAnswerCache
 import io
+import time
+import asyncio
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -18,19 +19,15 @@ AWS_SECRET_KEY = os.getenv("AWS_SECRET_KEY")
 AWS_REGION = os.getenv("AWS_REGION")
 BUCKET_NAME = os.getenv("BUCKET_NAME")
 
-# Initialize AWS clients
-bedrock = boto3.client(
-    'bedrock-runtime',
-    aws_access_key_id=AWS_ACCESS_KEY,
-    aws_secret_access_key=AWS_SECRET_KEY,
-    region_name=AWS_REGION
-)
-s3 = boto3.client(
-    "s3",
-    aws_access_key_id=AWS_ACCESS_KEY,
-    aws_secret_access_key=AWS_SECRET_KEY,
-    region_name=AWS_REGION
-) 
+# QA validation settings
+QA_VALIDATION_CONCURRENCY = int(os.getenv("QA_VALIDATION_CONCURRENCY", "5"))
+QA_SCORING_BATCH_SIZE = int(os.getenv("QA_SCORING_BATCH_SIZE", "0"))
+
+# Shared, pooled AWS clients, created on first use
+s3 = lazy_client("s3")
+knowledge_base = KnowledgeBaseCache(s3)
+answer_cache = SemanticAnswerCache()
+knowledge_base.on_reload(answer_cache.on_knowledge_base_reload)
 app = FastAPI()
 
 async def extract_customer_qa_pairs(transcription):
@@ -69,19 +66,19 @@ async def extract_customer_qa_pairs(transcription):
 
     try:
         # Invoke Claude model
-        response = bedrock.invoke_model(
-            modelId="anthropic.claude-3-sonnet-20240229-v1:0",
-            body=json.dumps({
+        response_body = await invoke_model_async(
+            "anthropic.claude-3-sonnet-20240229-v1:0",
+            {
                 "anthropic_version": "bedrock-2023-05-31",
                 "max_tokens": 2000,
+                "temperature": 0,
                 "messages": [{
                     "role": "user",
                     "content": [{"type": "text", "text": prompt}]
                 }]
-            })
+            },
+            validate=text_parses(_parse_evaluation_json)
         )
-
-        response_body = json.loads(response['body'].read().decode('utf-8'))
         response_text = response_body['content'][0]['text']
         
         print("\nRaw Claude Response:")
@@ -112,32 +109,31 @@ async def extract_customer_qa_pairs(transcription):
     
 
 
-async def query_csv_and_ask_claude(query, top_n=5):
-    """Search CSV for relevant info and generate answer using Claude"""
+async def query_csv_and_ask_claude(query, top_n=5, cache_stats=None):
+    """Search CSV for relevant info and generate answer using Claude, reusing answers to near-identical questions"""
     try:
-        # 1. Fetch CSV data (replace with your S3 implementation)
-        df = fetch_csv_from_s3()  # Changed from Azure Blob to S3
-        if df is None or df.empty:
+        # 1. Get the cached knowledge base (embeddings already parsed and normalized)
+        try:
+            kb = await asyncio.to_thread(knowledge_base.get)
+        except Exception as e:
+            print(f"Error fetching CSV from S3: {str(e)}")
+            kb = None
+        if kb is None or len(kb) == 0:
             return "Error: Could not fetch knowledge base data."
 
         # 2. Generate embedding for the query
-        query_embedding = generate_embeddings(query)
+        query_embedding = await run_on_bedrock_pool(generate_embeddings, query)
         if not query_embedding:
             return "Error: Failed to generate query embedding."
 
-        # 3. Calculate cosine similarities
-        similarities = []
-        for idx, row in df.iterrows():
-            try:
-                embedding = np.array(eval(row['embedding']))
-                similarity = cosine_similarity([query_embedding], [embedding])[0][0]
-                similarities.append((idx, similarity, row['file_name'], row['text']))
-            except:
-                continue  # Skip rows with invalid embeddings
-
-        # 4. Get top N most relevant results
-        similarities.sort(key=lambda x: x[1], reverse=True)
-        top_results = similarities[:top_n]
+        # Reuse the answer to a near-identical question asked against the same knowledge base
+        cached_answer = answer_cache.lookup(query_embedding, kb.etag, cache_stats)
+        if cached_answer is not None:
+            return cached_answer
+        started = time.perf_counter()
+
+        # 3-4. Embedding and BM25 rankings fused, keep the top N
+        top_results = kb.search(query_embedding, top_n, query_text=query)
         relevant_texts = [result[3] for result in top_results]
 
         # 5. Prepare prompt for Claude
@@ -158,9 +154,9 @@ async def query_csv_and_ask_claude(query, top_n=5):
         \n\nAssistant: Here is the answer to your question:"""
 
         # 6. Call Claude model
-        response = bedrock.invoke_model(
-            modelId="anthropic.claude-3-haiku-20240307-v1:0",  # Using Haiku for cost efficiency
-            body=json.dumps({
+        response_body = await invoke_model_async(
+            "anthropic.claude-3-haiku-20240307-v1:0",  # Using Haiku for cost efficiency
+            {
                 "anthropic_version": "bedrock-2023-05-31",
                 "max_tokens": 300,
                 "temperature": 0.3,
@@ -169,63 +165,80 @@ async def query_csv_and_ask_claude(query, top_n=5):
                     "role": "user",
                     "content": [{"type": "text", "text": prompt}]
                 }]
-            })
+            }
         )
 
         # 7. Process response
-        response_body = json.loads(response['body'].read().decode('utf-8'))
-        return response_body['content'][0]['text'].strip()
+        answer = response_body['content'][0]['text'].strip()
+        answer_cache.store(query_embedding, answer, kb.etag, time.perf_counter() - started)
+        return answer
 
     except Exception as e:
         print(f"Error in query_csv_and_ask_claude: {str(e)}")
         return f"Error: {str(e)}"
 
 
-# Helper function to fetch CSV from S3 (replace with your implementation)
+# Helper function to fetch the knowledge base CSV from S3
 def fetch_csv_from_s3():
-    """Fetch CSV from S3 bucket"""
+    """Return the knowledge base DataFrame, downloading it only when the S3 object changed"""
     try:
-        # Example implementation - adjust based on your S3 setup
-        response = s3.get_object(Bucket=BUCKET_NAME, Key="validation_data/MS_1_MS_2_MS_3_merged.csv")
-        return pd.read_csv(io.StringIO(response['Body'].read().decode('utf-8')))
+        return knowledge_base.get().df
     except Exception as e:
         print(f"Error fetching CSV from S3: {str(e)}")
         return None 
 
 
+def _parse_evaluation_json(claude_response: str):
+    """Extract the JSON object or array Claude returned, ignoring any text around it."""
+    starts = [i for i in (claude_response.find("{"), claude_response.find("[")) if i != -1]
+    if starts:
+        json_start = min(starts)
+        closing = "}" if claude_response[json_start] == "{" else "]"
+        json_end = claude_response.rindex(closing) + 1
+        claude_response = claude_response[json_start:json_end]
+    return json.loads(claude_response)
 
-async def validate_answer(data):
-    if not isinstance(data, dict) or "qa_pairs" not in data:
-        return json.dumps({"error": "Invalid data format. Expected a dictionary with key 'qa_pairs'."}, indent=4)
 
-    qa_pairs = data["qa_pairs"]
-    if not isinstance(qa_pairs, list):
-        return json.dumps({"error": "Invalid data format. 'qa_pairs' should be a list of dictionaries."}, indent=4)
-
-    results = []
-
-    for qa_pair in qa_pairs:
-        if not isinstance(qa_pair, dict):
-            results.append({"error": "Invalid QA pair format. Expected a dictionary."})
-            continue
+async def _invoke_scoring_model(prompt: str, max_tokens: int = 1000, prefill: str = "") -> str:
+    """
+    Run a scoring prompt and return Claude's text.
 
-        customer_question = qa_pair.get("customer_question", "").strip()
-        executive_answer = qa_pair.get("executive_answer", "").strip()
-       
-        if not customer_question or not executive_answer:
-            results.append({"error": "Missing required fields in qa_pair."})
-            continue
+    `prefill` starts the assistant's reply (e.g. "{" or "["), so Claude continues the
+    JSON instead of writing a preamble; it is put back in front of the returned text.
+    """
+    messages = [{
+        "role": "user",
+        "content": [{"type": "text", "text": prompt}]
+    }]
+    if prefill:
+        messages.append({"role": "assistant", "content": [{"type": "text", "text": prefill}]})
+    response_body = await invoke_model_async(
+        "anthropic.claude-3-sonnet-20240229-v1:0",
+        {
+            "anthropic_version": "bedrock-2023-05-31",
+            "max_tokens": max_tokens,
+            "temperature": 0,
+            "messages": messages
+        },
+        validate=text_parses(lambda text: _parse_evaluation_json(prefill + text))
+    )
+    return prefill + response_body['content'][0]['text']
+
+
+async def _get_ai_answer(customer_question: str, cache_stats: AnswerCallStats = None) -> str:
+    # Get AI-generated answer (using Claude)
+    try:
+        ai_answer = await query_csv_and_ask_claude(customer_question, cache_stats=cache_stats)  # Changed to Claude version
+        if not ai_answer:
+            ai_answer = "No AI answer available."  # Fallback in case query fails
+    except Exception as e:
+        ai_answer = f"Error fetching AI answer: {str(e)}"
+    return ai_answer
 
-        # Get AI-generated answer (using Claude)
-        try:
-            ai_answer = await query_csv_and_ask_claude(customer_question)  # Changed to Claude version
-            if not ai_answer:
-                ai_answer = "No AI answer available."  # Fallback in case query fails
-        except Exception as e:
-            ai_answer = f"Error fetching AI answer: {str(e)}"
 
-        # Construct prompt for scoring using Claude
-        scoring_prompt = f"""\n\nHuman: You are evaluating a sales conversation. Here are the details:
+async def _score_answer(customer_question: str, ai_answer: str, executive_answer: str) -> dict:
+    # Construct prompt for scoring using Claude
+    scoring_prompt = f"""\n\nHuman: You are evaluating a sales conversation. Here are the details:
 
 Customer Question: "{customer_question}"
 
@@ -250,58 +263,161 @@ Return your evaluation in this exact JSON format:
     "improvements": ["list", "of", "suggestions"],
     "strengths": ["list", "of", "positive", "aspects"]
 }}
-
-\n\nAssistant: {{
 """
 
-        try:
-            # Call Claude model
-            response = bedrock.invoke_model(
-                modelId="anthropic.claude-3-sonnet-20240229-v1:0",
-                body=json.dumps({
-                    "anthropic_version": "bedrock-2023-05-31",
-                    "max_tokens": 1000,
-                    "temperature": 0.3,
-                    "messages": [{
-                        "role": "user",
-                        "content": [{"type": "text", "text": scoring_prompt}]
-                    }]
-                })
-            )
-
-            response_body = json.loads(response['body'].read().decode('utf-8'))
-            claude_response = response_body['content'][0]['text']
-            
-            # Extract JSON from Claude's response
-            try:
-                if "{" in claude_response and "}" in claude_response:
-                    json_start = claude_response.index("{")
-                    json_end = claude_response.rindex("}") + 1
-                    claude_response = claude_response[json_start:json_end]
-                
-                evaluation = json.loads(claude_response)
-            except json.JSONDecodeError:
-                evaluation = {
-                    "score": 0,
-                    "improvements": ["Could not parse evaluation"],
-                    "strengths": []
-                }
+    try:
+        claude_response = await _invoke_scoring_model(scoring_prompt, prefill="{")
 
-        except Exception as e:
-            evaluation = {
+        # Extract JSON from Claude's response
+        try:
+            evaluation = _parse_evaluation_json(claude_response)
+            if not isinstance(evaluation, dict):
+                raise ValueError("Expected a JSON object")
+            return evaluation
+        except (json.JSONDecodeError, ValueError):
+            return {
                 "score": 0,
-                "improvements": [f"Error during evaluation: {str(e)}"],
+                "improvements": ["Could not parse evaluation"],
                 "strengths": []
             }
 
-        # Append results
-        results.append({
+    except Exception as e:
+        return {
+            "score": 0,
+            "improvements": [f"Error during evaluation: {str(e)}"],
+            "strengths": []
+        }
+
+
+async def _score_answers_batch(items: list) -> list:
+    """
+    Score several (question, ai_answer, executive_answer) items with a single prompt.
+    Falls back to scoring each item on its own if the batched response can't be used.
+    """
+    pairs_text = "\n".join(
+        f"""Pair {i}:
+Customer Question: "{question}"
+AI-Generated Ideal Answer: "{ai_answer}"
+Salesperson's Actual Answer: "{executive_answer}"
+"""
+        for i, (question, ai_answer, executive_answer) in enumerate(items, start=1)
+    )
+    scoring_prompt = f"""\n\nHuman: You are evaluating a sales conversation. Below are {len(items)} customer questions, each with an AI-generated ideal answer and the salesperson's actual answer.
+
+{pairs_text}
+For every pair, evaluate how well the salesperson's answer matches the ideal answer in terms of:
+1. Accuracy of information
+2. Clarity of explanation
+3. Relevance to the question
+4. Professional tone
+5. Completeness of response
+
+Provide for each pair:
+1. A score from 0-10 (10 being perfect)
+2. Specific improvements needed (if any)
+3. What was done well
+
+Return a JSON array with exactly {len(items)} evaluations, in the same order as the pairs, in this exact format:
+[
+    {{
+        "pair": <pair number>,
+        "score": <number>,
+        "improvements": ["list", "of", "suggestions"],
+        "strengths": ["list", "of", "positive", "aspects"]
+    }}
+]
+"""
+
+    try:
+        claude_response = await _invoke_scoring_model(scoring_prompt, 600 * len(items), prefill="[")
+        evaluations = _parse_evaluation_json(claude_response)
+        if isinstance(evaluations, list) and len(evaluations) == len(items) and all(isinstance(e, dict) for e in evaluations):
+            return sorted(evaluations, key=lambda e: e.get("pair", 0)) if all("pair" in e for e in evaluations) else evaluations
+        print(f"Batched scoring returned {len(evaluations) if isinstance(evaluations, list) else 'no'} evaluations for {len(items)} pairs, scoring individually")
+    except Exception as e:
+        print(f"Batched scoring failed, scoring individually: {str(e)}")
+
+    return list(await asyncio.gather(*(_score_answer(*item) for item in items)))
+
+
+async def validate_answer(data, concurrency: int = None, batch_size: int = None, on_result=None,
+                          cache_stats: AnswerCallStats = None):
+    """
+    Score each executive answer against an AI-generated ideal answer.
+
+    Pairs are validated concurrently, at most `concurrency` at a time
+    (QA_VALIDATION_CONCURRENCY), and results keep the order of `qa_pairs`.
+    With `batch_size` (QA_SCORING_BATCH_SIZE) above 1, pairs are scored
+    `batch_size` at a time in one prompt instead of one prompt per pair.
+    `on_result(index, result)` is called as soon as each pair is scored.
+    Answer cache hits and the generation time they saved are counted in
+    `cache_stats`, if given, so the caller can keep them with the call.
+    """
+    if not isinstance(data, dict) or "qa_pairs" not in data:
+        return json.dumps({"error": "Invalid data format. Expected a dictionary with key 'qa_pairs'."}, indent=4)
+
+    qa_pairs = data["qa_pairs"]
+    if not isinstance(qa_pairs, list):
+        return json.dumps({"error": "Invalid data format. 'qa_pairs' should be a list of dictionaries."}, indent=4)
+
+    concurrency = concurrency or QA_VALIDATION_CONCURRENCY
+    batch_size = batch_size if batch_size is not None else QA_SCORING_BATCH_SIZE
+    semaphore = asyncio.Semaphore(concurrency)
+    cache_stats = cache_stats if cache_stats is not None else AnswerCallStats()
+
+    results = [None] * len(qa_pairs)
+    valid = []  # (index, question, answer)
+
+    for i, qa_pair in enumerate(qa_pairs):
+        if not isinstance(qa_pair, dict):
+            results[i] = {"error": "Invalid QA pair format. Expected a dictionary."}
+            continue
+
+        customer_question = qa_pair.get("customer_question", "").strip()
+        executive_answer = qa_pair.get("executive_answer", "").strip()
+       
+        if not customer_question or not executive_answer:
+            results[i] = {"error": "Missing required fields in qa_pair."}
+            continue
+
+        valid.append((i, customer_question, executive_answer))
+
+    def scored(i, customer_question, executive_answer, ai_answer, evaluation):
+        results[i] = {
             "customer_question": customer_question,
             "executive_answer": executive_answer,
             "ai_answer": ai_answer,
             "score": evaluation.get("score", 0),
             "improvements": evaluation.get("improvements", []),
             "strengths": evaluation.get("strengths", [])
-        })
-
+        }
+        if on_result:
+            on_result(i, results[i])
+
+    async def validate_pair(i, question, executive_answer):
+        async with semaphore:
+            ai_answer = await _get_ai_answer(question, cache_stats)
+            evaluation = await _score_answer(question, ai_answer, executive_answer)
+        scored(i, question, executive_answer, ai_answer, evaluation)
+
+    async def ai_answer_for(question):
+        async with semaphore:
+            return await _get_ai_answer(question, cache_stats)
+
+    async def score_batch(batch):
+        async with semaphore:
+            evaluations = await _score_answers_batch([(question, ai_answer, answer) for _, question, answer, ai_answer in batch])
+        for (i, question, executive_answer, ai_answer), evaluation in zip(batch, evaluations):
+            scored(i, question, executive_answer, ai_answer, evaluation)
+
+    # Results are stored at their original index, so they keep the order of qa_pairs
+    if batch_size and batch_size > 1:
+        ai_answers = await asyncio.gather(*(ai_answer_for(question) for _, question, _ in valid))
+        items = [(i, question, executive_answer, ai_answer) for (i, question, executive_answer), ai_answer in zip(valid, ai_answers)]
+        batches = [items[i:i + batch_size] for i in range(0, len(items), batch_size)]
+        await asyncio.gather(*(score_batch(b) for b in batches))
+    else:
+        await asyncio.gather(*(validate_pair(i, question, executive_answer) for i, question, executive_answer in valid))
+
+    print(f"Answer cache for this call: {cache_stats.as_dict()}")
     return json.dumps(results, indent=4, ensure_ascii=False)
@@ -0,0 +1,148 @@
+"""
+Agent-keyed secondary index on the calls table.
+
+Every stored call carries a top-level `agent_key` (the sales agent's name,
+stripped and lower-cased, as the dashboard aggregates group it), and the
+global secondary index AGENT_INDEX on (agent_key, CreatedOn) lets the per-agent
+endpoints Query one agent's calls instead of scanning the whole table. Calls
+without an agent name get no agent_key and are left out of the index, as are
+calls without a string CreatedOn (older rows may only have `created_on`).
+
+The index projects only the keys and `Summary`, so transcripts are not copied.
+Creating the index copies the existing agent_key values, and a Query cannot tell
+a call that was never keyed from one that doesn't exist. So, once the ingest code
+writing agent_key is deployed, set it on older calls first and then add the index:
+
+    python agent_index.py backfill
+    python agent_index.py create-index
+
+create-index refuses to run while any call still has a missing or stale agent_key.
+"""
+import os
+import argparse
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+from dotenv import load_dotenv
+from aws_clients import get_client, get_resource
+from aggregates import CALLS_TABLE, normalize_agent_name
+from dynamo_scan import projection, scan_items
+
+load_dotenv()
+
+AGENT_INDEX = os.getenv("AGENT_INDEX", "agent_key-CreatedOn-index")
+
+
+def agent_key(summary) -> str:
+    """The agent_key for a call's Summary; empty when the call names no agent."""
+    agent = summary.get("Sales_Agent") if isinstance(summary, dict) else None
+    return normalize_agent_name(agent.get("Name")) if isinstance(agent, dict) else ""
+
+
+def query_agent_calls(agent_name: str, attributes, table=None):
+    """
+    Yield one agent's calls, oldest first, projected to `attributes`.
+
+    Only keys and Summary paths can be read through the index.
+    """
+    table = table or get_resource("dynamodb").Table(CALLS_TABLE)
+    kwargs = {
+        "IndexName": AGENT_INDEX,
+        "KeyConditionExpression": Key("agent_key").eq(normalize_agent_name(agent_name)),
+        **projection(attributes)
+    }
+    while True:
+        page = table.query(**kwargs)
+        yield from page.get("Items", [])
+        if "LastEvaluatedKey" not in page:
+            return
+        kwargs["ExclusiveStartKey"] = page["LastEvaluatedKey"]
+
+
+def _needs_key(item) -> bool:
+    return agent_key(item.get("Summary")) != item.get("agent_key", "")
+
+
+def create_index(force: bool = False):
+    if not force:
+        pending = sum(1 for item in scan_items(CALLS_TABLE, ["agent_key", "Summary.Sales_Agent.Name"])
+                      if _needs_key(item))
+        if pending:
+            raise SystemExit(f"❌ {pending} calls have a missing or stale agent_key and would be left out of "
+                             f"{AGENT_INDEX}; run `python agent_index.py backfill` first (or pass --force)")
+
+    client = get_client("dynamodb")
+    description = client.describe_table(TableName=CALLS_TABLE)["Table"]
+    if any(index["IndexName"] == AGENT_INDEX for index in description.get("GlobalSecondaryIndexes", [])):
+        print(f"{AGENT_INDEX} already exists on {CALLS_TABLE}")
+        return
+
+    index = {
+        "IndexName": AGENT_INDEX,
+        "KeySchema": [{"AttributeName": "agent_key", "KeyType": "HASH"},
+                      {"AttributeName": "CreatedOn", "KeyType": "RANGE"}],
+        "Projection": {"ProjectionType": "INCLUDE", "NonKeyAttributes": ["Summary"]}
+    }
+    # Provisioned tables need capacity for the index too; reuse the table's
+    if description.get("BillingModeSummary", {}).get("BillingMode") != "PAY_PER_REQUEST":
+        throughput = description["ProvisionedThroughput"]
+        index["ProvisionedThroughput"] = {"ReadCapacityUnits": throughput["ReadCapacityUnits"],
+                                          "WriteCapacityUnits": throughput["WriteCapacityUnits"]}
+    client.update_table(
+        TableName=CALLS_TABLE,
+        AttributeDefinitions=[{"AttributeName": "agent_key", "AttributeType": "S"},
+                              {"AttributeName": "CreatedOn", "AttributeType": "S"}],
+        GlobalSecondaryIndexUpdates=[{"Create": index}]
+    )
+    print(f"✅ Creating {AGENT_INDEX} on {CALLS_TABLE}; per-agent queries fall back to scans until it is ACTIVE")
+
+
+def backfill():
+    """
+    Set (or correct) agent_key on every stored call; safe to re-run and to run while calls are ingested.
+
+    Keyed calls without a string CreatedOn are reported: the index cannot hold them.
+    """
+    table = get_resource("dynamodb").Table(CALLS_TABLE)
+    updated = checked = failed = 0
+    unindexed = []
+    for item in scan_items(CALLS_TABLE, ["call_id", "agent_key", "CreatedOn", "Summary.Sales_Agent.Name"]):
+        checked += 1
+        key = agent_key(item.get("Summary"))
+        if key and not isinstance(item.get("CreatedOn"), str):
+            unindexed.append(item["call_id"])
+        if not _needs_key(item):
+            continue
+        try:
+            if key:
+                table.update_item(Key={"call_id": item["call_id"]}, UpdateExpression="SET agent_key = :key",
+                                  ExpressionAttributeValues={":key": key})
+            else:
+                table.update_item(Key={"call_id": item["call_id"]}, UpdateExpression="REMOVE agent_key")
+            updated += 1
+        except ClientError as e:
+            failed += 1
+            print(f"⚠️ Could not set agent_key on {item['call_id']}: {e}")
+    print(f"✅ Updated agent_key on {updated} of {checked} calls")
+    if failed:
+        print(f"⚠️ {failed} updates failed; re-run the backfill before create-index")
+    if unindexed:
+        print(f"⚠️ {len(unindexed)} calls name an agent but have no string CreatedOn, so {AGENT_INDEX} cannot "
+              f"hold them and per-agent lists will miss them, e.g. {', '.join(map(str, unindexed[:5]))}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Agent index tools")
+    commands = parser.add_subparsers(dest="command", required=True)
+    create = commands.add_parser("create-index", help=f"Add the {AGENT_INDEX} index to {CALLS_TABLE}")
+    create.add_argument("--force", action="store_true", help="Skip the check that every call has its agent_key")
+    commands.add_parser("backfill", help="Set agent_key on calls stored before it was written at ingest")
+    args = parser.parse_args(argv)
+
+    if args.command == "create-index":
+        create_index(args.force)
+    elif args.command == "backfill":
+        backfill()
+
+
+if __name__ == "__main__":
+    main()
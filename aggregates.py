@@ -0,0 +1,373 @@
+"""
+Dashboard aggregates maintained at write time.
+
+Every stored call adds its contribution to a few small items in a separate
+DynamoDB table with atomic `UpdateItem ADD`, so the dashboard endpoints in
+db.py read a handful of items instead of scanning every call:
+
+    (global, global)     totals for all calls
+    (agent, <agent key>) totals for one sales agent
+    (day, YYYY-MM-DD)    totals for calls created that day
+
+Distinct counts (unique phone numbers, emails, customer names and agents) are
+kept with one reference-counted marker item per value; the aggregate counter
+moves only when a value's first reference appears or its last one goes away.
+Each call's contribution is remembered, so re-processing a call replaces its
+previous contribution instead of counting it twice. The counters, references and
+remembered contribution of a call change in one transaction.
+
+Create the table and rebuild it from the stored calls with:
+
+    python aggregates.py create-table
+    python aggregates.py backfill
+"""
+import os
+import argparse
+from decimal import Decimal
+from datetime import datetime
+from collections import defaultdict
+from botocore.exceptions import ClientError
+from dotenv import load_dotenv
+from aws_clients import get_resource
+from dynamo_scan import scan_items
+
+load_dotenv()
+
+CALLS_TABLE = os.getenv("CALLS_TABLE", "call_audit")
+AGGREGATES_TABLE = os.getenv("AGGREGATES_TABLE", "call_audit_aggregates")
+
+GLOBAL = ("global", "global")
+AGENT_SCORE_FIELDS = {
+    "professionalism": "Professionalism",
+    "product_knowledge": "Product_Knowledge",
+    "communication_skills": "Communication_Skills",
+    "problem_solving": "Problem_Solving"
+}
+# Summary attributes a call's contribution is computed from; used to project scans
+CALL_ATTRIBUTES = [
+    "call_id", "CreatedOn", "Summary.Sales_Agent", "Summary.Customer", "Summary.Sales_Agent_Score",
+    "Summary.score", "Summary.Sentiment_Scores", "Summary.Call_Completion_Status"
+]
+
+
+def aggregates_table():
+    return get_resource("dynamodb").Table(AGGREGATES_TABLE)
+
+
+def normalize_agent_name(name) -> str:
+    """The key calls are grouped by agent with: stripped and lower-cased, empty when missing."""
+    return str(name).strip().lower() if name is not None else ""
+
+
+def _provided(value) -> str:
+    value = str(value or "").strip().lower()
+    return "" if value == "not provided" else value
+
+
+def _number(value):
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def call_date(created_on):
+    """YYYY-MM-DD of a CreatedOn value, or None if it can't be parsed."""
+    if not isinstance(created_on, str):
+        return None
+    for parse in (datetime.fromisoformat, lambda value: datetime.strptime(value, "%Y-%m-%d %H:%M:%S")):
+        try:
+            return parse(created_on).date().isoformat()
+        except ValueError:
+            continue
+    return None
+
+
+def _scope_id(scope) -> str:
+    return f"{scope[0]}:{scope[1]}"
+
+
+def _scope(scope_id: str):
+    pk, sk = scope_id.split(":", 1)
+    return pk, sk
+
+
+def call_contribution(item: dict):
+    """
+    What one stored call adds to the aggregates.
+
+    Returns:
+        Tuple of (counters, distinct, labels): counters maps scope id -> {field: amount},
+        distinct maps scope id -> {kind: value}, labels maps scope id -> display name
+    """
+    summary = item.get("Summary") or {}
+    customer = summary.get("Customer") or {}
+    agent_name = (summary.get("Sales_Agent") or {}).get("Name")
+    agent_key = normalize_agent_name(agent_name)
+
+    counts = {"calls": 1}
+    if summary.get("Call_Completion_Status") == "True":
+        counts["completed"] = 1
+
+    values = {"phone": _provided(customer.get("Contact_Details")),
+              "email": _provided(customer.get("Email")),
+              "customer": _provided(customer.get("Name"))}
+    for kind, value in values.items():
+        if value:
+            counts[f"{kind}_received"] = 1
+
+    # Dominant sentiment of the call, ties going to positive, then negative
+    sentiment = summary.get("Sentiment_Scores") or {}
+    pos, neg, neu = (int(_number(sentiment.get(f"{name}_Sentiment_Score")) or 0) for name in ("Positive", "Negative", "Neutral"))
+    if pos >= neg and pos >= neu:
+        counts["positive_calls"] = 1
+    elif neg >= pos and neg >= neu:
+        counts["negative_calls"] = 1
+    else:
+        counts["neutral_calls"] = 1
+
+    # Agent rankings only use calls that have both an agent and agent scores
+    agent_scores = summary.get("Sales_Agent_Score")
+    if agent_key and isinstance(agent_scores, dict):
+        score = _number(summary.get("score"))
+        if score is not None:
+            counts["score_sum"], counts["score_count"] = score, 1
+        for field, source in AGENT_SCORE_FIELDS.items():
+            value = _number(agent_scores.get(source))
+            if value is not None:
+                counts[f"{field}_sum"], counts[f"{field}_count"] = value, 1
+
+    counters = {_scope_id(GLOBAL): dict(counts)}
+    distinct = {_scope_id(GLOBAL): {kind: value for kind, value in values.items() if value}}
+    labels = {}
+    if agent_key:
+        distinct[_scope_id(GLOBAL)]["agent"] = agent_key
+        agent_scope = _scope_id(("agent", agent_key))
+        counters[agent_scope] = dict(counts)
+        distinct[agent_scope] = {kind: value for kind, value in values.items() if value}
+        labels[agent_scope] = str(agent_name).strip()
+    day = call_date(item.get("CreatedOn"))
+    if day:
+        counters[_scope_id(("day", day))] = {"calls": 1}
+    return counters, distinct, labels
+
+
+def _to_dynamo(value):
+    return Decimal(str(value)) if isinstance(value, float) else value
+
+
+def _update_action(table_name: str, scope, amounts: dict, label: str = None):
+    """Transaction Update adding amounts to one aggregate item (creating it if needed), or None if nothing changes."""
+    amounts = {field: amount for field, amount in amounts.items() if amount}
+    if not amounts and not label:
+        return None
+    names, values, adds = {}, {}, []
+    for i, (field, amount) in enumerate(sorted(amounts.items())):
+        names[f"#f{i}"] = field
+        values[f":v{i}"] = _to_dynamo(amount)
+        adds.append(f"#f{i} :v{i}")
+    expression = f"ADD {', '.join(adds)}" if adds else ""
+    if label:
+        names["#label"] = "label"
+        values[":label"] = label
+        expression = f"SET #label = if_not_exists(#label, :label) {expression}".strip()
+    return {"Update": {
+        "TableName": table_name,
+        "Key": {"pk": scope[0], "sk": scope[1]},
+        "UpdateExpression": expression,
+        "ExpressionAttributeNames": names,
+        "ExpressionAttributeValues": values
+    }}
+
+
+def _record_call_once(item: dict, table):
+    counters, distinct, labels = call_contribution(item)
+    marker = {"pk": f"call#{item['call_id']}", "sk": "contribution"}
+    previous = table.get_item(Key=marker, ConsistentRead=True).get("Item") or {}
+    old_counters, old_distinct = previous.get("counters", {}), previous.get("distinct", {})
+
+    deltas = defaultdict(lambda: defaultdict(float))
+    for scope_id in set(counters) | set(old_counters):
+        new, old = counters.get(scope_id, {}), old_counters.get(scope_id, {})
+        for field in set(new) | set(old):
+            deltas[scope_id][field] += _number(new.get(field, 0)) - _number(old.get(field, 0))
+
+    # Reference counts of distinct values; each update is conditioned on the count read here
+    actions = []
+    for scope_id in set(distinct) | set(old_distinct):
+        new, old = distinct.get(scope_id, {}), old_distinct.get(scope_id, {})
+        for kind in set(new) | set(old):
+            if new.get(kind) == old.get(kind):
+                continue
+            for value, delta in ((old.get(kind), -1), (new.get(kind), 1)):
+                if not value:
+                    continue
+                key = {"pk": f"distinct#{scope_id}#{kind}", "sk": value}
+                refs = int((table.get_item(Key=key, ConsistentRead=True).get("Item") or {}).get("refs", 0))
+                actions.append({"Update": {
+                    "TableName": table.name,
+                    "Key": key,
+                    "UpdateExpression": "ADD refs :d",
+                    "ConditionExpression": "attribute_not_exists(refs) OR refs = :refs",
+                    "ExpressionAttributeValues": {":d": delta, ":refs": refs}
+                }})
+                # The scope's distinct counter moves on the first reference and the last removal
+                if (delta > 0 and refs == 0) or (delta < 0 and refs == 1):
+                    deltas[scope_id][f"distinct_{kind}"] += delta
+
+    for scope_id in set(deltas) | set(labels):
+        action = _update_action(table.name, _scope(scope_id), deltas.get(scope_id, {}), labels.get(scope_id))
+        if action:
+            actions.append(action)
+
+    # The marker is written in the same transaction, and only if no one replaced it since it was read
+    revision = int(previous.get("revision", 0))
+    actions.append({"Put": {
+        "TableName": table.name,
+        "Item": {
+            **marker,
+            "revision": revision + 1,
+            "counters": {scope_id: {field: _to_dynamo(amount) for field, amount in fields.items()}
+                         for scope_id, fields in counters.items()},
+            "distinct": distinct
+        },
+        "ConditionExpression": "attribute_not_exists(pk)" if not previous else
+                               ("#revision = :revision" if "revision" in previous else "attribute_not_exists(#revision)"),
+        **({"ExpressionAttributeNames": {"#revision": "revision"}} if previous else {}),
+        **({"ExpressionAttributeValues": {":revision": revision}} if "revision" in previous else {})
+    }})
+    table.meta.client.transact_write_items(TransactItems=actions)
+
+
+def record_call(item: dict, table=None, attempts: int = 5):
+    """
+    Add a stored call to the aggregates, replacing its earlier contribution if it was recorded before.
+
+    All counters, distinct references and the call's contribution marker change in one
+    transaction, so a crash either applies the whole contribution or none of it, and
+    retrying the job never counts a call twice. A transaction cancelled by a concurrent
+    update of the same marker or reference counts is recomputed and retried.
+    """
+    table = table or aggregates_table()
+    for attempt in range(attempts):
+        try:
+            _record_call_once(item, table)
+            return
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "TransactionCanceledException" or attempt == attempts - 1:
+                raise
+
+
+def _plain(item: dict) -> dict:
+    """Aggregate item with Decimals turned into ints/floats and missing counters read as 0."""
+    plain = defaultdict(int)
+    for key, value in (item or {}).items():
+        if isinstance(value, Decimal):
+            value = int(value) if value == value.to_integral_value() else float(value)
+        plain[key] = value
+    return plain
+
+
+def get_totals(agent_name=None, table=None) -> dict:
+    """Totals for one agent, or for all calls when agent_name is empty or "all"."""
+    table = table or aggregates_table()
+    if agent_name and str(agent_name).lower() != "all":
+        if not normalize_agent_name(agent_name):
+            return _plain({})
+        key = {"pk": "agent", "sk": normalize_agent_name(agent_name)}
+    else:
+        key = {"pk": GLOBAL[0], "sk": GLOBAL[1]}
+    return _plain(table.get_item(Key=key).get("Item"))
+
+
+def list_totals(kind: str, table=None) -> list:
+    """Every aggregate item of one kind ("agent" or "day")."""
+    table = table or aggregates_table()
+    kwargs = {"KeyConditionExpression": "pk = :pk", "ExpressionAttributeValues": {":pk": kind}}
+    items = []
+    while True:
+        page = table.query(**kwargs)
+        items.extend(_plain(item) for item in page.get("Items", []))
+        if "LastEvaluatedKey" not in page:
+            return items
+        kwargs["ExclusiveStartKey"] = page["LastEvaluatedKey"]
+
+
+def create_table():
+    dynamodb = get_resource("dynamodb")
+    try:
+        table = dynamodb.create_table(
+            TableName=AGGREGATES_TABLE,
+            KeySchema=[{"AttributeName": "pk", "KeyType": "HASH"}, {"AttributeName": "sk", "KeyType": "RANGE"}],
+            AttributeDefinitions=[{"AttributeName": "pk", "AttributeType": "S"},
+                                  {"AttributeName": "sk", "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST"
+        )
+        table.wait_until_exists()
+        print(f"✅ Created {AGGREGATES_TABLE}")
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ResourceInUseException":
+            raise
+        print(f"{AGGREGATES_TABLE} already exists")
+
+
+def backfill():
+    """
+    Recompute every aggregate from the stored calls and replace the table's contents.
+
+    Calls stored while this runs may be missed; run it while ingestion is paused.
+    """
+    table = aggregates_table()
+
+    totals = defaultdict(lambda: defaultdict(float))
+    references = defaultdict(int)       # (scope id, kind, value) -> refs
+    labels, markers = {}, []
+    for item in scan_items(CALLS_TABLE, CALL_ATTRIBUTES):
+        counters, distinct, call_labels = call_contribution(item)
+        for scope_id, fields in counters.items():
+            for field, amount in fields.items():
+                totals[scope_id][field] += amount
+        for scope_id, kinds in distinct.items():
+            for kind, value in kinds.items():
+                references[(scope_id, kind, value)] += 1
+        for scope_id, label in call_labels.items():
+            labels.setdefault(scope_id, label)
+        markers.append({"pk": f"call#{item['call_id']}", "sk": "contribution",
+                        "counters": {scope_id: {field: _to_dynamo(amount) for field, amount in fields.items()}
+                                     for scope_id, fields in counters.items()},
+                        "distinct": distinct})
+    for scope_id, kind, _ in references:
+        totals[scope_id][f"distinct_{kind}"] += 1
+
+    with table.batch_writer(overwrite_by_pkeys=["pk", "sk"]) as batch:
+        for item in scan_items(AGGREGATES_TABLE, ["pk", "sk"]):
+            batch.delete_item(Key={"pk": item["pk"], "sk": item["sk"]})
+    with table.batch_writer(overwrite_by_pkeys=["pk", "sk"]) as batch:
+        for scope_id, fields in totals.items():
+            pk, sk = _scope(scope_id)
+            item = {"pk": pk, "sk": sk, **{field: _to_dynamo(int(v) if v == int(v) else v) for field, v in fields.items()}}
+            if scope_id in labels:
+                item["label"] = labels[scope_id]
+            batch.put_item(Item=item)
+        for (scope_id, kind, value), refs in references.items():
+            batch.put_item(Item={"pk": f"distinct#{scope_id}#{kind}", "sk": value, "refs": refs})
+        for marker in markers:
+            batch.put_item(Item=marker)
+    print(f"✅ Aggregated {len(markers)} calls into {len(totals)} totals")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Dashboard aggregate tools")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("create-table", help=f"Create the {AGGREGATES_TABLE} table")
+    commands.add_parser("backfill", help="Rebuild all aggregates from the stored calls")
+    args = parser.parse_args(argv)
+
+    if args.command == "create-table":
+        create_table()
+    elif args.command == "backfill":
+        backfill()
+
+
+if __name__ == "__main__":
+    main()
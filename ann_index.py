@@ -0,0 +1,243 @@
+"""
+Approximate nearest-neighbour search for the knowledge base embeddings.
+
+IVFIndex clusters the normalized embeddings with spherical k-means and only
+scores the rows in the `nprobe` clusters closest to the query. ExactIndex is the
+brute-force baseline. Both expose `search(query, k) -> (rows, scores)` so the
+knowledge base can use either one.
+
+The IVF index is built offline and saved next to the embeddings in the current
+EmbeddingStore version (kb_build.py --build-index builds it into a new version
+before that version goes live). Each file is replaced atomically and the
+centroids are written last, so a reader sees either no index or a complete one:
+
+    python ann_index.py build kb_store --nlist 1024
+    python ann_index.py evaluate kb_store --nprobe 1 4 8 16 32 --k 5
+"""
+import os
+import time
+import argparse
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+KB_ANN_NPROBE = int(os.getenv("KB_ANN_NPROBE", "8"))
+
+CENTROIDS_FILE = "ivf_centroids.npy"
+LISTS_FILE = "ivf_lists.npy"
+OFFSETS_FILE = "ivf_offsets.npy"
+
+
+def _normalize_query(query, dim: int):
+    query = np.asarray(query, dtype=np.float32)
+    norm = np.linalg.norm(query)
+    if norm == 0 or query.shape[0] != dim:
+        return None
+    return query / norm
+
+
+def _top_k_scores(scores: np.ndarray, k: int):
+    if k < scores.shape[0]:
+        candidates = np.argpartition(-scores, k)[:k]
+    else:
+        candidates = np.arange(scores.shape[0])
+    return candidates[np.argsort(-scores[candidates])]
+
+
+class ExactIndex:
+    """Brute-force cosine search over a row-normalized matrix."""
+
+    def __init__(self, matrix: np.ndarray):
+        self.matrix = matrix
+
+    def search(self, query, k: int):
+        empty = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32))
+        if self.matrix.shape[0] == 0 or k <= 0:
+            return empty
+        query = _normalize_query(query, self.matrix.shape[1])
+        if query is None:
+            return empty
+        scores = self.matrix @ query
+        order = _top_k_scores(scores, k)
+        return order, scores[order]
+
+
+class IVFIndex:
+    """
+    Inverted-file index: rows are grouped by their nearest k-means centroid and
+    a query only scores the rows of its `nprobe` nearest centroids.
+    """
+
+    def __init__(self, matrix: np.ndarray, centroids: np.ndarray, lists: np.ndarray, offsets: np.ndarray,
+                 nprobe: int = KB_ANN_NPROBE):
+        self.matrix = matrix
+        self.centroids = centroids
+        self.lists = lists
+        self.offsets = offsets
+        self.nprobe = nprobe
+
+    @property
+    def nlist(self) -> int:
+        return self.centroids.shape[0]
+
+    @classmethod
+    def build(cls, matrix: np.ndarray, nlist: int = None, iterations: int = 20, sample_size: int = 100_000,
+              seed: int = 0, nprobe: int = KB_ANN_NPROBE):
+        """Train spherical k-means on a sample of the rows and assign every row to a list."""
+        rows = matrix.shape[0]
+        if rows == 0:
+            raise ValueError("Cannot build an index over an empty matrix")
+        nlist = min(nlist or max(1, int(4 * np.sqrt(rows))), rows)
+        rng = np.random.default_rng(seed)
+
+        sample = matrix[np.sort(rng.choice(rows, size=min(rows, max(sample_size, nlist)), replace=False))]
+        sample = np.asarray(sample, dtype=np.float32)
+        centroids = sample[rng.choice(sample.shape[0], size=nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            counts = np.bincount(assignment, minlength=nlist)
+            sums = np.zeros_like(centroids)
+            order = np.argsort(assignment, kind="stable")
+            present = np.flatnonzero(counts)
+            starts = np.concatenate(([0], np.cumsum(counts[present])[:-1]))
+            sums[present] = np.add.reduceat(sample[order], starts, axis=0)
+            empty = counts == 0
+            # Re-seed empty clusters with random sample rows
+            sums[empty] = sample[rng.choice(sample.shape[0], size=int(empty.sum()))]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            norms[norms == 0] = 1
+            centroids = (sums / norms).astype(np.float32)
+
+        assignment = np.empty(rows, dtype=np.int64)
+        for start in range(0, rows, 65536):
+            block = np.asarray(matrix[start:start + 65536], dtype=np.float32)
+            assignment[start:start + 65536] = np.argmax(block @ centroids.T, axis=1)
+
+        lists = np.argsort(assignment, kind="stable").astype(np.int64)
+        offsets = np.zeros(nlist + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(assignment, minlength=nlist))
+        return cls(matrix, centroids, lists, offsets, nprobe)
+
+    def save(self, path: str):
+        # The centroids file marks a complete index, so it goes last
+        for name, array in ((LISTS_FILE, self.lists), (OFFSETS_FILE, self.offsets), (CENTROIDS_FILE, self.centroids)):
+            tmp = os.path.join(path, f".{name}.tmp")
+            with open(tmp, "wb") as f:
+                np.save(f, array)
+            os.replace(tmp, os.path.join(path, name))
+
+    @staticmethod
+    def exists(path: str) -> bool:
+        return all(os.path.exists(os.path.join(path, name)) for name in (CENTROIDS_FILE, LISTS_FILE, OFFSETS_FILE))
+
+    @classmethod
+    def load(cls, path: str, matrix: np.ndarray, nprobe: int = KB_ANN_NPROBE):
+        """Open a saved index with mmap, or return None if the directory has none."""
+        if not cls.exists(path):
+            return None
+        return cls(
+            matrix,
+            np.load(os.path.join(path, CENTROIDS_FILE)),
+            np.load(os.path.join(path, LISTS_FILE), mmap_mode="r"),
+            np.load(os.path.join(path, OFFSETS_FILE)),
+            nprobe
+        )
+
+    def search(self, query, k: int, nprobe: int = None):
+        empty = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32))
+        if k <= 0:
+            return empty
+        query = _normalize_query(query, self.centroids.shape[1])
+        if query is None:
+            return empty
+
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        probes = _top_k_scores(self.centroids @ query, nprobe)
+        candidates = np.concatenate([self.lists[self.offsets[p]:self.offsets[p + 1]] for p in probes])
+        if candidates.shape[0] == 0:
+            return empty
+        candidates.sort()  # Sequential reads from the mapped matrix
+        scores = self.matrix[candidates] @ query
+        order = _top_k_scores(scores, k)
+        return candidates[order], scores[order]
+
+
+def evaluate(matrix: np.ndarray, index: IVFIndex, queries: np.ndarray, k: int = 5, nprobes=(1, 4, 8, 16)):
+    """
+    Compare an IVF index against exact search.
+
+    Returns:
+        List of dicts with nprobe, recall@k and p50/p95 latency in milliseconds;
+        the exact baseline is reported with nprobe None.
+    """
+    exact = ExactIndex(matrix)
+
+    def timed(fn):
+        results, timings = [], []
+        for query in queries:
+            started = time.perf_counter()
+            results.append(fn(query)[0])
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        return results, timings[len(timings) // 2], timings[max(int(len(timings) * 0.95) - 1, 0)]
+
+    truth, p50, p95 = timed(lambda q: exact.search(q, k))
+    report = [{"nprobe": None, "recall_at_k": 1.0, "p50_ms": round(p50, 3), "p95_ms": round(p95, 3)}]
+    for nprobe in nprobes:
+        found, p50, p95 = timed(lambda q: index.search(q, k, nprobe=nprobe))
+        hits = sum(len(set(a.tolist()) & set(b.tolist())) for a, b in zip(found, truth))
+        total = sum(len(b) for b in truth)
+        report.append({
+            "nprobe": nprobe,
+            "recall_at_k": round(hits / total, 4) if total else 0.0,
+            "p50_ms": round(p50, 3),
+            "p95_ms": round(p95, 3)
+        })
+    return report
+
+
+def sample_queries(matrix: np.ndarray, count: int, noise: float = 0.05, seed: int = 1):
+    """Perturbed knowledge base rows, a stand-in for real question embeddings."""
+    rng = np.random.default_rng(seed)
+    rows = np.asarray(matrix[rng.choice(matrix.shape[0], size=min(count, matrix.shape[0]), replace=False)])
+    return rows + rng.standard_normal(rows.shape).astype(np.float32) * noise
+
+
+def main(argv=None):
+    from embedding_store import EmbeddingStore
+
+    parser = argparse.ArgumentParser(description="Build and evaluate the knowledge base ANN index")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="Build an IVF index for the current store version")
+    build.add_argument("store_dir")
+    build.add_argument("--nlist", type=int, default=None)
+    build.add_argument("--iterations", type=int, default=20)
+    check = commands.add_parser("evaluate", help="Report recall@k and latency against exact search")
+    check.add_argument("store_dir")
+    check.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    check.add_argument("--k", type=int, default=5)
+    check.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    store = EmbeddingStore(args.store_dir)
+    path = os.path.join(args.store_dir, store.version)
+
+    if args.command == "build":
+        started = time.perf_counter()
+        index = IVFIndex.build(store.matrix, nlist=args.nlist, iterations=args.iterations)
+        index.save(path)
+        print(f"✅ Built IVF index with {index.nlist} lists over {len(store)} rows in {time.perf_counter() - started:.1f}s")
+
+    elif args.command == "evaluate":
+        index = IVFIndex.load(path, store.matrix)
+        if index is None:
+            raise SystemExit(f"No IVF index in {path}, run the build command first")
+        queries = sample_queries(store.matrix, args.queries)
+        for row in evaluate(store.matrix, index, queries, args.k, args.nprobe):
+            label = "exact" if row["nprobe"] is None else f"nprobe={row['nprobe']}"
+            print(f"{label:>12}  recall@{args.k} {row['recall_at_k']:.4f}  p50 {row['p50_ms']:8.3f} ms  p95 {row['p95_ms']:8.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+import os
+import time
+import threading
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "5000"))
+# Minimum cosine similarity between two questions for a cached answer to be reused
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+
+
+class AnswerCallStats:
+    """Hit/latency counters for a single validate_answer call."""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.latency_saved = 0.0
+
+    def as_dict(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "latency_saved_seconds": round(self.latency_saved, 3)
+        }
+
+
+class SemanticAnswerCache:
+    """
+    Reuses ideal answers for questions that are semantically the same.
+
+    Question embeddings are kept in a normalized float32 matrix; a lookup is one
+    matrix-vector product and returns the stored answer when the best match is
+    at or above `threshold` and was answered against the same knowledge base
+    version. Only a knowledge base reload clears the cache; an answer generated
+    against any other version is not stored. Once full, the least recently used
+    entry is replaced.
+    """
+
+    def __init__(self, max_entries: int = ANSWER_CACHE_SIZE, threshold: float = ANSWER_CACHE_THRESHOLD):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "invalidations": 0, "evictions": 0, "stale": 0,
+                       "latency_saved_seconds": 0.0}
+        self._reset(None)
+
+    def _reset(self, kb_version):
+        self.kb_version = kb_version
+        self._matrix = None
+        self._answers = []
+        self._latencies = []
+        self._last_used = np.zeros(self.max_entries, dtype=np.float64)
+        self._size = 0
+
+    def invalidate(self, kb_version=None):
+        """Drop every entry; called whenever the knowledge base is reloaded."""
+        with self._lock:
+            if self._size:
+                self._stats["invalidations"] += 1
+            self._reset(kb_version)
+
+    def on_knowledge_base_reload(self, snapshot):
+        self.invalidate(snapshot.etag)
+
+    @staticmethod
+    def _normalize(embedding):
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    def lookup(self, embedding, kb_version, call_stats: AnswerCallStats = None):
+        """Return the cached answer for a near-identical question, or None."""
+        vector = self._normalize(embedding)
+        with self._lock:
+            answer = None
+            if vector is not None and self._size and kb_version == self.kb_version and vector.shape[0] == self._matrix.shape[1]:
+                scores = self._matrix[:self._size] @ vector
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    answer = self._answers[best]
+                    self._last_used[best] = time.monotonic()
+                    self._stats["hits"] += 1
+                    self._stats["latency_saved_seconds"] += self._latencies[best]
+                    if call_stats:
+                        call_stats.hits += 1
+                        call_stats.latency_saved += self._latencies[best]
+            if answer is None:
+                self._stats["misses"] += 1
+                if call_stats:
+                    call_stats.misses += 1
+            return answer
+
+    def store(self, embedding, answer: str, kb_version, latency: float):
+        """Remember an answer together with how long it took to generate; answers from another version are dropped."""
+        vector = self._normalize(embedding)
+        if vector is None:
+            return
+        with self._lock:
+            if kb_version != self.kb_version:
+                self._stats["stale"] += 1
+                return
+            if self._matrix is None:
+                self._matrix = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+            elif vector.shape[0] != self._matrix.shape[1]:
+                return
+
+            if self._size < self.max_entries:
+                slot = self._size
+                self._size += 1
+                self._answers.append(answer)
+                self._latencies.append(latency)
+            else:
+                slot = int(np.argmin(self._last_used))
+                self._answers[slot] = answer
+                self._latencies[slot] = latency
+                self._stats["evictions"] += 1
+            self._matrix[slot] = vector
+            self._last_used[slot] = time.monotonic()
+            self._stats["stores"] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = self._size
+            stats["kb_version"] = self.kb_version
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        stats["latency_saved_seconds"] = round(stats["latency_saved_seconds"], 3)
+        return stats
@@ -0,0 +1,216 @@
+import os
+import struct
+
+# Bytes read from each end of a file; enough for every header handled below
+HEADER_BYTES = 64 * 1024
+
+MP3_BITRATES = {
+    (3, 3): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (3, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (3, 1): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (2, 3): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (2, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (2, 1): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+MP3_SAMPLE_RATES = {3: [44100, 48000, 32000], 2: [22050, 24000, 16000], 0: [11025, 12000, 8000]}
+# MP3 has no magic number: the first frame must start within this many bytes of the
+# audio (after any ID3v2 tag) and be followed by MP3_MIN_FRAMES - 1 matching frames
+MP3_SYNC_WINDOW = 4096
+MP3_MIN_FRAMES = 3
+
+
+def _not_mp3(body: bytes) -> bool:
+    """Containers that are never MP3: MP4/M4A/3GP, WebM/Matroska, AMR, AIFF and ASF/WMA."""
+    return (body[4:8] == b"ftyp" or body[:4] in (b"\x1a\x45\xdf\xa3", b"FORM") or body[:5] == b"#!AMR"
+            or body[:4] == b"\x30\x26\xb2\x75")
+
+
+def probe_bytes(head: bytes, total_size: int, tail: bytes = None):
+    """
+    Read audio metadata from the first and last bytes of a file without decoding it.
+
+    Supports WAV (RIFF fmt/data chunks), MP3 (Xing/Info/VBRI frame counts or the
+    constant bitrate), FLAC (STREAMINFO) and Ogg Vorbis/Opus (last granule position).
+    Anything else (M4A, WebM, AMR, ...) returns None so the caller can decode it.
+
+    Returns:
+        Dictionary with format, channels, sample_rate and duration_seconds,
+        or None when the format is not recognised
+    """
+    if head[:4] == b"RIFF" and head[8:12] == b"WAVE":
+        return wav_metadata(head, total_size)
+
+    audio_start = _id3v2_size(head)
+    body = head[audio_start:]
+    if body[:4] == b"fLaC":
+        return flac_metadata(body)
+    if body[:4] == b"OggS":
+        # A head that covers the whole file doubles as its tail
+        return ogg_metadata(body, tail if tail is not None or len(head) < total_size else head)
+    if _not_mp3(body):
+        return None
+    return mp3_metadata(head, audio_start, total_size, tail)
+
+
+def probe_file(file_path: str):
+    """Probe a local file by reading only its first and last HEADER_BYTES."""
+    total_size = os.path.getsize(file_path)
+    with open(file_path, "rb") as f:
+        head = f.read(HEADER_BYTES)
+        tail = None
+        if total_size > HEADER_BYTES:
+            f.seek(total_size - HEADER_BYTES)
+            tail = f.read()
+    return probe_bytes(head, total_size, tail)
+
+
+def wav_metadata(head: bytes, total_size: int):
+    """Read channels, sample rate and duration from the RIFF header of a WAV file."""
+    if len(head) < 12 or head[:4] != b"RIFF" or head[8:12] != b"WAVE":
+        return None
+
+    fmt = None
+    offset = 12
+    while offset + 8 <= len(head):
+        chunk_id = head[offset:offset + 4]
+        chunk_size = struct.unpack_from("<I", head, offset + 4)[0]
+        body = offset + 8
+        if chunk_id == b"fmt " and body + 16 <= len(head):
+            channels, sample_rate, byte_rate = struct.unpack_from("<HII", head, body + 2)
+            fmt = {"channels": channels, "sample_rate": sample_rate, "byte_rate": byte_rate}
+        elif chunk_id == b"data" and fmt:
+            # Streaming writers often leave the size at 0 or 0xFFFFFFFF, fall back to the real size
+            data_size = chunk_size
+            if data_size in (0, 0xFFFFFFFF) or body + data_size > total_size:
+                data_size = total_size - body
+            duration = data_size / fmt["byte_rate"] if fmt["byte_rate"] else None
+            return {"format": "wav", "channels": fmt["channels"], "sample_rate": fmt["sample_rate"], "duration_seconds": duration}
+        offset = body + chunk_size + (chunk_size & 1)
+    return None
+
+
+def flac_metadata(body: bytes):
+    """Read the STREAMINFO block that always follows the fLaC marker."""
+    if len(body) < 26 or body[4] & 0x7F != 0:
+        return None
+    # Sample rate (20 bits), channels - 1 (3), bits per sample - 1 (5), total samples (36)
+    packed = int.from_bytes(body[18:26], "big")
+    sample_rate = packed >> 44
+    channels = ((packed >> 41) & 0x7) + 1
+    total_samples = packed & 0xFFFFFFFFF
+    duration = total_samples / sample_rate if sample_rate and total_samples else None
+    return {"format": "flac", "channels": channels, "sample_rate": sample_rate, "duration_seconds": duration}
+
+
+def ogg_metadata(body: bytes, tail: bytes = None):
+    """Read the Vorbis/Opus identification header and the granule position of the last page."""
+    if len(body) < 28:
+        return None
+    segments = body[26]
+    packet = body[27 + segments:]
+    pre_skip = 0
+    if packet[:7] == b"\x01vorbis" and len(packet) >= 16:
+        channels = packet[11]
+        sample_rate = struct.unpack_from("<I", packet, 12)[0]
+        granule_rate = sample_rate
+        fmt = "ogg"
+    elif packet[:8] == b"OpusHead" and len(packet) >= 16:
+        channels = packet[9]
+        pre_skip = struct.unpack_from("<H", packet, 10)[0]
+        sample_rate = struct.unpack_from("<I", packet, 12)[0]
+        # Opus granule positions always count 48 kHz samples
+        granule_rate = 48000
+        fmt = "opus"
+    else:
+        return None
+
+    duration = None
+    last_page = tail.rfind(b"OggS") if tail else -1
+    if last_page != -1 and last_page + 14 <= len(tail):
+        granule = struct.unpack_from("<q", tail, last_page + 6)[0]
+        if granule > 0:
+            duration = max(granule - pre_skip, 0) / granule_rate
+    return {"format": fmt, "channels": channels, "sample_rate": sample_rate, "duration_seconds": duration}
+
+
+def mp3_metadata(head: bytes, audio_start: int, total_size: int, tail: bytes = None):
+    """Use the Xing/Info or VBRI frame count when present, otherwise the constant bitrate."""
+    offset, frame = _find_mp3_frame(head, audio_start)
+    if frame is None:
+        return None
+    version, layer, bitrate, sample_rate, channels, samples_per_frame = frame
+
+    frames = None
+    xing_offset = offset + 4 + ((32 if channels == 2 else 17) if version == 3 else (17 if channels == 2 else 9))
+    if head[xing_offset:xing_offset + 4] in (b"Xing", b"Info"):
+        flags = struct.unpack_from(">I", head, xing_offset + 4)[0]
+        if flags & 0x1:
+            frames = struct.unpack_from(">I", head, xing_offset + 8)[0]
+    elif head[offset + 36:offset + 40] == b"VBRI":
+        frames = struct.unpack_from(">I", head, offset + 50)[0]
+
+    if frames:
+        duration = frames * samples_per_frame / sample_rate
+    else:
+        audio_bytes = total_size - offset
+        if tail and tail[-128:-125] == b"TAG":
+            audio_bytes -= 128
+        duration = audio_bytes * 8 / (bitrate * 1000)
+    return {"format": "mp3", "channels": channels, "sample_rate": sample_rate, "duration_seconds": duration}
+
+
+def _id3v2_size(head: bytes) -> int:
+    """Length of a leading ID3v2 tag, or 0 if there is none."""
+    if len(head) < 10 or head[:3] != b"ID3":
+        return 0
+    size = (head[6] << 21) | (head[7] << 14) | (head[8] << 7) | head[9]
+    footer = 10 if head[5] & 0x10 else 0
+    return 10 + size + footer
+
+
+def _parse_mp3_header(head: bytes, offset: int):
+    if offset + 4 > len(head) or head[offset] != 0xFF or head[offset + 1] & 0xE0 != 0xE0:
+        return None
+    b1, b2, b3 = head[offset + 1], head[offset + 2], head[offset + 3]
+    version = (b1 >> 3) & 0x3
+    layer = (b1 >> 1) & 0x3
+    bitrate_index = b2 >> 4
+    rate_index = (b2 >> 2) & 0x3
+    if version == 1 or layer == 0 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+
+    bitrate = MP3_BITRATES[(3 if version == 3 else 2, layer)][bitrate_index]
+    sample_rate = MP3_SAMPLE_RATES[version][rate_index]
+    channels = 1 if b3 >> 6 == 3 else 2
+    padding = (b2 >> 1) & 0x1
+    if layer == 3:  # Layer I
+        samples_per_frame = 384
+        frame_length = (12 * bitrate * 1000 // sample_rate + padding) * 4
+    else:
+        samples_per_frame = 1152 if version == 3 or layer == 2 else 576
+        frame_length = samples_per_frame // 8 * bitrate * 1000 // sample_rate + padding
+    return version, layer, bitrate, sample_rate, channels, samples_per_frame, frame_length
+
+
+def _frames_follow(head: bytes, offset: int, header) -> bool:
+    """True if MP3_MIN_FRAMES - 1 frames of the same version, layer and sample rate follow (or the head ends)."""
+    for _ in range(MP3_MIN_FRAMES - 1):
+        offset += header[-1]
+        if offset + 4 > len(head):
+            return True
+        following = _parse_mp3_header(head, offset)
+        if not following or following[:2] != header[:2] or following[3] != header[3]:
+            return False
+    return True
+
+
+def _find_mp3_frame(head: bytes, start: int):
+    """Find the first frame header within MP3_SYNC_WINDOW of `start` that begins a run of valid frames."""
+    end = min(len(head), start + MP3_SYNC_WINDOW)
+    offset = head.find(b"\xff", start, end)
+    while offset != -1 and offset + 4 <= len(head):
+        header = _parse_mp3_header(head, offset)
+        if header and _frames_follow(head, offset, header):
+            return offset, header[:-1]
+        offset = head.find(b"\xff", offset + 1, end)
+    return None, None
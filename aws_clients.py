@@ -0,0 +1,277 @@
+"""
+Shared AWS clients.
+
+Every module gets its boto3 clients from here instead of building its own, so
+a process holds one client per service with one tuned connection pool, TCP
+keep-alive and adaptive retries. Clients are created on first use; modules that
+want a module-level name use `lazy_client`, `lazy_resource` or `lazy_table` so
+importing them never builds a client or touches the network. Bedrock calls pass the per-model limiter in
+rate_limiter.py, and from async code go through `invoke_model_async`, which
+runs them on a dedicated thread pool: long model
+calls neither block the event loop nor starve the default executor used for
+S3, SQLite and other short blocking work. Identical requests are answered from
+the response cache in llm_cache.py before they reach the limiter.
+`stream_model_async` delivers generated text as it arrives.
+"""
+import os
+import json
+import time
+import asyncio
+import threading
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+import boto3
+from botocore.config import Config
+from dotenv import load_dotenv
+from llm_cache import LLMResponseCache
+from rate_limiter import BedrockRateController
+
+load_dotenv()
+
+AWS_ACCESS_KEY = os.getenv("AWS_ACCESS_KEY")
+AWS_SECRET_KEY = os.getenv("AWS_SECRET_KEY")
+AWS_REGION = os.getenv("AWS_REGION")
+
+# Connections kept open per client; should cover the number of threads using it at once
+AWS_MAX_POOL_CONNECTIONS = int(os.getenv("AWS_MAX_POOL_CONNECTIONS", "50"))
+AWS_MAX_ATTEMPTS = int(os.getenv("AWS_MAX_ATTEMPTS", "5"))
+AWS_RETRY_MODE = os.getenv("AWS_RETRY_MODE", "adaptive")
+AWS_CONNECT_TIMEOUT = float(os.getenv("AWS_CONNECT_TIMEOUT", "5"))
+# Bedrock responses for long prompts can take well over the botocore default of 60s
+AWS_READ_TIMEOUT = float(os.getenv("AWS_READ_TIMEOUT", "300"))
+BEDROCK_THREADS = int(os.getenv("BEDROCK_THREADS", "32"))
+
+client_config = Config(
+    region_name=AWS_REGION,
+    max_pool_connections=AWS_MAX_POOL_CONNECTIONS,
+    tcp_keepalive=True,
+    connect_timeout=AWS_CONNECT_TIMEOUT,
+    read_timeout=AWS_READ_TIMEOUT,
+    retries={"max_attempts": AWS_MAX_ATTEMPTS, "mode": AWS_RETRY_MODE}
+)
+
+# Bedrock retries are owned by the rate controller, which also adapts concurrency to throttles
+service_configs = {
+    "bedrock-runtime": client_config.merge(Config(retries={"total_max_attempts": 1, "mode": "standard"}))
+}
+
+# Bounded separately from asyncio's default executor, see the module docstring
+bedrock_executor = ThreadPoolExecutor(max_workers=BEDROCK_THREADS, thread_name_prefix="bedrock")
+
+bedrock_limits = BedrockRateController()
+llm_cache = LLMResponseCache()
+
+_session = None
+_clients = {}
+_resources = {}
+_lock = threading.Lock()
+
+
+def _get_session():
+    global _session
+    if _session is None:
+        _session = boto3.session.Session(
+            aws_access_key_id=AWS_ACCESS_KEY,
+            aws_secret_access_key=AWS_SECRET_KEY,
+            region_name=AWS_REGION
+        )
+    return _session
+
+
+def get_client(service: str):
+    """Return the process-wide client for a service, creating it on first use."""
+    client = _clients.get(service)
+    if client is None:
+        # Sessions are not thread-safe, so clients are only ever created under the lock
+        with _lock:
+            client = _clients.get(service)
+            if client is None:
+                client = _clients[service] = _get_session().client(
+                    service, config=service_configs.get(service, client_config)
+                )
+    return client
+
+
+def get_resource(service: str):
+    """Return the process-wide resource (e.g. DynamoDB) for a service, creating it on first use."""
+    resource = _resources.get(service)
+    if resource is None:
+        with _lock:
+            resource = _resources.get(service)
+            if resource is None:
+                resource = _resources[service] = _get_session().resource(service, config=client_config)
+    return resource
+
+
+class _Lazy:
+    """Stands in for a client, resource or table and creates it on first attribute access."""
+
+    def __init__(self, factory, description: str):
+        self._factory = factory
+        self._description = description
+        self._target = None
+
+    def __getattr__(self, name):
+        # Only reached for attributes the proxy itself doesn't have, i.e. those of the real object
+        if self._target is None:
+            self._target = self._factory()
+        return getattr(self._target, name)
+
+    def __repr__(self):
+        return f"<lazy {self._description}>"
+
+
+def lazy_client(service: str):
+    """A module-level stand-in for get_client(service); nothing is built until it is used."""
+    return _Lazy(partial(get_client, service), f"{service} client")
+
+
+def lazy_resource(service: str):
+    return _Lazy(partial(get_resource, service), f"{service} resource")
+
+
+def lazy_table(name: str):
+    """A DynamoDB Table that is only built when first used."""
+    return _Lazy(lambda: get_resource("dynamodb").Table(name), f"DynamoDB table {name}")
+
+
+def _invoke_model_json(model_id: str, body: dict, **kwargs) -> dict:
+    response = get_client("bedrock-runtime").invoke_model(modelId=model_id, body=json.dumps(body), **kwargs)
+    return json.loads(response['body'].read().decode('utf-8'))
+
+
+def text_parses(parse):
+    """A `validate` callback accepting responses whose first text block `parse` can read without raising."""
+    def validate(response_body: dict) -> bool:
+        try:
+            parse(response_body["content"][0]["text"])
+            return True
+        except (KeyError, IndexError, TypeError, ValueError):
+            return False
+    return validate
+
+
+def _cached_response(model_id: str, body: dict, validate=None):
+    """The cached response for a request, or None; an entry `validate` rejects is dropped and counts as a miss."""
+    cached = llm_cache.get(model_id, body)
+    if cached is not None and validate is not None and not validate(cached):
+        llm_cache.discard(model_id, body)
+        return None
+    return cached
+
+
+def _store_response(model_id: str, body: dict, response_body: dict, latency: float, validate=None):
+    """Cache a response unless it was cut off at max_tokens or `validate` rejects it."""
+    if response_body.get("stop_reason") == "max_tokens":
+        return
+    if validate is not None and not validate(response_body):
+        return
+    llm_cache.put(model_id, body, response_body, latency)
+
+
+def invoke_model_json(model_id: str, body: dict, use_cache: bool = True, refresh: bool = False,
+                      validate=None, **kwargs) -> dict:
+    """
+    Call a Bedrock model with a JSON body, within the model's rate limits, and return the decoded JSON response.
+
+    With use_cache, an identical earlier request is answered from the LLM response cache. refresh skips
+    that lookup but still caches the new response, e.g. when retrying after a bad answer. validate(response)
+    returning False keeps a response out of the cache (and ignores a cached one), so output its caller
+    can't parse is never replayed.
+    """
+    if use_cache and not refresh:
+        cached = _cached_response(model_id, body, validate)
+        if cached is not None:
+            return cached
+    started = time.perf_counter()
+    response_body = bedrock_limits.call(model_id, body, partial(_invoke_model_json, model_id, body, **kwargs))
+    if use_cache:
+        _store_response(model_id, body, response_body, time.perf_counter() - started, validate)
+    return response_body
+
+
+async def run_on_bedrock_pool(fn, *args, **kwargs):
+    """Run a blocking Bedrock call on the Bedrock thread pool and await its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(bedrock_executor, partial(fn, *args, **kwargs))
+
+
+async def invoke_model_async(model_id: str, body: dict, use_cache: bool = True, refresh: bool = False,
+                             validate=None, **kwargs) -> dict:
+    """Async invoke_model_json; waits for rate limits on the loop, calls run in parallel on the Bedrock thread pool."""
+    if use_cache and not refresh:
+        cached = await asyncio.to_thread(_cached_response, model_id, body, validate)
+        if cached is not None:
+            return cached
+    started = time.perf_counter()
+    response_body = await bedrock_limits.call_async(
+        model_id, body, partial(run_on_bedrock_pool, _invoke_model_json, model_id, body, **kwargs)
+    )
+    if use_cache:
+        await asyncio.to_thread(_store_response, model_id, body, response_body, time.perf_counter() - started, validate)
+    return response_body
+
+
+def _stream_model_json(model_id: str, body: dict, on_text, **kwargs) -> dict:
+    """Consume an Anthropic response stream, passing each text delta to on_text, and return the assembled message."""
+    response = get_client("bedrock-runtime").invoke_model_with_response_stream(
+        modelId=model_id, body=json.dumps(body), **kwargs
+    )
+    message = {"type": "message", "role": "assistant", "content": [], "stop_reason": None, "usage": {}}
+    parts = []
+    for event in response["body"]:
+        chunk = event.get("chunk")
+        if not chunk:
+            continue
+        data = json.loads(chunk["bytes"])
+        kind = data.get("type")
+        if kind == "message_start":
+            started = data.get("message", {})
+            message.update({key: started[key] for key in ("id", "model") if key in started})
+            message["usage"].update(started.get("usage", {}))
+        elif kind == "content_block_delta" and data.get("delta", {}).get("type") == "text_delta":
+            parts.append(data["delta"]["text"])
+            on_text(data["delta"]["text"])
+        elif kind == "message_delta":
+            message["stop_reason"] = data.get("delta", {}).get("stop_reason")
+            message["usage"].update(data.get("usage", {}))
+    message["content"] = [{"type": "text", "text": "".join(parts)}]
+    return message
+
+
+async def stream_model_async(model_id: str, body: dict, on_text, use_cache: bool = True, refresh: bool = False,
+                             validate=None, **kwargs) -> dict:
+    """
+    invoke_model_async for Anthropic models that also streams the generated text.
+
+    on_text(delta) is called on the event loop for every piece of text as it is
+    generated (once with the whole text on a cache hit). If a throttled or failed
+    attempt is retried after text was delivered, on_text(None) is called before
+    the text starts over. Returns the same response body as invoke_model_async.
+    """
+    if use_cache and not refresh:
+        cached = await asyncio.to_thread(_cached_response, model_id, body, validate)
+        if cached is not None:
+            on_text("".join(block.get("text", "") for block in cached.get("content", [])))
+            return cached
+
+    loop = asyncio.get_running_loop()
+    delivered = False
+
+    def deliver(delta):
+        nonlocal delivered
+        delivered = True
+        loop.call_soon_threadsafe(on_text, delta)
+
+    async def attempt():
+        nonlocal delivered
+        if delivered:
+            delivered = False
+            on_text(None)
+        return await run_on_bedrock_pool(_stream_model_json, model_id, body, deliver, **kwargs)
+
+    started = time.perf_counter()
+    response_body = await bedrock_limits.call_async(model_id, body, attempt)
+    if use_cache:
+        await asyncio.to_thread(_store_response, model_id, body, response_body, time.perf_counter() - started, validate)
+    return response_body
@@ -0,0 +1,73 @@
+"""
+Compare the header-based duration probe with the pydub/ffmpeg decode path.
+
+Generates a silent PCM WAV of the requested length and times both approaches.
+
+    python benchmarks/bench_audio_duration.py --minutes 60 --repeat 3
+"""
+import os
+import sys
+import time
+import wave
+import argparse
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from audio_probe import probe_file
+
+
+def write_wav(path: str, minutes: float, sample_rate: int = 16000, channels: int = 2):
+    frames_per_second = sample_rate * channels * 2
+    with wave.open(path, "wb") as w:
+        w.setnchannels(channels)
+        w.setsampwidth(2)
+        w.setframerate(sample_rate)
+        second = b"\0" * frames_per_second
+        for _ in range(int(minutes * 60)):
+            w.writeframes(second)
+
+
+def measure(fn, repeat: int):
+    timings = []
+    peak = 0
+    result = None
+    for _ in range(repeat):
+        tracemalloc.start()
+        started = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - started)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return result, min(timings), peak
+
+
+def decode_duration(path: str):
+    from pydub import AudioSegment
+    return len(AudioSegment.from_file(path)) / 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--minutes", type=float, default=60)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "call.wav")
+        write_wav(path, args.minutes)
+        print(f"File: {os.path.getsize(path) / 1e6:.1f} MB, {args.minutes} min stereo 16 kHz WAV")
+
+        duration, seconds, peak = measure(lambda: probe_file(path)["duration_seconds"], args.repeat)
+        print(f"header probe : {seconds * 1000:10.3f} ms  peak {peak / 1e6:8.2f} MB  duration {duration:.2f}s")
+
+        try:
+            duration, seconds, peak = measure(lambda: decode_duration(path), args.repeat)
+            print(f"pydub decode : {seconds * 1000:10.3f} ms  peak {peak / 1e6:8.2f} MB  duration {duration:.2f}s")
+        except Exception as e:
+            print(f"pydub decode : skipped ({e})")
+
+
+if __name__ == "__main__":
+    main()
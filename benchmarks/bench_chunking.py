@@ -0,0 +1,125 @@
+"""
+Chunking throughput: the original chunks_string / chunks_string1 vs. the
+single-pass chunking.chunk_text, on synthetic multi-megabyte documents.
+
+    python benchmarks/bench_chunking.py --sizes-mb 1 4 16 --chunk-size 200
+
+The original sentence chunker uses nltk's punkt tokenizer when its data is
+installed and falls back to a regex split otherwise, which is reported.
+"""
+import os
+import re
+import sys
+import time
+import argparse
+import tracemalloc
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chunking import chunk_text
+
+
+def _sentence_splitter():
+    try:
+        from nltk.tokenize import sent_tokenize
+        sent_tokenize("Probe sentence. Another one.")
+        return sent_tokenize, "nltk punkt"
+    except (ImportError, LookupError):
+        return (lambda text: re.split(r"(?<=[.!?])\s+", text)), "regex fallback"
+
+
+def legacy_chunks_string(text, tokens, sent_tokenize):
+    segments = []
+    len_sum = 0
+    k = 0
+    raw_list = sent_tokenize(text)
+
+    for i in range(len(raw_list)):
+        x1 = len(raw_list[i].split())
+        len_sum += x1
+        k += 1
+
+        if len_sum > tokens:
+            j = i-(k+1) if i-(k+1) >= 0 else 0
+            if len(" ".join(raw_list[j: i+1]).split()) > tokens:
+                j = i-k
+            segments.append(" ".join(raw_list[j: i]))
+            len_sum = 0
+            k = 0
+
+        if i == len(raw_list)-1:
+            j = i-(k+1) if i-(k+1) >= 0 else 0
+            if len(" ".join(raw_list[j: i+1]).split()) > tokens:
+                j = i-k
+            segments.append(" ".join(raw_list[j: i+1]))
+
+    return segments
+
+
+def legacy_chunks_string1(text, chunk_size):
+    words = text.split()
+    for i in range(0, len(words), chunk_size):
+        yield ' '.join(words[i:i + chunk_size])
+
+
+def synthetic_text(size_mb: float, seed: int = 0) -> str:
+    rng = np.random.default_rng(seed)
+    vocabulary = np.array([
+        "loan", "interest", "rate", "customer", "account", "payment", "branch", "policy",
+        "document", "approval", "balance", "statement", "transfer", "charges", "tenure", "the",
+        "a", "is", "for", "with", "your", "please", "confirm", "agent", "call", "details"
+    ])
+    sentences, size = [], 0
+    while size < size_mb * 1_000_000:
+        words = vocabulary[rng.integers(0, len(vocabulary), size=int(rng.integers(4, 40)))]
+        sentence = " ".join(words).capitalize() + rng.choice([".", "?", "!"])
+        sentences.append(sentence)
+        size += len(sentence) + 1
+    return " ".join(sentences)
+
+
+def measure(fn):
+    started = time.perf_counter()
+    chunks = sum(1 for _ in fn())
+    elapsed = time.perf_counter() - started
+    # Separate pass for memory, tracemalloc slows allocation-heavy code down considerably
+    tracemalloc.start()
+    for _ in fn():
+        pass
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak, chunks
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes-mb", type=float, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--chunk-size", type=int, default=200)
+    parser.add_argument("--overlap", type=int, default=20)
+    args = parser.parse_args()
+
+    sent_tokenize, splitter = _sentence_splitter()
+    print(f"chunk_size={args.chunk_size} overlap={args.overlap} legacy sentence splitter: {splitter}")
+
+    for size_mb in args.sizes_mb:
+        text = synthetic_text(size_mb)
+        lines = text.replace(". ", ".\n").splitlines(keepends=True)
+        cases = [
+            ("chunks_string (legacy)", lambda: legacy_chunks_string(text, args.chunk_size, sent_tokenize)),
+            ("chunks_string1 (legacy)", lambda: legacy_chunks_string1(text, args.chunk_size)),
+            ("chunk_text sentences", lambda: chunk_text(text, args.chunk_size)),
+            ("chunk_text sentences+overlap", lambda: chunk_text(text, args.chunk_size, args.overlap)),
+            ("chunk_text words", lambda: chunk_text(text, args.chunk_size, align_sentences=False)),
+            ("chunk_text tokens", lambda: chunk_text(text, args.chunk_size, unit="tokens")),
+            ("chunk_text from line generator", lambda: chunk_text(iter(lines), args.chunk_size)),
+        ]
+        print(f"\n{len(text) / 1e6:.1f} MB")
+        for label, fn in cases:
+            elapsed, peak, chunks = measure(fn)
+            print(f"  {label:<32} {elapsed * 1000:9.1f} ms  {len(text) / 1e6 / elapsed:7.1f} MB/s  "
+                  f"peak {peak / 1e6:7.1f} MB  {chunks:>7,} chunks")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Import-time profile of the app: runs `python -X importtime -c "import <module>"`
+in fresh interpreters and reports wall time, whether the import succeeded, and
+the modules with the largest cumulative import time.
+
+    python benchmarks/bench_import.py --module main --runs 5 --top 15
+
+Nothing should talk to AWS at import time, so this works without credentials
+or network access; dummy AWS settings are filled in when none are set.
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def profile_import(module: str, env: dict):
+    """One fresh-interpreter import. Returns (wall seconds, succeeded, {module: cumulative microseconds}, error)."""
+    started = time.perf_counter()
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, env=env, capture_output=True, text=True
+    )
+    wall = time.perf_counter() - started
+
+    cumulative = {}
+    error_lines = []
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:"):
+            error_lines.append(line)
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue  # header row
+        name = parts[2].strip()
+        cumulative[name] = max(cumulative.get(name, 0), int(parts[1]))
+    error = error_lines[-1] if process.returncode and error_lines else None
+    return wall, process.returncode == 0, cumulative, error
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args(argv)
+
+    env = dict(os.environ)
+    env.setdefault("AWS_REGION", "us-east-1")
+    env.setdefault("AWS_ACCESS_KEY", "benchmark")
+    env.setdefault("AWS_SECRET_KEY", "benchmark")
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [ROOT, env.get("PYTHONPATH")]))
+
+    runs = [profile_import(args.module, env) for _ in range(args.runs)]
+    walls = [wall for wall, _, _, _ in runs]
+    failures = [error for _, ok, _, error in runs if not ok]
+
+    print(f"import {args.module}: {args.runs} runs, median {statistics.median(walls):.3f}s, "
+          f"min {min(walls):.3f}s, max {max(walls):.3f}s")
+    if failures:
+        print(f"  {len(failures)} runs failed, last error: {failures[-1]}")
+
+    # The last run has warm OS caches like the others; report its slowest top-level and nested imports
+    _, _, cumulative, _ = runs[-1]
+    print(f"\nTop {args.top} modules by cumulative import time (last run):")
+    for name, micros in sorted(cumulative.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {micros / 1000:9.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Re-running a call should be answered from the LLM response cache: runs the
+summary, Q&A extraction and answer scoring for one transcript twice against a
+fresh cache and reports the model calls and time of each pass.
+
+    python benchmarks/bench_llm_cache.py --words 1500 --latency 0.5
+    python benchmarks/bench_llm_cache.py --live --transcript call.txt
+
+Bedrock is replaced with canned replies that take --latency seconds, unless
+--live is given. Exits with status 1 if the second pass reached the model.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+for name, value in (("AWS_REGION", "us-east-1"), ("AWS_ACCESS_KEY", "benchmark"), ("AWS_SECRET_KEY", "benchmark")):
+    os.environ.setdefault(name, value)
+
+import aws_clients
+from llm_cache import LLMResponseCache
+
+SUMMARY_REPLY = {"Customer": {"Name": "Asha"}, "Sales_Agent": {"Name": "Ravi"}, "Summary": ["Asked about loans"],
+                 "Sales_Agent_Score": {"Professionalism": 8, "Product_Knowledge": 7, "Communication_Skills": 8,
+                                       "Problem_Solving": 7},
+                 "Sentiment_Scores": {"Positive_Sentiment_Score": 6, "Negative_Sentiment_Score": 1,
+                                      "Neutral_Sentiment_Score": 3}}
+QA_REPLY = {"qa_pairs": [{"customer_question": "What is the interest rate?",
+                          "executive_answer": "It starts at eleven percent."}]}
+# Scoring replies continue the "{" prefill
+SCORE_REPLY = '"score": 8, "improvements": [], "strengths": ["Clear"]}'
+
+
+def canned_model(latency: float, calls: list):
+    def invoke(model_id: str, body: dict, **kwargs) -> dict:
+        calls.append(model_id)
+        time.sleep(latency)
+        messages = body["messages"]
+        prompt = messages[0]["content"][0]["text"]
+        if messages[-1]["role"] == "assistant":
+            text = SCORE_REPLY
+        elif "customer_question" in prompt:
+            text = json.dumps(QA_REPLY)
+        else:
+            text = json.dumps(SUMMARY_REPLY)
+        return {"content": [{"type": "text", "text": text}], "stop_reason": "end_turn"}
+    return invoke
+
+
+async def run_call(transcript: str):
+    from utils import summarize_conversation_bedrock
+    from Q_A import extract_customer_qa_pairs, _score_answer
+
+    summary = await summarize_conversation_bedrock(transcript, "2026-01-01")
+    qa = await extract_customer_qa_pairs(transcript)
+    scores = await asyncio.gather(*(
+        _score_answer(pair["customer_question"], "An ideal answer.", pair["executive_answer"])
+        for pair in qa.get("qa_pairs", [])
+    ))
+    return summary, qa, scores
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--words", type=int, default=1500, help="Length of the generated transcript")
+    parser.add_argument("--transcript", help="Transcript file to use instead of a generated one")
+    parser.add_argument("--latency", type=float, default=0.5, help="Seconds per canned model call")
+    parser.add_argument("--live", action="store_true", help="Call Bedrock instead of the canned replies")
+    args = parser.parse_args(argv)
+
+    if args.transcript:
+        with open(args.transcript, encoding="utf-8") as f:
+            transcript = f.read()
+    else:
+        words = "Customer: What is the interest rate on the loan? Agent: It starts at eleven percent.".split()
+        transcript = " ".join((words * (args.words // len(words) + 1))[:args.words])
+
+    calls = []
+    if not args.live:
+        aws_clients._invoke_model_json = canned_model(args.latency, calls)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        aws_clients.llm_cache = LLMResponseCache(os.path.join(tmp, "llm_cache.db"))
+        passes = []
+        for label in ("first run", "re-run"):
+            before, started = len(calls), time.perf_counter()
+            results = asyncio.run(run_call(transcript))
+            passes.append((label, len(calls) - before, time.perf_counter() - started, results))
+        stats = aws_clients.llm_cache.stats()
+
+    for label, model_calls, seconds, _ in passes:
+        print(f"{label:>9}: {model_calls if not args.live else '-'} model calls, {seconds:.3f}s")
+    print(f"cache: {stats['hits']} hits, {stats['misses']} misses, {stats['stores']} stores, "
+          f"{stats['skipped']} skipped, {stats['latency_saved_seconds']}s of model time saved")
+
+    same = passes[0][3] == passes[1][3]
+    print(f"re-run results identical: {same}")
+    if stats["skipped"] or (not args.live and passes[1][1]) or not same:
+        print("❌ The re-run was not served entirely from the cache")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Top-k retrieval over the knowledge base: the original per-row loop vs. the
+precomputed normalized float32 matrix.
+
+    python benchmarks/bench_retrieval.py --sizes 10000 100000 1000000 --dim 1024
+
+The original loop (iterrows + eval + sklearn cosine_similarity per row) is only
+run up to --legacy-max rows since it grows linearly in Python.
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from knowledge_base import top_k
+
+
+def legacy_search(df, query_embedding, top_n):
+    from sklearn.metrics.pairwise import cosine_similarity
+    similarities = []
+    for idx, row in df.iterrows():
+        embedding = np.array(eval(row['embedding']))
+        similarity = cosine_similarity([query_embedding], [embedding])[0][0]
+        similarities.append((idx, similarity))
+    similarities.sort(key=lambda x: x[1], reverse=True)
+    return similarities[:top_n]
+
+
+def time_queries(fn, queries):
+    timings = []
+    for query in queries:
+        started = time.perf_counter()
+        fn(query)
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return timings[len(timings) // 2], timings[int(len(timings) * 0.95) - 1 if len(timings) > 1 else 0]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--top-n", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--legacy-max", type=int, default=10_000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    queries = rng.standard_normal((args.queries, args.dim)).astype(np.float32)
+    print(f"dim={args.dim} top_n={args.top_n} queries={args.queries}")
+
+    for size in args.sizes:
+        matrix = rng.standard_normal((size, args.dim), dtype=np.float32)
+        matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+
+        p50, p95 = time_queries(lambda q: top_k(matrix, q, args.top_n), queries)
+        print(f"{size:>9,} chunks  matrix    p50 {p50 * 1000:9.2f} ms  p95 {p95 * 1000:9.2f} ms")
+
+        if size <= args.legacy_max:
+            import pandas as pd
+            df = pd.DataFrame({"embedding": [str(row.tolist()) for row in matrix]})
+            p50, p95 = time_queries(lambda q: legacy_search(df, q.tolist(), args.top_n), queries[:3])
+            print(f"{size:>9,} chunks  iterrows  p50 {p50 * 1000:9.2f} ms  p95 {p95 * 1000:9.2f} ms")
+        del matrix
+
+
+if __name__ == "__main__":
+    main()
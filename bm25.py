@@ -0,0 +1,140 @@
+"""
+In-memory inverted index with BM25 scoring for the knowledge base chunks.
+
+Postings are kept as flat numpy arrays sorted by term, with the BM25 weight of
+every (term, chunk) pair precomputed at build time, so a query is a gather of
+its terms' postings plus one grouped sum. The index complements the embedding
+search: exact product names ("Collateral-Free Loans", "Loan Sanction Letter")
+score highly here even when their embeddings are not the closest.
+"""
+import os
+import re
+from array import array
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+
+_TERM = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset("""
+a an and are as at be but by can do does for from has have how i if in is it its me my
+of on or our so that the their them there this to was we were what when where which who
+why will with you your
+""".split())
+
+
+def _stem(term: str) -> str:
+    # Plural folding only, so "loans" matches "loan" without a stemmer dependency
+    if len(term) > 4 and term.endswith("ies"):
+        return term[:-3] + "y"
+    if len(term) > 3 and term.endswith("s") and not term.endswith(("ss", "us", "is")):
+        return term[:-1]
+    return term
+
+
+def tokenize(text: str):
+    """Lower-cased alphanumeric terms with stopwords removed; hyphenated names split into parts."""
+    return [_stem(term) for term in _TERM.findall(str(text).lower()) if term not in STOPWORDS]
+
+
+def reciprocal_rank_fusion(rankings, k: int = 60):
+    """
+    Fuse several rankings (sequences of row ids, best first) into one.
+
+    Returns:
+        Tuple of (rows, scores) sorted by fused score, best first
+    """
+    fused = {}
+    for ranking in rankings:
+        for rank, row in enumerate(ranking):
+            fused[int(row)] = fused.get(int(row), 0.0) + 1.0 / (k + rank + 1)
+    rows = sorted(fused, key=fused.get, reverse=True)
+    return np.asarray(rows, dtype=np.int64), np.asarray([fused[row] for row in rows], dtype=np.float32)
+
+
+class BM25Index:
+    """Okapi BM25 over a fixed list of texts; rows are the positions in that list."""
+
+    def __init__(self, vocabulary: dict, offsets: np.ndarray, postings: np.ndarray, weights: np.ndarray, rows: int):
+        self.vocabulary = vocabulary
+        self.offsets = offsets
+        self.postings = postings
+        self.weights = weights
+        self.rows = rows
+
+    @classmethod
+    def build(cls, texts, k1: float = BM25_K1, b: float = BM25_B):
+        vocabulary = {}
+        # Raw term -> term id (-1 for stopwords), so each distinct word is stemmed once
+        known = {}
+        term_ids = array("q")  # Compact buffer, a list of ints would cost ~36 bytes per term
+        raw_lengths = array("q")
+        for text in texts:
+            ids = list(map(known.get, _TERM.findall(str(text).lower())))
+            if None in ids:
+                raw = _TERM.findall(str(text).lower())
+                for i, term_id in enumerate(ids):
+                    if term_id is None:
+                        term = raw[i]
+                        if term not in known:
+                            known[term] = -1 if term in STOPWORDS else vocabulary.setdefault(_stem(term), len(vocabulary))
+                        ids[i] = known[term]
+            raw_lengths.append(len(ids))
+            term_ids.extend(ids)
+
+        rows = len(raw_lengths)
+        term_ids = np.frombuffer(term_ids, dtype=np.int64)
+        doc_ids = np.repeat(np.arange(rows, dtype=np.int64), np.frombuffer(raw_lengths, dtype=np.int64))
+        keep = term_ids >= 0
+        term_ids, doc_ids = term_ids[keep], doc_ids[keep]
+        if not term_ids.shape[0]:
+            empty = np.zeros(0, dtype=np.int32)
+            return cls(vocabulary, np.zeros(len(vocabulary) + 1, dtype=np.int64), empty, empty.astype(np.float32), rows)
+
+        # One key per (term, row) pair; unique() both sorts the postings by term and counts term frequency
+        keys, tf = np.unique(term_ids * rows + doc_ids, return_counts=True)
+        terms = keys // rows
+        postings = (keys % rows).astype(np.int32)
+        offsets = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(terms, minlength=len(vocabulary)))
+
+        lengths = np.bincount(doc_ids, minlength=rows).astype(np.float32)
+        average = float(lengths.mean()) or 1.0
+        df = np.diff(offsets).astype(np.float32)
+        idf = np.log1p((rows - df + 0.5) / (df + 0.5))
+        tf = tf.astype(np.float32)
+        norm = k1 * (1 - b + b * lengths[postings] / average)
+        weights = (idf[terms] * tf * (k1 + 1) / (tf + norm)).astype(np.float32)
+        return cls(vocabulary, offsets, postings, weights, rows)
+
+    @property
+    def terms(self) -> int:
+        return len(self.vocabulary)
+
+    def search(self, query: str, k: int):
+        """
+        Return the k best-scoring rows for a query.
+
+        Returns:
+            Tuple of (rows, scores), best match first; rows sharing no term with
+            the query are never returned
+        """
+        empty = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32))
+        term_ids = {self.vocabulary[term] for term in tokenize(query) if term in self.vocabulary}
+        if not term_ids or k <= 0:
+            return empty
+
+        rows = np.concatenate([self.postings[self.offsets[t]:self.offsets[t + 1]] for t in term_ids])
+        weights = np.concatenate([self.weights[self.offsets[t]:self.offsets[t + 1]] for t in term_ids])
+        candidates, inverse = np.unique(rows, return_inverse=True)
+        scores = np.bincount(inverse, weights=weights).astype(np.float32)
+
+        if k < candidates.shape[0]:
+            top = np.argpartition(-scores, k)[:k]
+        else:
+            top = np.arange(candidates.shape[0])
+        top = top[np.argsort(-scores[top])]
+        return candidates[top].astype(np.int64), scores[top]
@@ -0,0 +1,193 @@
+"""
+Single-pass text chunking for the knowledge base and transcripts.
+
+`chunk_text` takes a string or any iterable of strings (pages, file lines,
+fixed-size reads) and yields chunks whose size stays within a word or token
+budget. Chunks are aligned to sentence boundaries by default, and consecutive
+chunks can share `overlap` units of trailing context. Every sentence and word is
+visited once, so the cost grows linearly with the input.
+"""
+import re
+from collections import deque
+
+# End of a sentence: terminal punctuation, optional closing quotes/brackets, then whitespace
+_SENTENCE_END = re.compile(r"[.!?][\"')\]]*\s+")
+# Rough subword count: runs of word characters and individual punctuation marks
+_TOKEN = re.compile(r"\w+|[^\w\s]")
+
+# Longest punctuation-plus-closers run a boundary can start with
+_BOUNDARY_LOOKBACK = 8
+# A "sentence" with no terminal punctuation is flushed once the buffer grows past this
+MAX_SENTENCE_CHARS = 1 << 20
+
+
+def count_words(text: str) -> int:
+    return len(text.split())
+
+
+def _count_normalized_words(text: str) -> int:
+    # Sentences and words reaching the chunker are already single-space separated
+    return text.count(" ") + 1
+
+
+def count_tokens(text: str) -> int:
+    """Approximate token count; close to BPE counts for English prose without a tokenizer dependency."""
+    return len(_TOKEN.findall(text))
+
+
+UNITS = {"words": count_words, "tokens": count_tokens}
+
+
+def iter_sentences(source, max_sentence_chars: int = MAX_SENTENCE_CHARS):
+    """
+    Yield whitespace-normalized sentences from a string or an iterable of strings.
+
+    Pieces of an iterable are concatenated as-is, so a sentence (or a word) may
+    span several pieces. Only the new piece is scanned for a boundary, keeping
+    the whole pass linear even when sentences are long.
+    """
+    if isinstance(source, str):
+        source = (source,)
+
+    pending = []
+    pending_chars = 0
+    for piece in source:
+        if not piece:
+            continue
+        # Include the end of the pending text so a boundary straddling two pieces is found
+        previous = "".join(pending[-_BOUNDARY_LOOKBACK:])[-_BOUNDARY_LOOKBACK:] if pending else ""
+        ends = [match.end() - len(previous) for match in _SENTENCE_END.finditer(previous + piece)]
+        if not ends:
+            pending.append(piece)
+            pending_chars += len(piece)
+            if pending_chars < max_sentence_chars:
+                continue
+            ends = [len(piece)]
+        else:
+            ends[0] = max(ends[0], 0)
+
+        head = " ".join(("".join(pending) + piece[:ends[0]]).split())
+        if head:
+            yield head
+        for start, end in zip(ends, ends[1:]):
+            sentence = " ".join(piece[start:end].split())
+            if sentence:
+                yield sentence
+        rest = piece[ends[-1]:]
+        pending = [rest] if rest else []
+        pending_chars = len(rest)
+
+    tail = " ".join("".join(pending).split())
+    if tail:
+        yield tail
+
+
+def _iter_words(source):
+    """Words of a string or iterable of strings, joining words split across pieces."""
+    if isinstance(source, str):
+        source = (source,)
+    partial = ""
+    for piece in source:
+        if not piece:
+            continue
+        words = piece.split()
+        if partial:
+            if piece[0].isspace():
+                yield partial
+            elif words:
+                words[0] = partial + words[0]
+            else:
+                yield partial
+        partial = ""
+        if words and not piece[-1].isspace():
+            partial = words.pop()
+        yield from words
+    if partial:
+        yield partial
+
+
+def chunk_text(source, max_size: int = 200, overlap: int = 0, unit: str = "words", align_sentences: bool = True):
+    """
+    Split text into chunks of at most `max_size` units.
+
+    Args:
+        source: A string or an iterable of strings (e.g. a generator of pages)
+        max_size: Budget per chunk, counted in `unit`
+        overlap: Units of trailing context repeated at the start of the next chunk;
+            with sentence alignment only whole sentences are carried over
+        unit: "words" or "tokens" (approximate, see count_tokens)
+        align_sentences: Break only between sentences; a single sentence longer than
+            max_size is split on word boundaries
+
+    Yields:
+        Chunk strings with whitespace collapsed to single spaces
+    """
+    if max_size <= 0:
+        raise ValueError("max_size must be positive")
+    if not 0 <= overlap < max_size:
+        raise ValueError("overlap must be at least 0 and smaller than max_size")
+    measure = UNITS[unit]
+    if measure is count_words:
+        measure = _count_normalized_words
+
+    if align_sentences:
+        units = _sentence_units(iter_sentences(source), measure, max_size)
+    elif unit == "words":
+        if isinstance(source, str):
+            # Whole text already in memory: slicing one word list is the cheapest way
+            words = source.split()
+            for start in range(0, max(len(words) - overlap, 1) if words else 0, max_size - overlap):
+                yield " ".join(words[start:start + max_size])
+        else:
+            yield from _word_windows(_iter_words(source), max_size, overlap)
+        return
+    else:
+        units = ((word, measure(word)) for word in _iter_words(source))
+
+    window = deque()
+    size = 0
+    for text, length in units:
+        if window and size + length > max_size:
+            yield " ".join(text for text, _ in window)
+            # Keep the trailing units that fit in the overlap and still leave room for this one
+            while window and (size > overlap or size + length > max_size):
+                size -= window.popleft()[1]
+        window.append((text, length))
+        size += length
+
+    if window:
+        yield " ".join(text for text, _ in window)
+
+
+def _word_windows(words, max_size: int, overlap: int):
+    """Fixed windows of max_size words, each starting max_size - overlap words after the last."""
+    window = []
+    fresh = 0
+    for word in words:
+        window.append(word)
+        fresh += 1
+        if len(window) == max_size:
+            yield " ".join(window)
+            del window[:max_size - overlap]
+            fresh = 0
+    if fresh:
+        yield " ".join(window)
+
+
+def _sentence_units(sentences, measure, max_size: int):
+    """(text, size) per sentence, splitting any sentence larger than max_size into word runs."""
+    for sentence in sentences:
+        length = measure(sentence)
+        if length <= max_size:
+            yield sentence, length
+            continue
+        words, run = [], 0
+        for word in sentence.split(" "):
+            word_length = measure(word)
+            if words and run + word_length > max_size:
+                yield " ".join(words), run
+                words, run = [], 0
+            words.append(word)
+            run += word_length
+        if words:
+            yield " ".join(words), run
@@ -1,7 +1,8 @@
 from dotenv import load_dotenv
-import boto3
-from collections import defaultdict
-from datetime import datetime
+from aws_clients import lazy_resource, lazy_table
+from aggregates import get_totals, list_totals
+from dynamo_scan import scan_items
+from agent_index import agent_key, query_agent_calls
 from botocore.exceptions import ClientError
 import os
 
@@ -12,19 +13,38 @@ AWS_ACCESS_KEY = os.getenv("AWS_ACCESS_KEY")
 AWS_SECRET_KEY = os.getenv("AWS_SECRET_KEY")
 AWS_REGION = os.getenv("AWS_REGION")
 
-# Initialize DynamoDB
-dynamodb = boto3.resource(
-    'dynamodb',
-    aws_access_key_id=AWS_ACCESS_KEY,
-    aws_secret_access_key=AWS_SECRET_KEY,
-    region_name=AWS_REGION
-)
+# Shared, pooled DynamoDB resource, created on first use
+dynamodb = lazy_resource("dynamodb")
 
 # Define table name
 TABLE_NAME = 'call_audit'
-table = dynamodb.Table(TABLE_NAME)
-response = table.scan()
-# print("Raw Items:", response['Items'])
+table = lazy_table(TABLE_NAME)
+
+# Attributes each scan reads; only fetch_call_audit downloads transcripts and Q&A
+CALL_AUDIT_ATTRIBUTES = ["call_id", "call_duration", "created_on", "CreatedOn", "Summary", "Transcript", "QA_pairs"]
+CONTACT_ATTRIBUTES = ["call_id", "Summary.Sales_Agent.Name", "Summary.Customer.Contact_Details"]
+EMAIL_ATTRIBUTES = ["call_id", "Summary.Sales_Agent.Name", "Summary.Customer.Email"]
+CUSTOMER_NAME_ATTRIBUTES = ["call_id", "Summary.Sales_Agent.Name", "Summary.Customer.Name"]
+AGENT_NAME_ATTRIBUTES = ["summary.Sales_Agent.Name", "Summary.Sales_Agent.Name"]
+
+
+def _calls_for_agent(agent_name, attributes):
+    """
+    Calls of one agent (matched on the trimmed, lower-cased name), read from the agent index.
+
+    With no agent name or "all", every call is scanned. Until the index exists and is ACTIVE,
+    the table is scanned and filtered instead.
+    """
+    if not agent_name or agent_name.lower() == "all":
+        return scan_items(TABLE_NAME, attributes)
+    key = agent_key({"Sales_Agent": {"Name": agent_name}})
+    if not key:
+        return []
+    try:
+        return list(query_agent_calls(agent_name, attributes, table))
+    except ClientError as e:
+        print(f"⚠️ Agent index unavailable ({e.response['Error']['Code']}), scanning for {agent_name}")
+        return (item for item in scan_items(TABLE_NAME, attributes) if agent_key(item.get("Summary")) == key)
 
 def fetch_call_details(call_id: str):
     """
@@ -131,11 +151,8 @@ def parse_dynamodb_item(item):
 def fetch_call_audit():
     try:
         print("Fetching all call audit data...")
-        response = table.scan()
-        items = response.get("Items", [])
-
         formatted_result = {}
-        for item in items:
+        for item in scan_items(TABLE_NAME, CALL_AUDIT_ATTRIBUTES):
             parsed = parse_dynamodb_item(item)
             # print(parsed)
             if parsed:
@@ -149,47 +166,24 @@ def fetch_call_audit():
     
 async def fetch_total_calls_and_agents(agent_name=None):
     try:
-        print("🔄 Fetching data from DynamoDB...")
-        response = table.scan()
-        items = response.get("Items", [])
+        totals = get_totals(agent_name)
 
         # If agent_name is provided, return data for that specific agent
         if agent_name and agent_name.lower() != "all":
-            agent_name = agent_name.strip().lower()
-            count = 0
-
-            for item in items:
-                summary = item.get("Summary", {})
-                sales_agent = summary.get("Sales_Agent", {})
-                name = sales_agent.get("Name", "")
-
-                if name and name.strip().lower() == agent_name:
-                    count += 1
-
             return {
                 "success": True,
                 "data": {
-                    "total_calls": count,
+                    "total_calls": totals["calls"],
                     "total_agents": 1
                 }
             }
 
         # Else return global totals
-        total_calls = len(items)
-        agents_set = set()
-
-        for item in items:
-            summary = item.get("Summary", {})
-            sales_agent = summary.get("Sales_Agent", {})
-            name = sales_agent.get("Name", "")
-            if name:
-                agents_set.add(name.strip().lower())
-
         return {
             "success": True,
             "data": {
-                "total_calls": total_calls,
-                "total_agents": len(agents_set)
+                "total_calls": totals["calls"],
+                "total_agents": totals["distinct_agent"]
             }
         }
 
@@ -200,91 +194,29 @@ async def fetch_total_calls_and_agents(agent_name=None):
 
 async def fetch_contact_details_count(agent_name=None):
     """
-    Fetches total count and received/missed details for phone numbers, emails, and customer names from DynamoDB.
+    Fetches total count and received/missed details for phone numbers, emails, and customer names
+    from the dashboard aggregates.
     """
     try:
-        print("🚀 Starting fetch_contact_details_count from DynamoDB...")
-
-        response = table.scan()
-        items = response.get("Items", [])
-        print(f"📄 Total items fetched: {len(items)}")
-
-        # Filter if agent_name provided
-        if agent_name and agent_name.lower() != "all":
-            agent_name = agent_name.strip().lower()
-            items = [
-                item for item in items
-                if item.get("Summary", {}).get("Sales_Agent", {}).get("Name", "").strip().lower() == agent_name
-            ]
-            print(f"🔍 Filtered items for agent '{agent_name}': {len(items)}")
-
-        total_calls = len(items)
+        totals = get_totals(agent_name)
+        total_calls = totals["calls"]
         print(f"📊 Total calls: {total_calls}")
 
-        # Sets and counters
-        phone_set, email_set, customer_set = set(), set(), set()
-        received_contacts = received_emails = received_customers = 0
-
-        for i, item in enumerate(items):
-            summary = item.get("Summary", {})
-            customer = summary.get("Customer", {})
-
-            phone = str(customer.get("Contact_Details", "") or "").strip().lower()
-            email = str(customer.get("Email", "") or "").strip().lower()
-            name = str(customer.get("Name", "") or "").strip().lower()
-
-            print(f"🔹 Record {i+1}: phone='{phone}', email='{email}', name='{name}'")
-
-            if phone and phone != "not provided":
-                phone_set.add(phone)
-                received_contacts += 1
-
-            if email and email != "not provided":
-                email_set.add(email)
-                received_emails += 1
-
-            if name and name != "not provided":
-                customer_set.add(name)
-                received_customers += 1
-
-        # Missed
-        missed_contacts = max(0, total_calls - received_contacts)
-        missed_emails = max(0, total_calls - received_emails)
-        missed_customers = max(0, total_calls - received_customers)
-
         # % Calculator
         def calc_percent(value, total):
             return round((value / total * 100), 2) if total > 0 else 0
 
-        # Final Response
-        result = [
-            {
-                "title": "Contacts",
-                "achieved": len(phone_set),
-                "achievedPercent": calc_percent(received_contacts, total_calls),
-                "missed": missed_contacts,
-                "missedPercent": calc_percent(missed_contacts, total_calls)
-            },
-            {
-                "title": "Emails",
-                "achieved": len(email_set),
-                "achievedPercent": calc_percent(received_emails, total_calls),
-                "missed": missed_emails,
-                "missedPercent": calc_percent(missed_emails, total_calls)
-            },
-            {
-                "title": "Customers Name",
-                "achieved": len(customer_set),
-                "achievedPercent": calc_percent(received_customers, total_calls),
-                "missed": missed_customers,
-                "missedPercent": calc_percent(missed_customers, total_calls)
-            }
-        ]
-
-        print("✅ Final Result:")
-        for item in result:
-            print(item)
-
+        result = []
+        for title, kind in (("Contacts", "phone"), ("Emails", "email"), ("Customers Name", "customer")):
+            received = totals[f"{kind}_received"]
+            missed = max(0, total_calls - received)
+            result.append({
+                "title": title,
+                "achieved": totals[f"distinct_{kind}"],
+                "achievedPercent": calc_percent(received, total_calls),
+                "missed": missed,
+                "missedPercent": calc_percent(missed, total_calls)
+            })
         return result
 
     except Exception as e:
@@ -297,23 +229,15 @@ async def get_contacts_by_agent(agent_name=None):
     Fetches contacts (call_id, agent_name, Contact_Details) for the specified agent from DynamoDB.
     """
     try:
-        response = table.scan()
-        items = response.get("Items", [])
-
         filtered_contacts = []
 
-        for item in items:
+        for item in _calls_for_agent(agent_name, CONTACT_ATTRIBUTES):
             summary = item.get("Summary", {})
             customer = summary.get("Customer", {})
             agent = summary.get("Sales_Agent", {})
             contact = customer.get("Contact_Details", "")
             agent_value = agent.get("Name", "")
 
-            # Agent filter
-            if agent_name and agent_name.lower() != "all":
-                if not agent_value or str(agent_value).strip().lower() != str(agent_name).strip().lower():
-                    continue
-
             # Validate contact
             if contact and str(contact).strip().lower() != "not provided":
                 filtered_contacts.append({
@@ -333,23 +257,15 @@ async def get_email_by_agent(agent_name=None):
     Fetches emails (call_id, agent_name, email) for the specified agent from DynamoDB.
     """
     try:
-        response = table.scan()
-        items = response.get("Items", [])
-
         filtered_emails = []
 
-        for item in items:
+        for item in _calls_for_agent(agent_name, EMAIL_ATTRIBUTES):
             summary = item.get("Summary", {})
             customer = summary.get("Customer", {})
             agent = summary.get("Sales_Agent", {})
             email = customer.get("Email", "")
             agent_value = agent.get("Name", "")
 
-            # Agent filter
-            if agent_name and agent_name.lower() != "all":
-                if not agent_value or str(agent_value).strip().lower() != str(agent_name).strip().lower():
-                    continue
-
             # Validate email
             if email and str(email).strip().lower() != "not provided":
                 filtered_emails.append({
@@ -369,23 +285,15 @@ async def get_customer_name_by_agent(agent_name=None):
     Fetches customer names (call_id, agent_name, customer_name) for the specified agent from DynamoDB.
     """
     try:
-        response = table.scan()
-        items = response.get("Items", [])
-
         filtered_customers = []
 
-        for item in items:
+        for item in _calls_for_agent(agent_name, CUSTOMER_NAME_ATTRIBUTES):
             summary = item.get("Summary", {})
             customer = summary.get("Customer", {})
             agent = summary.get("Sales_Agent", {})
             name = customer.get("Name", "")
             agent_value = agent.get("Name", "")
 
-            # Agent filter
-            if agent_name and agent_name.lower() != "all":
-                if not agent_value or str(agent_value).strip().lower() != str(agent_name).strip().lower():
-                    continue
-
             # Validate name
             if name and str(name).strip().lower() != "not provided":
                 filtered_customers.append({
@@ -405,34 +313,12 @@ async def get_customer_name_by_agent(agent_name=None):
 
 async def fetch_call_status_count(agent_name=None):
     """
-    Fetches the count of Call_Completion_Status values: 'true' and 'not provided' from DynamoDB.
+    Fetches the count of Call_Completion_Status values: 'true' and 'not provided' from the dashboard aggregates.
     """
     try:
-        print("📞 Fetching Call_Completion_Status count from DynamoDB...")
-
-        response = table.scan()
-        items = response.get("Items", [])
-
-        true_count = 0
-        not_provided_count = 0
-
-        for item in items:
-            summary = item.get("Summary") or item.get("Summary") or {}
-            agent = summary.get("Sales_Agent", {})
-            agent_value = agent.get("Name", "")
-
-            # Filter by agent_name if provided
-            if agent_name and agent_name.lower() != "all":
-                if not agent_value or str(agent_value).strip().lower() != str(agent_name).strip().lower():
-                    continue
-
-            # Call Completion Status (can be True, False, None, or missing)
-            status = summary.get("Call_Completion_Status")
-            print(status)
-            if status == "True":
-                true_count += 1
-            else:
-                not_provided_count += 1
+        totals = get_totals(agent_name)
+        true_count = totals["completed"]
+        not_provided_count = max(0, totals["calls"] - true_count)
 
         print(f"✅ Call_Completion_Status = true: {true_count}, not provided or false: {not_provided_count}")
         return {
@@ -460,12 +346,9 @@ async def fetch_agent_names():
     try:
         print("🔍 Fetching all agent names from DynamoDB...")
  
-        response = table.scan()
-        items = response.get("Items", [])
- 
         names_set = set()
  
-        for item in items:
+        for item in scan_items(TABLE_NAME, AGENT_NAME_ATTRIBUTES):
             summary = item.get("summary") or item.get("Summary") or {}
             agent = summary.get("Sales_Agent", {})
  
@@ -488,58 +371,20 @@ async def fetch_agent_names():
     
 
 
-def parse_updated_at(updated_at_value):
-    try:
-        if isinstance(updated_at_value, str):
-            try:
-                return datetime.fromisoformat(updated_at_value).date().isoformat()
-            except ValueError:
-                return datetime.strptime(updated_at_value, "%Y-%m-%d %H:%M:%S").date().isoformat()
-        else:
-            return datetime.strptime(updated_at_value, "%Y-%m-%d %H:%M:%S").date().isoformat()
-    except Exception:
-        return None
-
 def get_calls_per_day_from_db():
     """
-    Scans the table and returns count of items grouped by date.
+    Returns the count of calls grouped by date, from the per-day aggregates.
+    Days left empty by calls re-processed onto another date are skipped.
     """
-    date_counts = defaultdict(int)
-    items = []
-
-    response = table.scan(ProjectionExpression="CreatedOn")
-    print("Initial scan response:", response)
-    items.extend(response.get('Items', []))
-
-    while 'LastEvaluatedKey' in response:
-        response = table.scan(
-            ProjectionExpression="CreatedOn",
-            ExclusiveStartKey=response['LastEvaluatedKey']
-        )
-        items.extend(response.get('Items', []))
-
-    for item in items:
-        updated_at = item.get("CreatedOn")
-        parsed_date = parse_updated_at(updated_at)
-        if parsed_date:
-            date_counts[parsed_date] += 1
-
-    return dict(date_counts)
+    return {day["sk"]: day["calls"] for day in list_totals("day") if day["calls"] > 0}
 
 
 
 def get_sentiment_summary_from_dynamodb():
     try:
-        # Scan the DynamoDB table to get all items
-        response = table.scan()
-        all_items = response.get('Items', [])
-        print(f"Initial scan returned {len(all_items)} items.")
- 
-        while 'LastEvaluatedKey' in response:
-            response = table.scan(ExclusiveStartKey=response['LastEvaluatedKey'])
-            all_items.extend(response.get('Items', []))
- 
-        if not all_items:
+        totals = get_totals()
+        total_calls = totals["calls"]
+        if not total_calls:
             return {
                 "avg_sentiment": 0.0,
                 "total_calls": 0,
@@ -548,31 +393,10 @@ def get_sentiment_summary_from_dynamodb():
                 "neutral_calls": 0
             }
  
-        total_calls = 0
-        positive_calls = 0
-        negative_calls = 0
-        neutral_calls = 0
- 
-        for item in all_items:
-            # Check if 'Summary' and 'Sentiment_Scores' exist
-            summary = item.get('Summary', {})
-            sentiment_scores = summary.get('Sentiment_Scores', {})
- 
-            pos = int(sentiment_scores.get('Positive_Sentiment_Score', 0))
-            neg = int(sentiment_scores.get('Negative_Sentiment_Score', 0))
-            neu = int(sentiment_scores.get('Neutral_Sentiment_Score', 0))
- 
-            print(f"Processing Call ID: {item.get('call_id')}, Pos: {pos}, Neg: {neg}, Neu: {neu}")
- 
-            # Determine dominant sentiment
-            if pos >= neg and pos >= neu:
-                positive_calls += 1
-            elif neg >= pos and neg >= neu:
-                negative_calls += 1
-            else:
-                neutral_calls += 1
- 
-            total_calls += 1
+        # Each call counts once, under its dominant sentiment
+        positive_calls = totals["positive_calls"]
+        negative_calls = totals["negative_calls"]
+        neutral_calls = totals["neutral_calls"]
  
         # Calculate weighted average
         weighted_score = (
@@ -600,77 +424,28 @@ def get_sentiment_summary_from_dynamodb():
 
 def fetch_agent_score_rankings():
     try:
-        # Scan the DynamoDB table
-        response = table.scan()
-        print(response)
-        
-        if not response.get('Items'):
+        agents = list_totals("agent")
+        if not agents:
             return {"top_5_agents": [], "bottom_5_agents": [], "message": "No call records found."}
 
-        agent_metrics = defaultdict(lambda: {
-            "scores": [],
-            "professionalism": [],
-            "product_knowledge": [],
-            "communication_skills": [],
-            "problem_solving": []
-        })
-
-        # Process each item in the response
-        for item in response['Items']:
-            # Check if Summary exists and has Sales_Agent_Score
-            if 'Summary' not in item or 'Sales_Agent_Score' not in item['Summary']:
-                continue
-                
-            # Get agent name - checking multiple possible locations
-            agent_name = None
-            if 'Sales_Agent' in item['Summary'] and 'Name' in item['Summary']['Sales_Agent']:
-                agent_name = item['Summary']['Sales_Agent']['Name']
-            elif 'agent_name' in item:
-                agent_name = item['agent_name']
-                
-            if not agent_name:
-                continue
-
-            # Get scores from Sales_Agent_Score
-            scores = item['Summary']['Sales_Agent_Score']
-            
-            try:
-                # Handle score (check both Summary level and Sales_Agent_Score)
-                if 'score' in item['Summary'] and item['Summary']['score'] is not None:
-                    agent_metrics[agent_name]["scores"].append(float(item['Summary']['score']))
-                
-                # Handle other metrics
-                if 'Professionalism' in scores and scores['Professionalism'] is not None:
-                    agent_metrics[agent_name]["professionalism"].append(float(scores['Professionalism']))
-                if 'Product_Knowledge' in scores and scores['Product_Knowledge'] is not None:
-                    agent_metrics[agent_name]["product_knowledge"].append(float(scores['Product_Knowledge']))
-                if 'Communication_Skills' in scores and scores['Communication_Skills'] is not None:
-                    agent_metrics[agent_name]["communication_skills"].append(float(scores['Communication_Skills']))
-                if 'Problem_Solving' in scores and scores['Problem_Solving'] is not None:
-                    agent_metrics[agent_name]["problem_solving"].append(float(scores['Problem_Solving']))
-            except (ValueError, TypeError):
-                continue  # Skip non-numeric or invalid values
+        def average(agent, field):
+            count = agent[f"{field}_count"]
+            return round(agent[f"{field}_sum"] / count, 2) if count else 0
 
         # Calculate averages for each agent
         agent_avg_data = []
-        for name, metrics in agent_metrics.items():
-            total_calls = len(metrics["scores"])
+        for agent in agents:
+            total_calls = agent["score_count"]
             if total_calls == 0:
                 continue
-                
-            avg_score = round(sum(metrics["scores"]) / total_calls, 2)
-            avg_prof = round(sum(metrics["professionalism"]) / len(metrics["professionalism"]), 2) if metrics["professionalism"] else 0
-            avg_pk = round(sum(metrics["product_knowledge"]) / len(metrics["product_knowledge"]), 2) if metrics["product_knowledge"] else 0
-            avg_comm = round(sum(metrics["communication_skills"]) / len(metrics["communication_skills"]), 2) if metrics["communication_skills"] else 0
-            avg_prob = round(sum(metrics["problem_solving"]) / len(metrics["problem_solving"]), 2) if metrics["problem_solving"] else 0
-            
+
             agent_avg_data.append({
-                "agent_name": name,
-                "avg_score": avg_score,
-                "avg_professionalism": avg_prof,
-                "avg_product_knowledge": avg_pk,
-                "avg_communication_skills": avg_comm,
-                "avg_problem_solving": avg_prob,
+                "agent_name": agent["label"] or agent["sk"],
+                "avg_score": average(agent, "score"),
+                "avg_professionalism": average(agent, "professionalism"),
+                "avg_product_knowledge": average(agent, "product_knowledge"),
+                "avg_communication_skills": average(agent, "communication_skills"),
+                "avg_problem_solving": average(agent, "problem_solving"),
                 "total_calls": total_calls
             })
 
@@ -689,4 +464,4 @@ def fetch_agent_score_rankings():
             "top_5_agents": [],
             "bottom_5_agents": [],
             "message": f"Error fetching agent rankings: {str(e)}"
-        }
\ No newline at end of file
+        }
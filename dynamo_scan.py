@@ -0,0 +1,121 @@
+"""
+Parallel segmented DynamoDB scans.
+
+`scan_items` splits a table into `segments` parallel Scan workers
+(Segment/TotalSegments), follows every LastEvaluatedKey, and yields items as
+pages arrive. Only the attributes the caller names are read, via a
+ProjectionExpression, so analytics never pull transcripts they don't use.
+At most a few pages per worker are buffered, so memory stays bounded however
+large the table grows; stopping early (break, or closing the generator) stops
+the workers.
+
+    for item in scan_items("call_audit", ["call_id", "Summary.Sales_Agent.Name"]):
+        ...
+"""
+import os
+import queue
+import threading
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+from dotenv import load_dotenv
+from aws_clients import get_client
+
+load_dotenv()
+
+DYNAMO_SCAN_SEGMENTS = int(os.getenv("DYNAMO_SCAN_SEGMENTS", "4"))
+# Pages buffered per worker before it waits for the consumer
+DYNAMO_SCAN_BUFFER_PAGES = int(os.getenv("DYNAMO_SCAN_BUFFER_PAGES", "2"))
+
+_deserializer = TypeDeserializer()
+_serializer = TypeSerializer()
+_DONE = object()
+# How often a worker blocked on a full buffer checks whether the scan was abandoned
+_PUT_TIMEOUT = 0.1
+
+
+def projection(attributes) -> dict:
+    """
+    ProjectionExpression for attribute paths such as "Summary.Customer.Email".
+
+    Every path element gets a placeholder, so reserved words ("Name", "Status") are safe.
+    """
+    names, placeholders, paths = {}, {}, []
+    for attribute in attributes:
+        parts = []
+        for part in attribute.split("."):
+            if part not in placeholders:
+                placeholders[part] = f"#p{len(placeholders)}"
+                names[placeholders[part]] = part
+            parts.append(placeholders[part])
+        paths.append(".".join(parts))
+    return {"ProjectionExpression": ", ".join(paths), "ExpressionAttributeNames": names}
+
+
+def scan_items(table_name: str, attributes, segments: int = None, filter_expression: str = None,
+               names: dict = None, values: dict = None):
+    """
+    Yield every item of a table, projected to `attributes`.
+
+    Args:
+        table_name: DynamoDB table to scan
+        attributes: Attribute paths to read (top-level names or dotted map paths)
+        segments: Parallel scan workers (DYNAMO_SCAN_SEGMENTS); item order is not defined
+        filter_expression: Optional FilterExpression; it saves transfer, not read capacity
+        names, values: Extra ExpressionAttributeNames and plain Python ExpressionAttributeValues
+            used by filter_expression
+
+    Yields:
+        Items as plain Python values (numbers as Decimal), like Table.scan returns them
+    """
+    segments = max(1, segments or DYNAMO_SCAN_SEGMENTS)
+    request = {"TableName": table_name, **projection(attributes)}
+    if filter_expression:
+        request["FilterExpression"] = filter_expression
+        request["ExpressionAttributeNames"].update(names or {})
+        if values:
+            request["ExpressionAttributeValues"] = {key: _serializer.serialize(value) for key, value in values.items()}
+
+    client = get_client("dynamodb")
+    pages = queue.Queue(maxsize=segments * DYNAMO_SCAN_BUFFER_PAGES)
+    stop = threading.Event()
+
+    def put(page):
+        while not stop.is_set():
+            try:
+                pages.put(page, timeout=_PUT_TIMEOUT)
+                return
+            except queue.Full:
+                continue
+
+    def scan_segment(segment):
+        kwargs = dict(request, Segment=segment, TotalSegments=segments) if segments > 1 else dict(request)
+        try:
+            while not stop.is_set():
+                page = client.scan(**kwargs)
+                put(page.get("Items", []))
+                if "LastEvaluatedKey" not in page:
+                    break
+                kwargs["ExclusiveStartKey"] = page["LastEvaluatedKey"]
+        except Exception as e:
+            put(e)
+        finally:
+            put(_DONE)
+
+    workers = [threading.Thread(target=scan_segment, args=(segment,), name=f"dynamo-scan-{segment}", daemon=True)
+               for segment in range(segments)]
+    for worker in workers:
+        worker.start()
+    try:
+        running = segments
+        while running:
+            page = pages.get()
+            if page is _DONE:
+                running -= 1
+            elif isinstance(page, Exception):
+                raise page
+            else:
+                for item in page:
+                    yield {key: _deserializer.deserialize(value) for key, value in item.items()}
+    finally:
+        stop.set()
+        for worker in workers:
+            worker.join()
@@ -0,0 +1,167 @@
+"""
+Two-tier cache for Titan embeddings.
+
+Lookups go to an in-process LRU first, then to a local SQLite file shared by
+every worker on the host. Entries are keyed by model id and normalized text, so
+repeated customer questions ("what is the interest rate") are embedded once.
+
+Warm the cache from a file with one text per line:
+
+    python embedding_cache.py warm questions.txt
+"""
+import os
+import re
+import sys
+import sqlite3
+import hashlib
+import argparse
+import threading
+import unicodedata
+from collections import OrderedDict
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "embedding_cache.db")
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "10000"))
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Unicode NFKC, case-folded, with runs of whitespace collapsed."""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", text)).strip().casefold()
+
+
+def cache_key(model_id: str, text: str) -> str:
+    return hashlib.sha256(f"{model_id}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    def __init__(self, path: str = EMBEDDING_CACHE_PATH, max_entries: int = EMBEDDING_CACHE_SIZE):
+        self.path = path
+        self.max_entries = max_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0}
+        if self.path:
+            conn = self._connect()
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    key TEXT PRIMARY KEY,
+                    model_id TEXT NOT NULL,
+                    vector BLOB NOT NULL,
+                    created_at REAL NOT NULL DEFAULT (julianday('now'))
+                )
+            """)
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            self._local.conn = conn
+        return conn
+
+    def _remember(self, key: str, vector: list):
+        with self._lock:
+            self._memory[key] = vector
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def get(self, model_id: str, text: str):
+        """Return the cached embedding as a list of floats, or None."""
+        key = cache_key(model_id, text)
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                return vector
+
+        if self.path:
+            row = self._connect().execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                vector = np.frombuffer(row[0], dtype=np.float32).tolist()
+                self._remember(key, vector)
+                with self._lock:
+                    self._stats["disk_hits"] += 1
+                return vector
+
+        with self._lock:
+            self._stats["misses"] += 1
+        return None
+
+    def put(self, model_id: str, text: str, vector: list):
+        if not vector:
+            return
+        key = cache_key(model_id, text)
+        self._remember(key, list(vector))
+        if self.path:
+            self._connect().execute(
+                "INSERT OR REPLACE INTO embeddings (key, model_id, vector) VALUES (?, ?, ?)",
+                (key, model_id, np.asarray(vector, dtype=np.float32).tobytes())
+            )
+        with self._lock:
+            self._stats["writes"] += 1
+
+    def get_or_compute(self, model_id: str, text: str, compute):
+        vector = self.get(model_id, text)
+        if vector is None:
+            vector = compute(text)
+            self.put(model_id, text, vector)
+        return vector
+
+    def preload(self, limit: int = None) -> int:
+        """Load the most recent disk entries into memory, e.g. at worker startup."""
+        if not self.path:
+            return 0
+        limit = min(limit or self.max_entries, self.max_entries)
+        rows = self._connect().execute(
+            "SELECT key, vector FROM embeddings ORDER BY created_at DESC LIMIT ?", (limit,)
+        ).fetchall()
+        for key, blob in reversed(rows):
+            self._remember(key, np.frombuffer(blob, dtype=np.float32).tolist())
+        return len(rows)
+
+    def warm_up(self, texts, compute, model_id: str) -> int:
+        """Embed every text that isn't cached yet. Returns how many were computed."""
+        computed = 0
+        for text in texts:
+            if text and self.get(model_id, text) is None:
+                vector = compute(text)
+                self.put(model_id, text, vector)
+                computed += bool(vector)
+        return computed
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["memory_hits"] + stats["disk_hits"]) / lookups, 4) if lookups else 0.0
+        return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Embedding cache tools")
+    commands = parser.add_subparsers(dest="command", required=True)
+    warm = commands.add_parser("warm", help="Embed and cache every line of a text file")
+    warm.add_argument("path", help="File with one text per line, or - for stdin")
+    args = parser.parse_args(argv)
+
+    if args.command == "warm":
+        from rag import embedding_cache, DEFAULT_EMBEDDING_MODEL, _invoke_titan_embedding
+        source = sys.stdin if args.path == "-" else open(args.path, encoding="utf-8")
+        with source:
+            texts = [line.strip() for line in source if line.strip()]
+        computed = embedding_cache.warm_up(texts, _invoke_titan_embedding, DEFAULT_EMBEDDING_MODEL)
+        print(f"✅ Embedded {computed} new texts, {len(texts) - computed} already cached")
+        print(embedding_cache.stats())
+
+
+if __name__ == "__main__":
+    main()
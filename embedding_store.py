@@ -0,0 +1,201 @@
+"""
+Binary, memory-mapped storage for the knowledge base embeddings.
+
+A store directory holds one sub-directory per version plus a CURRENT file naming
+the active one:
+
+    kb_store/
+        CURRENT
+        <version>/
+            embeddings.npy      float32 matrix, rows L2-normalized
+            metadata.jsonl      one {"file_name", "page"} object per row
+            texts.bin           UTF-8 chunk texts back to back
+            text_offsets.npy    int64 offsets into texts.bin (rows + 1 entries)
+            manifest.json       rows, dim, source and creation time
+
+Workers open the arrays with mmap, so every uvicorn process on a host shares the
+same page cache instead of holding its own parsed copy.
+
+Convert the existing CSV with:
+
+    python embedding_store.py convert validation_data.csv kb_store
+    python embedding_store.py convert s3://bucket/validation_data/MS_1_MS_2_MS_3_merged.csv kb_store
+"""
+import os
+import io
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import numpy as np
+
+PAGE_COLUMNS = ("page", "page_num", "page_number")
+
+
+def current_version(store_dir: str):
+    """Name of the active version, or None if the store is empty."""
+    try:
+        with open(os.path.join(store_dir, "CURRENT"), encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+class _TextColumn:
+    """Sequence view over texts.bin that only decodes the rows that are read."""
+
+    def __init__(self, blob, offsets):
+        self.blob = blob
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, row):
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        return bytes(self.blob[start:end]).decode("utf-8")
+
+
+class EmbeddingStore:
+    """Read-only, memory-mapped view of one store version."""
+
+    def __init__(self, store_dir: str, version: str = None):
+        self.version = version or current_version(store_dir)
+        if not self.version:
+            raise FileNotFoundError(f"No embedding store found in {store_dir}")
+        self.path = path = os.path.join(store_dir, self.version)
+
+        with open(os.path.join(path, "manifest.json"), encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        self.matrix = np.load(os.path.join(path, "embeddings.npy"), mmap_mode="r")
+        offsets = np.load(os.path.join(path, "text_offsets.npy"), mmap_mode="r")
+        blob_path = os.path.join(path, "texts.bin")
+        blob = np.memmap(blob_path, dtype=np.uint8, mode="r") if os.path.getsize(blob_path) else b""
+        self.texts = _TextColumn(blob, offsets)
+
+        self.file_names, self.pages = [], []
+        with open(os.path.join(path, "metadata.jsonl"), encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                self.file_names.append(record.get("file_name"))
+                self.pages.append(record.get("page"))
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+
+def write_store(store_dir: str, matrix: np.ndarray, file_names, texts, pages=None,
+                source: str = None, keep_versions: int = 2, finalize=None) -> str:
+    """
+    Write a new store version and make it current.
+
+    The version is written to its own directory first and CURRENT is swapped with
+    os.replace, so readers never see a half-written store. Processes still mapping
+    an older version keep working until they reopen.
+
+    `finalize(path, matrix)`, when given, runs on the new version's directory before
+    it becomes current, e.g. to build the ANN index into it.
+
+    Returns:
+        The new version name
+    """
+    matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+    pages = pages if pages is not None else [None] * len(texts)
+    if not (matrix.shape[0] == len(file_names) == len(texts) == len(pages)):
+        raise ValueError("matrix, file_names, texts and pages must have the same number of rows")
+
+    encoded = [str(text).encode("utf-8") for text in texts]
+    digest = hashlib.sha256(matrix.tobytes())
+    for chunk in encoded:
+        digest.update(chunk)
+    version = f"{time.strftime('%Y%m%dT%H%M%S')}-{digest.hexdigest()[:12]}"
+
+    os.makedirs(store_dir, exist_ok=True)
+    tmp_path = os.path.join(store_dir, f".tmp-{version}")
+    final_path = os.path.join(store_dir, version)
+    os.makedirs(tmp_path, exist_ok=True)
+
+    np.save(os.path.join(tmp_path, "embeddings.npy"), matrix)
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    with open(os.path.join(tmp_path, "texts.bin"), "wb") as f:
+        for i, chunk in enumerate(encoded):
+            f.write(chunk)
+            offsets[i + 1] = offsets[i] + len(chunk)
+    np.save(os.path.join(tmp_path, "text_offsets.npy"), offsets)
+    with open(os.path.join(tmp_path, "metadata.jsonl"), "w", encoding="utf-8") as f:
+        for file_name, page in zip(file_names, pages):
+            f.write(json.dumps({"file_name": file_name, "page": page}, default=str) + "\n")
+    with open(os.path.join(tmp_path, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "version": version,
+            "rows": int(matrix.shape[0]),
+            "dim": int(matrix.shape[1]) if matrix.ndim == 2 else 0,
+            "source": source,
+            "created_at": time.time()
+        }, f, indent=2)
+    if finalize:
+        finalize(tmp_path, matrix)
+
+    os.replace(tmp_path, final_path)
+    current_tmp = os.path.join(store_dir, "CURRENT.tmp")
+    with open(current_tmp, "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(current_tmp, os.path.join(store_dir, "CURRENT"))
+
+    _prune_versions(store_dir, keep_versions)
+    return version
+
+
+def _prune_versions(store_dir: str, keep: int):
+    versions = sorted(
+        name for name in os.listdir(store_dir)
+        if not name.startswith(".") and os.path.isdir(os.path.join(store_dir, name))
+    )
+    for name in versions[:-keep] if keep > 0 else []:
+        shutil.rmtree(os.path.join(store_dir, name), ignore_errors=True)
+
+
+def convert_csv(source: str, store_dir: str) -> str:
+    """Convert the knowledge base CSV (local path or s3:// URI) into a store version."""
+    import pandas as pd
+    from knowledge_base import build_embedding_matrix
+
+    if source.startswith("s3://"):
+        from aws_clients import get_client
+        bucket, key = source[len("s3://"):].split("/", 1)
+        body = get_client("s3").get_object(Bucket=bucket, Key=key)["Body"].read()
+        df = pd.read_csv(io.BytesIO(body))
+    else:
+        df = pd.read_csv(source)
+
+    matrix, positions = build_embedding_matrix(df["embedding"].tolist())
+    rows = df.iloc[positions]
+    page_column = next((c for c in PAGE_COLUMNS if c in df.columns), None)
+    pages = rows[page_column].tolist() if page_column else None
+    version = write_store(
+        store_dir,
+        matrix,
+        rows["file_name"].tolist() if "file_name" in df else [None] * len(rows),
+        rows["text"].astype(str).tolist() if "text" in df else [""] * len(rows),
+        pages,
+        source=source
+    )
+    print(f"✅ Wrote {matrix.shape[0]} of {len(df)} rows ({matrix.nbytes / 1e6:.1f} MB matrix) to {store_dir}/{version}")
+    return version
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Knowledge base embedding store tools")
+    commands = parser.add_subparsers(dest="command", required=True)
+    convert = commands.add_parser("convert", help="Convert the knowledge base CSV to the binary store")
+    convert.add_argument("source", help="CSV path or s3://bucket/key")
+    convert.add_argument("store_dir")
+    args = parser.parse_args(argv)
+
+    if args.command == "convert":
+        convert_csv(args.source, args.store_dir)
+
+
+if __name__ == "__main__":
+    main()
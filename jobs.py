@@ -0,0 +1,225 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import asyncio
+import threading
+from datetime import datetime
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Job queue configuration
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", "jobs.db")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "2"))
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class JobQueue:
+    """
+    Durable job queue backed by SQLite.
+
+    Every state change is committed before it is acted upon, so a crash at any
+    point leaves the job either queued or running. Jobs found in the running
+    state at startup are put back in the queue until they run out of attempts.
+    """
+
+    def __init__(self, db_path: str = JOBS_DB_PATH, max_attempts: int = JOB_MAX_ATTEMPTS):
+        self.db_path = db_path
+        self.max_attempts = max_attempts
+        self._wakeup = threading.Condition()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    stage TEXT,
+                    payload TEXT NOT NULL,
+                    result TEXT,
+                    error TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at)")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA synchronous=FULL")
+        return _ClosingConnection(conn)
+
+    def enqueue(self, payload: dict) -> str:
+        """Persist a new job and wake up one idle worker. Returns the job id."""
+        job_id = uuid.uuid4().hex
+        now = datetime.utcnow().isoformat()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (job_id, status, stage, payload, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, QUEUED, QUEUED, json.dumps(payload), now, now)
+            )
+        with self._wakeup:
+            self._wakeup.notify()
+        return job_id
+
+    def claim(self):
+        """Atomically move the oldest queued job to running. Returns (job_id, payload) or None."""
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT job_id, payload FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1",
+                    (QUEUED,)
+                ).fetchone()
+                if row is None:
+                    conn.execute("COMMIT")
+                    return None
+                conn.execute(
+                    "UPDATE jobs SET status = ?, attempts = attempts + 1, updated_at = ? WHERE job_id = ?",
+                    (RUNNING, datetime.utcnow().isoformat(), row["job_id"])
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return row["job_id"], json.loads(row["payload"])
+
+    def set_stage(self, job_id: str, stage: str):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET stage = ?, updated_at = ? WHERE job_id = ?",
+                (stage, datetime.utcnow().isoformat(), job_id)
+            )
+
+    def complete(self, job_id: str, result: dict):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, stage = ?, result = ?, error = NULL, updated_at = ? WHERE job_id = ?",
+                (DONE, DONE, json.dumps(result, default=str), datetime.utcnow().isoformat(), job_id)
+            )
+
+    def fail(self, job_id: str, error: str):
+        """Record a failure; the job is re-queued while it has attempts left."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT attempts FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            status = QUEUED if row and row["attempts"] < self.max_attempts else FAILED
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE job_id = ?",
+                (status, error, datetime.utcnow().isoformat(), job_id)
+            )
+        if status == QUEUED:
+            with self._wakeup:
+                self._wakeup.notify()
+
+    def recover(self) -> int:
+        """Re-queue jobs left running by a crashed process. Returns how many were recovered."""
+        now = datetime.utcnow().isoformat()
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = 'Exceeded max attempts after restart', updated_at = ? "
+                "WHERE status = ? AND attempts >= ?",
+                (FAILED, now, RUNNING, self.max_attempts)
+            )
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, updated_at = ? WHERE status = ?",
+                (QUEUED, now, RUNNING)
+            )
+            return cursor.rowcount
+
+    def get(self, job_id: str):
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        return {
+            "job_id": row["job_id"],
+            "status": row["status"],
+            "stage": row["stage"],
+            "attempts": row["attempts"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+            "result": json.loads(row["result"]) if row["result"] else None,
+            "error": row["error"]
+        }
+
+    def wait_for_work(self, timeout: float):
+        with self._wakeup:
+            self._wakeup.wait(timeout)
+
+
+class _ClosingConnection:
+    """Context manager that always closes the wrapped sqlite3 connection."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self.conn
+
+    def __exit__(self, *exc):
+        self.conn.close()
+        return False
+
+
+class JobWorkerPool:
+    """
+    Runs queued jobs on a fixed number of background threads.
+
+    Each thread owns its own event loop, so the async pipeline stages of one
+    job never block the HTTP event loop or the other workers.
+    """
+
+    def __init__(self, queue: JobQueue, handler, workers: int = JOB_WORKERS):
+        self.queue = queue
+        self.handler = handler
+        self.workers = workers
+        self._threads = []
+        self._stopping = threading.Event()
+
+    def start(self):
+        recovered = self.queue.recover()
+        if recovered:
+            print(f"♻️ Re-queued {recovered} job(s) interrupted by a previous shutdown")
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = 5):
+        self._stopping.set()
+        with self.queue._wakeup:
+            self.queue._wakeup.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _run(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            while not self._stopping.is_set():
+                claimed = self.queue.claim()
+                if claimed is None:
+                    self.queue.wait_for_work(JOB_POLL_INTERVAL)
+                    continue
+
+                job_id, payload = claimed
+                started = time.perf_counter()
+                try:
+                    result = loop.run_until_complete(self.handler(job_id, payload))
+                    self.queue.complete(job_id, result)
+                    print(f"✅ Job {job_id} finished in {time.perf_counter() - started:.1f}s")
+                except Exception as e:
+                    print(f"❌ Job {job_id} failed: {e}")
+                    self.queue.fail(job_id, str(e))
+        finally:
+            loop.close()
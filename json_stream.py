@@ -0,0 +1,124 @@
+"""
+Incremental parser for a JSON object arriving in pieces, e.g. model output
+streamed token by token.
+
+`IncrementalJSONParser.feed` returns every top-level field whose value became
+complete in the new text, so a caller can show "Customer" or "Sentiment_Scores"
+while the model is still writing the rest of the object. Text before the first
+"{" (a preamble the model added) is skipped. Every character is scanned once.
+
+    parser = IncrementalJSONParser()
+    for delta in deltas:
+        for key, value in parser.feed(delta):
+            ...
+"""
+import json
+
+_WHITESPACE = " \t\r\n"
+
+
+class IncrementalJSONParser:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Forget everything fed so far, e.g. when the stream restarts."""
+        self.text = ""
+        self.fields = {}
+        self._pos = 0
+        self._phase = "before"      # before -> key -> colon -> value -> after -> ... -> done
+        self._key_start = None
+        self._key = None
+        self._value_start = None
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    @property
+    def done(self) -> bool:
+        return self._phase == "done"
+
+    def feed(self, text: str):
+        """
+        Add the next piece of text.
+
+        Returns:
+            List of (key, value) for top-level fields completed by this piece, in order
+        """
+        self.text += text
+        completed = []
+        text, pos = self.text, self._pos
+        while pos < len(text) and self._phase != "done":
+            char = text[pos]
+            phase = self._phase
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if phase == "key":
+                        self._key = self._decode(text[self._key_start:pos + 1])
+                        self._phase = "colon"
+                    elif self._depth == 0:
+                        self._complete(text[self._value_start:pos + 1], completed)
+            elif phase == "before":
+                if char == "{":
+                    self._phase = "key"
+            elif phase == "key":
+                if char == '"':
+                    self._key_start = pos
+                    self._in_string = True
+                elif char == "}":
+                    self._phase = "done"
+            elif phase == "colon":
+                if char == ":":
+                    self._phase = "value"
+                    self._value_start = None
+            elif phase == "value":
+                if self._value_start is None:
+                    if char not in _WHITESPACE:
+                        self._value_start = pos
+                        if char == '"':
+                            self._in_string = True
+                        elif char in "{[":
+                            self._depth = 1
+                elif self._depth:
+                    if char == '"':
+                        self._in_string = True
+                    elif char in "{[":
+                        self._depth += 1
+                    elif char in "}]":
+                        self._depth -= 1
+                        if not self._depth:
+                            self._complete(text[self._value_start:pos + 1], completed)
+                elif char in _WHITESPACE or char in ",}":
+                    # End of a number, true, false or null; the terminator is handled as "after"
+                    self._complete(text[self._value_start:pos], completed)
+                    continue
+            elif phase == "after":
+                if char == ",":
+                    self._phase = "key"
+                elif char == "}":
+                    self._phase = "done"
+            pos += 1
+        self._pos = pos
+        return completed
+
+    def _decode(self, raw: str):
+        try:
+            return json.loads(raw)
+        except ValueError:
+            return None
+
+    def _complete(self, raw: str, completed: list):
+        self._phase = "after"
+        try:
+            value = json.loads(raw)
+        except ValueError:
+            # A malformed value is skipped; the final parse of the whole text reports the error
+            return
+        self.fields[self._key] = value
+        completed.append((self._key, value))
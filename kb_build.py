@@ -0,0 +1,252 @@
+"""
+Incremental knowledge base build from product PDFs.
+
+    python kb_build.py docs/ kb_store --workers 4 --concurrency 8 --rate 20 --build-index
+
+PDF pages are extracted in a process pool, chunked, and the chunks embedded
+concurrently under a requests-per-second limit. A build manifest in the store
+directory records a hash per file and per page; unchanged files are not even
+parsed, and unchanged pages reuse the embeddings of the previous store version,
+so only edited pages go to Bedrock. The result is written as a new
+EmbeddingStore version.
+"""
+import os
+import json
+import time
+import asyncio
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+from embedding_store import EmbeddingStore, current_version, write_store
+
+MANIFEST_FILE = "build_manifest.json"
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _page_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _extract_pages(path: str):
+    """Process pool worker: (page_num, text) for every page of one PDF."""
+    from rag import extract_pdf_pages
+    return extract_pdf_pages(path)
+
+
+class _RateLimiter:
+    """Spaces out calls so no more than `rate` start per second."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+def _load_previous(store_dir: str, chunking: dict):
+    """Previous manifest and store when they match the current settings, else (None, None)."""
+    try:
+        with open(os.path.join(store_dir, MANIFEST_FILE), encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None, None
+    if manifest.get("chunking") != chunking or manifest.get("version") != current_version(store_dir):
+        return None, None
+    try:
+        return manifest, EmbeddingStore(store_dir)
+    except Exception:
+        return None, None
+
+
+def _previous_rows(store: EmbeddingStore):
+    """Row indices of the previous store grouped by (file_name, page)."""
+    rows = {}
+    for row, (file_name, page) in enumerate(zip(store.file_names, store.pages)):
+        rows.setdefault((file_name, page), []).append(row)
+    return rows
+
+
+async def _embed_chunks(chunks, concurrency: int, rate: float):
+    from rag import generate_embeddings
+    from aws_clients import run_on_bedrock_pool
+
+    limiter = _RateLimiter(rate)
+    semaphore = asyncio.Semaphore(concurrency)
+    done = 0
+
+    async def embed(text):
+        nonlocal done
+        async with semaphore:
+            await limiter.wait()
+            vector = await run_on_bedrock_pool(generate_embeddings, text)
+        done += 1
+        if done % 100 == 0:
+            print(f"   embedded {done}/{len(chunks)} chunks")
+        return vector
+
+    return await asyncio.gather(*(embed(text) for text in chunks))
+
+
+def build(source_dir: str, store_dir: str, chunk_size: int = 200, workers: int = None,
+          concurrency: int = 8, rate: float = 20, build_index: bool = False,
+          overlap: int = 0, unit: str = "words", align_sentences: bool = True) -> dict:
+    """Rebuild the store from every PDF under source_dir, embedding only new or changed pages."""
+    from rag import chunk_page
+
+    # Any change to the chunking settings invalidates every stored chunk
+    chunking = {"size": chunk_size, "overlap": overlap, "unit": unit, "align_sentences": align_sentences}
+    started = time.perf_counter()
+    pdfs = sorted(
+        os.path.join(root, name)
+        for root, _, names in os.walk(source_dir)
+        for name in names if name.lower().endswith(".pdf")
+    )
+    previous, previous_store = _load_previous(store_dir, chunking)
+    previous_files = previous["files"] if previous else {}
+    previous_rows = _previous_rows(previous_store) if previous_store is not None else {}
+
+    files = {}
+    reused = []       # (file_name, page, [previous rows])
+    to_parse = []
+    for path in pdfs:
+        file_name = os.path.relpath(path, source_dir)
+        sha256 = _file_sha256(path)
+        known = previous_files.get(file_name)
+        if known and known["sha256"] == sha256:
+            files[file_name] = known
+            for page in known["pages"]:
+                reused.append((file_name, int(page), previous_rows.get((file_name, int(page)), [])))
+        else:
+            to_parse.append((path, file_name, sha256))
+
+    if previous and not to_parse and files.keys() == previous_files.keys():
+        print(f"✅ Knowledge base {previous['version']} is up to date ({len(pdfs)} PDFs unchanged)")
+        if build_index:
+            from ann_index import IVFIndex
+            # Saved next to the current version; running workers pick it up on their next refresh
+            if not IVFIndex.exists(previous_store.path):
+                IVFIndex.build(previous_store.matrix).save(previous_store.path)
+                print(f"✅ Built the ANN index for {previous['version']}")
+        return {"version": previous["version"], "pdfs": len(pdfs), "changed_pdfs": 0, "pages_embedded": 0,
+                "pages_reused": len(reused), "chunks_embedded": 0, "rows": len(previous_store),
+                "seconds": round(time.perf_counter() - started, 2)}
+
+    new_chunks = []   # (file_name, page, text)
+    pages_embedded = 0
+    if to_parse:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            extracted = pool.map(_extract_pages, [path for path, _, _ in to_parse])
+            for (path, file_name, sha256), pages in zip(to_parse, extracted):
+                known_pages = previous_files.get(file_name, {}).get("pages", {})
+                page_hashes = {}
+                for page, text in pages:
+                    page_hashes[str(page)] = _page_hash(text)
+                    if known_pages.get(str(page)) == page_hashes[str(page)]:
+                        reused.append((file_name, page, previous_rows.get((file_name, page), [])))
+                    else:
+                        new_chunks.extend((file_name, page, chunk) for chunk in chunk_page(text, chunk_size, overlap, unit, align_sentences))
+                        pages_embedded += 1
+                files[file_name] = {"sha256": sha256, "pages": page_hashes}
+
+    print(f"📄 {len(pdfs)} PDFs: {len(to_parse)} changed, {pages_embedded} pages to embed "
+          f"({len(new_chunks)} chunks), {len(reused)} pages reused")
+
+    vectors = asyncio.run(_embed_chunks([text for _, _, text in new_chunks], concurrency, rate)) if new_chunks else []
+
+    file_names, pages, texts, rows = [], [], [], []
+    failed_pages = set()
+    for (file_name, page, text), vector in zip(new_chunks, vectors):
+        if not vector:
+            failed_pages.add((file_name, page))
+            continue
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if not norm:
+            continue
+        file_names.append(file_name)
+        pages.append(page)
+        texts.append(text)
+        rows.append(vector / norm)
+    for file_name, page, previous in reused:
+        for row in previous:
+            file_names.append(file_name)
+            pages.append(page)
+            texts.append(previous_store.texts[row])
+            rows.append(np.asarray(previous_store.matrix[row], dtype=np.float32))
+
+    # Pages whose embedding failed are left out of the manifest so the next build retries them
+    for file_name, page in failed_pages:
+        files[file_name]["pages"].pop(str(page), None)
+        files[file_name]["sha256"] = None
+    if failed_pages:
+        print(f"⚠️ {len(failed_pages)} pages had chunks that failed to embed and will be retried next build")
+
+    if not rows:
+        raise SystemExit("No chunks to write, is the source directory empty?")
+    finalize = None
+    if build_index:
+        from ann_index import IVFIndex
+
+        def finalize(path, matrix):
+            IVFIndex.build(matrix).save(path)
+    version = write_store(store_dir, np.vstack(rows), file_names, texts, pages, source=os.path.abspath(source_dir),
+                          finalize=finalize)
+
+    manifest = {"version": version, "chunking": chunking, "files": files, "built_at": time.time()}
+    tmp = os.path.join(store_dir, MANIFEST_FILE + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, os.path.join(store_dir, MANIFEST_FILE))
+
+    summary = {
+        "version": version,
+        "pdfs": len(pdfs),
+        "changed_pdfs": len(to_parse),
+        "pages_embedded": pages_embedded,
+        "pages_reused": len(reused),
+        "chunks_embedded": len(new_chunks),
+        "rows": len(rows),
+        "seconds": round(time.perf_counter() - started, 2)
+    }
+    print(f"✅ Knowledge base {version} built: {summary}")
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the knowledge base embedding store from PDFs")
+    parser.add_argument("source_dir", help="Directory searched recursively for PDFs")
+    parser.add_argument("store_dir", help="EmbeddingStore directory (KB_STORE_DIR)")
+    parser.add_argument("--chunk-size", type=int, default=200, help="Chunk budget in --unit")
+    parser.add_argument("--overlap", type=int, default=0, help="Units of context shared by consecutive chunks")
+    parser.add_argument("--unit", choices=["words", "tokens"], default="words")
+    parser.add_argument("--no-sentence-align", dest="align_sentences", action="store_false",
+                        help="Cut fixed word windows instead of breaking between sentences")
+    parser.add_argument("--workers", type=int, default=None, help="PDF extraction processes")
+    parser.add_argument("--concurrency", type=int, default=8, help="Embedding requests in flight")
+    parser.add_argument("--rate", type=float, default=20, help="Embedding requests started per second")
+    parser.add_argument("--build-index", action="store_true", help="Also build the IVF ANN index")
+    args = parser.parse_args(argv)
+    build(args.source_dir, args.store_dir, args.chunk_size, args.workers, args.concurrency, args.rate,
+          args.build_index, args.overlap, args.unit, args.align_sentences)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,353 @@
+import io
+import os
+import ast
+import json
+import time
+import threading
+from typing import TYPE_CHECKING
+import numpy as np
+from botocore.exceptions import ClientError
+from dotenv import load_dotenv
+from embedding_store import EmbeddingStore, current_version
+from ann_index import ExactIndex, IVFIndex
+from bm25 import BM25Index, reciprocal_rank_fusion
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+load_dotenv()
+
+BUCKET_NAME = os.getenv("BUCKET_NAME")
+KB_S3_KEY = os.getenv("KB_S3_KEY", "validation_data/MS_1_MS_2_MS_3_merged.csv")
+# Seconds between ETag checks against S3
+KB_REFRESH_INTERVAL = float(os.getenv("KB_REFRESH_INTERVAL", "300"))
+# Optional local EmbeddingStore directory used instead of the CSV
+KB_STORE_DIR = os.getenv("KB_STORE_DIR")
+# "hybrid" fuses BM25 and embedding rankings, "vector" uses the embeddings only
+KB_SEARCH_MODE = os.getenv("KB_SEARCH_MODE", "hybrid")
+# Rows taken from each ranking before reciprocal rank fusion
+KB_FUSION_DEPTH = int(os.getenv("KB_FUSION_DEPTH", "50"))
+KB_RRF_K = int(os.getenv("KB_RRF_K", "60"))
+# When set, only this many BM25 candidates are scored against the query embedding
+KB_BM25_PREFILTER = int(os.getenv("KB_BM25_PREFILTER", "0"))
+
+
+def parse_embedding(value):
+    """Parse an embedding stored as a list literal without eval()."""
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return value
+    try:
+        return json.loads(value)
+    except (TypeError, ValueError):
+        return ast.literal_eval(value)
+
+
+def build_embedding_matrix(embeddings):
+    """
+    Stack embeddings into a contiguous float32 matrix with L2-normalized rows.
+
+    Rows that can't be parsed, have the wrong dimension or a zero norm are left out.
+
+    Returns:
+        Tuple of (matrix, positions) where positions[i] is the input index of matrix row i
+    """
+    vectors, positions = [], []
+    dim = None
+    for position, value in enumerate(embeddings):
+        try:
+            vector = np.asarray(parse_embedding(value), dtype=np.float32)
+        except Exception:
+            continue  # Skip rows with invalid embeddings
+        if vector.ndim != 1 or vector.size == 0:
+            continue
+        dim = dim or vector.size
+        if vector.size != dim:
+            continue
+        vectors.append(vector)
+        positions.append(position)
+
+    if not vectors:
+        return np.zeros((0, 0), dtype=np.float32), np.zeros(0, dtype=np.int64)
+
+    matrix = np.ascontiguousarray(np.vstack(vectors))
+    norms = np.linalg.norm(matrix, axis=1)
+    keep = norms > 0
+    matrix = matrix[keep] / norms[keep, None]
+    return np.ascontiguousarray(matrix, dtype=np.float32), np.asarray(positions, dtype=np.int64)[keep]
+
+
+def top_k(matrix: np.ndarray, query, k: int):
+    """
+    Cosine top-k against a row-normalized matrix: one matrix-vector product plus argpartition.
+
+    Returns:
+        Tuple of (row indices, scores), best match first
+    """
+    return ExactIndex(matrix).search(query, k)
+
+
+class KnowledgeBase:
+    """
+    Immutable snapshot of one version of the knowledge base.
+
+    Embeddings live in a row-normalized float32 matrix so a query is a single
+    matrix-vector product. Snapshots built from the CSV hold the matrix in
+    memory; snapshots opened from an EmbeddingStore map it from disk and use
+    the store's IVF index when one has been built. A BM25 inverted index over
+    the chunk texts is built alongside for hybrid search.
+    """
+
+    def __init__(self, matrix, file_names, texts, etag: str, df: "pd.DataFrame" = None, index=None, lexical=None):
+        self.matrix = matrix
+        self.file_names = file_names
+        self.texts = texts
+        self.etag = etag
+        self.df = df
+        self.index = index or ExactIndex(matrix)
+        self.lexical = lexical if lexical is not None else BM25Index.build(texts)
+        self.loaded_at = time.time()
+
+    @classmethod
+    def from_dataframe(cls, df: "pd.DataFrame", etag: str):
+        matrix, positions = build_embedding_matrix(df["embedding"].tolist() if "embedding" in df else [])
+        file_names = df["file_name"].iloc[positions].tolist() if "file_name" in df else [None] * len(positions)
+        texts = df["text"].iloc[positions].astype(str).tolist() if "text" in df else [""] * len(positions)
+        return cls(matrix, file_names, texts, etag, df)
+
+    @classmethod
+    def from_store(cls, store: EmbeddingStore):
+        # Use the IVF index saved next to the embeddings when there is one
+        index = IVFIndex.load(store.path, store.matrix)
+        return cls(store.matrix, store.file_names, store.texts, store.version, index=index)
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    def search(self, query_embedding, top_n: int = 5, query_text: str = None, mode: str = None,
+               prefilter: int = None):
+        """
+        Return the top_n most relevant chunks as (row, similarity, file_name, text) tuples.
+
+        With query_text in hybrid mode the embedding and BM25 rankings are merged
+        by reciprocal rank fusion; similarity is still the cosine similarity of
+        each returned chunk. With `prefilter` (KB_BM25_PREFILTER) set, only the
+        top BM25 candidates are scored against the embedding, falling back to the
+        full index when the query shares too few terms with the knowledge base.
+        """
+        mode = mode or KB_SEARCH_MODE
+        if mode != "hybrid" or not query_text:
+            rows, scores = self.index.search(query_embedding, top_n)
+            return self._results(rows, scores)
+
+        prefilter = KB_BM25_PREFILTER if prefilter is None else prefilter
+        depth = max(KB_FUSION_DEPTH, top_n)
+        lexical_rows, _ = self.lexical.search(query_text, max(depth, prefilter))
+        if prefilter and lexical_rows.shape[0] >= top_n:
+            dense_rows, _ = self._score_rows(query_embedding, lexical_rows[:prefilter], depth)
+        else:
+            dense_rows, _ = self.index.search(query_embedding, depth)
+
+        rows, _ = reciprocal_rank_fusion([dense_rows, lexical_rows[:depth]], KB_RRF_K)
+        rows = rows[:top_n]
+        return self._results(*self._score_rows(query_embedding, rows, top_n, keep_order=True))
+
+    def _score_rows(self, query_embedding, rows, k: int, keep_order: bool = False):
+        """Cosine similarity of the query against the given rows only."""
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if rows.shape[0] == 0 or norm == 0 or query.shape[0] != self.matrix.shape[1]:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        order = np.argsort(rows)  # Sequential reads from a mapped matrix
+        scores = np.empty(rows.shape[0], dtype=np.float32)
+        scores[order] = self.matrix[rows[order]] @ (query / norm)
+        if keep_order:
+            return rows, scores
+        best = np.argsort(-scores)[:k]
+        return rows[best], scores[best]
+
+    def _results(self, rows, scores):
+        return [(int(row), float(score), self.file_names[row], self.texts[row]) for row, score in zip(rows, scores)]
+
+
+class KnowledgeBaseCache:
+    """
+    Process-wide cache of the knowledge base.
+
+    The CSV is downloaded once. After `refresh_interval` seconds the next reader
+    triggers a conditional GET (If-None-Match on the cached ETag) in a background
+    thread and keeps using the current snapshot meanwhile; a changed object is
+    parsed off to the side and swapped in with a single reference assignment.
+    Only the very first load blocks readers.
+
+    When `store_dir` (KB_STORE_DIR) is set, the knowledge base is opened from that
+    memory-mapped EmbeddingStore instead and the store's CURRENT version takes the
+    place of the ETag.
+    """
+
+    def __init__(self, s3_client, bucket: str = BUCKET_NAME, key: str = KB_S3_KEY,
+                 refresh_interval: float = KB_REFRESH_INTERVAL, store_dir: str = KB_STORE_DIR):
+        self.s3 = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.store_dir = store_dir
+        self.refresh_interval = refresh_interval
+        self._snapshot = None
+        self._checked_at = 0.0
+        self._load_lock = threading.Lock()
+        # Held while a background refresh runs, so only one is ever started
+        self._refresh_lock = threading.Lock()
+        self._listeners = []
+        # Counters are updated from request threads and the refresh thread
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "revalidations": 0,
+            "not_modified": 0,
+            "reloads": 0,
+            "errors": 0,
+            "last_reload_seconds": None,
+            "total_reload_seconds": 0.0
+        }
+
+    def get(self) -> KnowledgeBase:
+        """Return the current snapshot, loading it on first use."""
+        snapshot = self._snapshot
+        if snapshot is None:
+            self._count("misses")
+            with self._load_lock:
+                if self._snapshot is None:
+                    self._refresh()
+                if self._snapshot is None:
+                    raise RuntimeError("Knowledge base could not be loaded")
+                return self._snapshot
+
+        self._count("hits")
+        if time.time() - self._checked_at >= self.refresh_interval and self._refresh_lock.acquire(blocking=False):
+            try:
+                threading.Thread(target=self._background_refresh, name="kb-refresh", daemon=True).start()
+            except Exception:
+                self._refresh_lock.release()
+                raise
+        return snapshot
+
+    def invalidate(self):
+        """Force an ETag check on the next read."""
+        self._checked_at = 0.0
+
+    def _count(self, name: str, amount=1):
+        with self._stats_lock:
+            self._stats[name] += amount
+
+    def on_reload(self, listener):
+        """Call listener(snapshot) every time a new version is swapped in."""
+        self._listeners.append(listener)
+
+    def _background_refresh(self):
+        try:
+            with self._load_lock:
+                self._refresh()
+        finally:
+            self._refresh_lock.release()
+
+    def _refresh(self):
+        if self.store_dir:
+            self._refresh_from_store()
+            return
+
+        current = self._snapshot
+        kwargs = {"Bucket": self.bucket, "Key": self.key}
+        if current is not None:
+            kwargs["IfNoneMatch"] = current.etag
+            self._count("revalidations")
+
+        started = time.perf_counter()
+        try:
+            response = self.s3.get_object(**kwargs)
+        except ClientError as e:
+            self._checked_at = time.time()
+            if e.response.get("Error", {}).get("Code") in ("304", "NotModified"):
+                self._count("not_modified")
+            else:
+                self._count("errors")
+                print(f"Error fetching knowledge base from S3: {str(e)}")
+            return
+        except Exception as e:
+            self._checked_at = time.time()
+            self._count("errors")
+            print(f"Error fetching knowledge base from S3: {str(e)}")
+            return
+
+        try:
+            import pandas as pd  # Imported on first load; pandas alone adds ~0.4 s to app startup
+            df = pd.read_csv(io.StringIO(response['Body'].read().decode('utf-8')))
+            snapshot = self._build_snapshot(df, response.get("ETag"))
+        except Exception as e:
+            self._checked_at = time.time()
+            self._count("errors")
+            print(f"Error parsing knowledge base: {str(e)}")
+            return
+
+        # Readers holding the old snapshot keep using it until they are done
+        self._publish(snapshot, time.perf_counter() - started)
+
+    def _refresh_from_store(self):
+        current = self._snapshot
+        if current is not None:
+            self._count("revalidations")
+
+        started = time.perf_counter()
+        try:
+            version = current_version(self.store_dir)
+            # An IVF index built into the loaded version afterwards is picked up as well
+            if current is not None and version == current.etag and (
+                    isinstance(current.index, IVFIndex) or not IVFIndex.exists(os.path.join(self.store_dir, version))):
+                self._checked_at = time.time()
+                self._count("not_modified")
+                return
+            snapshot = KnowledgeBase.from_store(EmbeddingStore(self.store_dir, version))
+        except Exception as e:
+            self._checked_at = time.time()
+            self._count("errors")
+            print(f"Error opening knowledge base store {self.store_dir}: {str(e)}")
+            return
+
+        self._publish(snapshot, time.perf_counter() - started)
+
+    def _publish(self, snapshot: KnowledgeBase, elapsed: float):
+        """Swap in a new snapshot and tell reload listeners about it."""
+        self._snapshot = snapshot
+        self._checked_at = time.time()
+        with self._stats_lock:
+            self._stats["reloads"] += 1
+            self._stats["last_reload_seconds"] = round(elapsed, 3)
+            self._stats["total_reload_seconds"] += elapsed
+        print(f"📚 Knowledge base {snapshot.etag} loaded ({len(snapshot)} rows) in {elapsed:.2f}s")
+        for listener in list(self._listeners):
+            try:
+                listener(snapshot)
+            except Exception as e:
+                print(f"Knowledge base reload listener failed: {str(e)}")
+
+    def _build_snapshot(self, df: "pd.DataFrame", etag: str) -> KnowledgeBase:
+        return KnowledgeBase.from_dataframe(df, etag)
+
+    def stats(self) -> dict:
+        snapshot = self._snapshot
+        with self._stats_lock:
+            stats = dict(self._stats)
+        reads = stats["hits"] + stats["misses"]
+        return {
+            **stats,
+            "total_reload_seconds": round(stats["total_reload_seconds"], 3),
+            "hit_rate": round(stats["hits"] / reads, 4) if reads else 0.0,
+            "version": snapshot.etag if snapshot else None,
+            "source": f"store:{self.store_dir}" if self.store_dir else f"s3://{self.bucket}/{self.key}",
+            "rows": (len(snapshot.df) if snapshot.df is not None else len(snapshot)) if snapshot else 0,
+            "indexed_rows": len(snapshot) if snapshot else 0,
+            "index": type(snapshot.index).__name__ if snapshot else None,
+            "search_mode": KB_SEARCH_MODE,
+            "lexical_terms": snapshot.lexical.terms if snapshot else 0,
+            "loaded_at": snapshot.loaded_at if snapshot else None,
+            "last_checked_at": self._checked_at or None
+        }
@@ -0,0 +1,188 @@
+"""
+Content-addressed cache of Bedrock model responses.
+
+The key is a SHA-256 of the model id and the canonical JSON request body, so
+re-sending an identical prompt (a retried job, or re-running a day's calls
+after a crash) is answered from a local SQLite file instead of Bedrock. The
+file is shared by every worker on the host and trimmed, least recently used
+first, once it grows past LLM_CACHE_MAX_MB.
+
+Only deterministic requests are cached by default: requests sampled above
+LLM_CACHE_MAX_TEMPERATURE (default 0) are always sent. Anthropic models sample
+at temperature 1.0 when the body does not set one, so raising the limit to 1.0
+caches every request; replaying a sampled answer is then a deliberate choice.
+What gets stored is decided by the callers in aws_clients.py, which skip
+truncated responses and those their caller could not parse.
+
+    python llm_cache.py stats
+    python llm_cache.py clear
+"""
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import argparse
+import threading
+from dotenv import load_dotenv
+
+load_dotenv()
+
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "llm_cache.db")
+LLM_CACHE_MAX_MB = float(os.getenv("LLM_CACHE_MAX_MB", "512"))
+LLM_CACHE_MAX_TEMPERATURE = float(os.getenv("LLM_CACHE_MAX_TEMPERATURE", "0"))
+DEFAULT_TEMPERATURE = 1.0
+
+
+def request_key(model_id: str, body: dict) -> str:
+    canonical = json.dumps(body, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(f"{model_id}\0{canonical}".encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    def __init__(self, path: str = LLM_CACHE_PATH, max_bytes: float = LLM_CACHE_MAX_MB * 1e6,
+                 max_temperature: float = LLM_CACHE_MAX_TEMPERATURE):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_temperature = max_temperature
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "skipped": 0, "evictions": 0, "latency_saved_seconds": 0.0}
+        if self.path:
+            conn = self._connect()
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_responses (
+                    key TEXT PRIMARY KEY,
+                    model_id TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    latency REAL NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS llm_responses_last_used ON llm_responses (last_used)")
+            self._bytes = conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_responses").fetchone()[0]
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _count(self, name: str, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def cacheable(self, body: dict) -> bool:
+        return bool(self.path) and float(body.get("temperature", DEFAULT_TEMPERATURE)) <= self.max_temperature
+
+    def get(self, model_id: str, body: dict):
+        """Return the cached response body for this exact request, or None."""
+        if not self.cacheable(body):
+            self._count("skipped")
+            return None
+        key = request_key(model_id, body)
+        conn = self._connect()
+        row = conn.execute("SELECT response, latency FROM llm_responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self._count("misses")
+            return None
+        conn.execute("UPDATE llm_responses SET last_used = ? WHERE key = ?", (time.time(), key))
+        self._count("hits")
+        self._count("latency_saved_seconds", row[1])
+        return json.loads(row[0])
+
+    def put(self, model_id: str, body: dict, response: dict, latency: float = 0.0):
+        if not self.cacheable(body):
+            return
+        encoded = json.dumps(response, ensure_ascii=False)
+        now = time.time()
+        conn = self._connect()
+        previous = conn.execute("SELECT size FROM llm_responses WHERE key = ?", (request_key(model_id, body),)).fetchone()
+        conn.execute(
+            "INSERT OR REPLACE INTO llm_responses (key, model_id, response, size, latency, created_at, last_used) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (request_key(model_id, body), model_id, encoded, len(encoded), latency, now, now)
+        )
+        with self._lock:
+            self._stats["stores"] += 1
+            self._bytes += len(encoded) - (previous[0] if previous else 0)
+            over = self._bytes > self.max_bytes
+        if over:
+            self._evict()
+
+    def discard(self, model_id: str, body: dict):
+        """Drop the cached response for this exact request, if there is one."""
+        if not self.cacheable(body):
+            return
+        key = request_key(model_id, body)
+        conn = self._connect()
+        row = conn.execute("SELECT size FROM llm_responses WHERE key = ?", (key,)).fetchone()
+        if row:
+            conn.execute("DELETE FROM llm_responses WHERE key = ?", (key,))
+            with self._lock:
+                self._bytes -= row[0]
+
+    def _evict(self):
+        """Drop least recently used entries until the file is back under 90% of max_bytes."""
+        conn = self._connect()
+        # Other processes write to the same file, so start from the real total
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_responses").fetchone()[0]
+        target = self.max_bytes * 0.9
+        evicted = 0
+        while total > target:
+            rows = conn.execute("SELECT key, size FROM llm_responses ORDER BY last_used LIMIT 100").fetchall()
+            if not rows:
+                break
+            drop = []
+            for key, size in rows:
+                if total <= target:
+                    break
+                drop.append((key,))
+                total -= size
+            conn.executemany("DELETE FROM llm_responses WHERE key = ?", drop)
+            evicted += len(drop)
+        with self._lock:
+            self._bytes = total
+            self._stats["evictions"] += evicted
+
+    def clear(self):
+        if self.path:
+            self._connect().execute("DELETE FROM llm_responses")
+            with self._lock:
+                self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        stats["latency_saved_seconds"] = round(stats["latency_saved_seconds"], 3)
+        if self.path:
+            entries, size = self._connect().execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_responses"
+            ).fetchone()
+            stats.update({"entries": entries, "size_mb": round(size / 1e6, 2), "max_mb": round(self.max_bytes / 1e6, 2)})
+        return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="LLM response cache tools")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("stats", help="Show entry count and size")
+    commands.add_parser("clear", help="Delete every cached response")
+    args = parser.parse_args(argv)
+
+    cache = LLMResponseCache()
+    if args.command == "clear":
+        cache.clear()
+        print("✅ LLM response cache cleared")
+    print(cache.stats())
+
+
+if __name__ == "__main__":
+    main()
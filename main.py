@@ -1,6 +1,5 @@
 from fastapi import FastAPI, Query, UploadFile, File
 import os
-import boto3
 from datetime import datetime
 import time
 from typing import Optional
@@ -14,12 +13,24 @@ from pydantic import BaseModel
 import io
 import csv
 import shutil
-from Q_A import extract_customer_qa_pairs, validate_answer
+import uuid
+import asyncio
+import threading
+from aggregates import record_call
+from agent_index import agent_key
+from aws_clients import bedrock_limits, lazy_client, lazy_resource, lazy_table, llm_cache, run_on_bedrock_pool
+from jobs import JobQueue, JobWorkerPool
+from pipeline import Pipeline, Stage
+from Q_A import answer_cache, extract_customer_qa_pairs, knowledge_base, validate_answer
+from answer_cache import AnswerCallStats
 from db import fetch_agent_names, fetch_agent_score_rankings, fetch_call_audit, fetch_call_details, fetch_call_status_count, fetch_total_calls_and_agents, fetch_contact_details_count, get_calls_per_day_from_db, get_contacts_by_agent, get_customer_name_by_agent, get_email_by_agent, get_http_audio_url_from_dynamo, get_sentiment_summary_from_dynamodb
 
 from fastapi.responses import JSONResponse
-from rag import extract_text_from_pdf, generate_embeddings, upload_to_s3
-from utils import get_audio_duration, transcribe_audio_aws,summarize_conversation_bedrock
+from json_stream import IncrementalJSONParser
+from rag import embedding_cache, extract_text_from_pdf, generate_embeddings, upload_to_s3
+from s3_stream import stream_upload_to_s3
+from transcript_index import TranscriptIndex
+from utils import format_duration, get_audio_duration, transcribe_audio_aws,summarize_conversation_bedrock, convert_floats_to_decimals
 from fastapi.responses import StreamingResponse
 import httpx
 
@@ -35,6 +46,8 @@ AWS_ACCESS_KEY = os.getenv("AWS_ACCESS_KEY")
 AWS_SECRET_KEY = os.getenv("AWS_SECRET_KEY")
 AWS_REGION = os.getenv("AWS_REGION")
 BUCKET_NAME = os.getenv("BUCKET_NAME")
+# Seconds between keep-alive comments on an idle event stream (e.g. while transcribing)
+SSE_KEEPALIVE_SECONDS = float(os.getenv("SSE_KEEPALIVE_SECONDS", "15"))
 
 app.add_middleware(
     CORSMiddleware,
@@ -49,176 +62,353 @@ os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs("transcripts", exist_ok=True)
 os.makedirs("uploads", exist_ok=True)
 
-s3 = boto3.client(
-    "s3",
-    aws_access_key_id=AWS_ACCESS_KEY,
-    aws_secret_access_key=AWS_SECRET_KEY,
-    region_name=AWS_REGION
-)
+# Shared, pooled AWS clients, created on first use
+s3 = lazy_client("s3")
+transcribe = lazy_client("transcribe")
+dynamodb = lazy_resource("dynamodb")
 
-transcribe = boto3.client(
-    "transcribe",
-    aws_access_key_id=AWS_ACCESS_KEY,
-    aws_secret_access_key=AWS_SECRET_KEY,
-    region_name=AWS_REGION
-)
-dynamodb = boto3.resource(
-    "dynamodb",
-    aws_access_key_id=AWS_ACCESS_KEY,
-    aws_secret_access_key=AWS_SECRET_KEY,
-    region_name=AWS_REGION
-)
 
+table = lazy_table("call_audit")
 
-table = dynamodb.Table("call_audit")
+job_queue = JobQueue()
+transcript_index = TranscriptIndex()
 
-@app.post("/upload-audio-s3/")
-async def upload_audio_s3(file: UploadFile = File(...)):
-    try:
-        contents = await file.read()
-        original_filename = file.filename
-        call_id = os.path.splitext(original_filename)[0]  # e.g. mycall.wav → call_id = "mycall"
-        s3_key = f"recordings/{original_filename}"
-        local_path = os.path.join("uploads", original_filename)
-
-        # Save locally
-        os.makedirs("uploads", exist_ok=True)
-        with open(local_path, "wb") as f:
-            f.write(contents)
-
-        # Get duration
-        call_duration = await get_audio_duration(local_path)
-
-        # Upload to S3
-        s3.put_object(
-            Bucket=BUCKET_NAME,
-            Key=s3_key,
-            Body=contents
-        )
+# Streaming uploads processed in this process; kept so their tasks are not garbage collected
+streaming_tasks = set()
+
+
+def build_analysis_pipeline(emit=None):
+    """
+    Post-transcription stages; summary and QA extraction only need the transcript.
+    Their Bedrock calls already run on the Bedrock thread pool, so the stages stay on the job's loop.
+
+    With `emit(event, data)`, summary text, completed summary fields and each
+    validated QA pair are reported as soon as they are generated.
+    The run takes an `answer_cache_stats` input that collects the call's answer cache hits.
+    """
+    summarize, extract = summarize_conversation_bedrock, extract_customer_qa_pairs
+
+    async def validate(qa_pairs, cache_stats):
+        return await validate_answer(qa_pairs, cache_stats=cache_stats)
+
+    if emit:
+        summary_parser = IncrementalJSONParser()
+
+        def on_summary_text(delta):
+            if delta is None:
+                summary_parser.reset()
+                emit("summary_reset", {})
+                return
+            emit("summary_delta", {"text": delta})
+            for field, value in summary_parser.feed(delta):
+                emit("summary_field", {"field": field, "value": value})
 
-        # Transcribe
-        s3_uri = f"s3://{BUCKET_NAME}/{s3_key}"
-        transcript_result = transcribe_audio_aws(s3_uri, original_filename)
-        if transcript_result["status"] == "error":
-            raise Exception(transcript_result["error"])
-
-        transcript_text = transcript_result.get("transcript", "")
-
-        # Summarize & QA
-        summary_result = await summarize_conversation_bedrock(transcript_text)
-        QA_pairs = await extract_customer_qa_pairs(transcript_text)
-        answers = await validate_answer(QA_pairs)
-
-        # Save to DynamoDB
-        table.put_item(Item={
-            "call_id": call_id,
-            "call_duration": call_duration,
-            "s3_uri": s3_uri,
-            "CreatedOn": datetime.utcnow().isoformat(),
-            "Transcript": transcript_text,
-            "Summary": summary_result,
-            "QA_pairs": answers
-        })
-
-        # ✅ Delete the local file after everything is done
+        async def summarize(transcript):
+            return await summarize_conversation_bedrock(transcript, on_text=on_summary_text)
+
+        async def extract(transcript):
+            qa_pairs = await extract_customer_qa_pairs(transcript)
+            emit("qa_pairs", {"count": len(qa_pairs.get("qa_pairs", []))})
+            return qa_pairs
+
+        async def validate(qa_pairs, cache_stats):
+            return await validate_answer(qa_pairs, cache_stats=cache_stats,
+                                         on_result=lambda index, result: emit("qa_pair", {"index": index, **result}))
+
+    return Pipeline([
+        Stage("summary", summarize, depends_on=("transcript",), run_in_thread=False),
+        Stage("qa_pairs", extract, depends_on=("transcript",), run_in_thread=False),
+        Stage("answers", validate, depends_on=("qa_pairs", "answer_cache_stats"), run_in_thread=False),
+    ])
+
+
+analysis_pipeline = build_analysis_pipeline()
+
+
+async def resolve_call_duration(s3_key: str, audio: Optional[dict]) -> Optional[str]:
+    """Use the duration read from the upload header, or decode a downloaded copy as a fallback."""
+    if audio and audio.get("duration_seconds") is not None:
+        return format_duration(audio["duration_seconds"])
+
+    local_path = os.path.join("uploads", f"{uuid.uuid4().hex}_{os.path.basename(s3_key)}")
+    try:
+        await asyncio.to_thread(s3.download_file, BUCKET_NAME, s3_key, local_path)
+        return await get_audio_duration(local_path)
+    finally:
         if os.path.exists(local_path):
             os.remove(local_path)
 
-        # Response
-        file_url = f"https://{BUCKET_NAME}.s3.{AWS_REGION}.amazonaws.com/{s3_key}"
-        return {
-            "message": "✅ File uploaded, transcribed, summarized, and saved to database!",
-            "call_id": call_id,
-            "call_duration": call_duration,
-            "s3_url": file_url,
-            "transcription": transcript_result,
-            "summary": summary_result,
-            "QA_Pairs": QA_pairs
-        }
 
+async def process_call_job(job_id: Optional[str], payload: dict, emit=None) -> dict:
+    """
+    Run the full ingestion pipeline for one uploaded recording.
+
+    job_id is None for calls processed outside the job queue. `emit(event, data)`,
+    if given, receives each stage change and result as it happens.
+    """
+    original_filename = payload["original_filename"]
+    call_id = payload["call_id"]
+    s3_key = payload["s3_key"]
+
+    def set_stage(stage):
+        if job_id:
+            job_queue.set_stage(job_id, stage)
+        if emit:
+            emit("stage", {"stage": stage})
+
+    # Get duration
+    set_stage("probing")
+    call_duration = await resolve_call_duration(s3_key, payload.get("audio"))
+
+    # Transcribe
+    set_stage("transcribing")
+    s3_uri = f"s3://{BUCKET_NAME}/{s3_key}"
+    transcript_result = await transcribe_audio_aws(s3_uri, original_filename)
+    if transcript_result["status"] == "error":
+        raise Exception(transcript_result["error"])
+
+    transcript_text = transcript_result.get("transcript", "")
+    if emit:
+        emit("transcribed", {"call_id": call_id, "call_duration": call_duration, "transcript": transcript_text})
+
+    # Summarize & QA, summary and QA extraction run side by side
+    set_stage("analyzing")
+    pipeline = build_analysis_pipeline(emit) if emit else analysis_pipeline
+    cache_stats = AnswerCallStats()
+    results, timings = await pipeline.run(transcript=transcript_text, answer_cache_stats=cache_stats)
+    summary_result = results["summary"]
+    QA_pairs = results["qa_pairs"]
+    answers = results["answers"]
+    answer_cache_stats = cache_stats.as_dict()
+    print(f"⏱️ Job {job_id or call_id} stage timings: {timings}")
+    if emit:
+        emit("summary", summary_result)
+        emit("answer_cache", answer_cache_stats)
+
+    # Save to DynamoDB
+    set_stage("saving")
+    call_item = {
+        "call_id": call_id,
+        "call_duration": call_duration,
+        "s3_uri": s3_uri,
+        "content_sha256": payload.get("sha256"),
+        "CreatedOn": datetime.utcnow().isoformat(),
+        "Transcript": transcript_text,
+        "Summary": summary_result,
+        "QA_pairs": answers,
+        "answer_cache": convert_floats_to_decimals(answer_cache_stats)
+    }
+    # Key of the agent index; calls naming no agent stay out of it
+    key = agent_key(summary_result)
+    if key:
+        call_item["agent_key"] = key
+    await asyncio.to_thread(table.put_item, Item=call_item)
+
+    # Dashboard counters; `python aggregates.py backfill` repairs them if this fails
+    try:
+        await asyncio.to_thread(record_call, call_item)
     except Exception as e:
-        # Optional: clean up local file on failure as well
-        if os.path.exists(local_path):
-            os.remove(local_path)
-        return {"error": str(e)}
- 
+        print(f"⚠️ Could not update dashboard aggregates for {call_id}: {str(e)}")
+
+    # Make the call searchable; a failure here is logged rather than redoing the whole job
+    set_stage("indexing")
+    try:
+        indexed_chunks = await transcript_index.index_call(call_id, transcript_text, generate_embeddings)
+    except Exception as e:
+        print(f"⚠️ Could not index transcript of {call_id}: {str(e)}")
+        indexed_chunks = None
 
+    file_url = f"https://{BUCKET_NAME}.s3.{AWS_REGION}.amazonaws.com/{s3_key}"
+    return {
+        "message": "✅ File uploaded, transcribed, summarized, and saved to database!",
+        "call_id": call_id,
+        "call_duration": call_duration,
+        "s3_url": file_url,
+        "transcription": transcript_result,
+        "summary": summary_result,
+        "QA_Pairs": QA_pairs,
+        "indexed_chunks": indexed_chunks,
+        "answer_cache": answer_cache_stats,
+        "stage_timings": timings
+    }
 
-@app.post("/upload-audio-s3/")
+
+job_workers = JobWorkerPool(job_queue, process_call_job)
+
+
+@app.on_event("startup")
+def start_job_workers():
+    job_workers.start()
+
+
+@app.on_event("startup")
+def warm_embedding_cache():
+    # Pull the most recent embeddings from the shared disk tier into this worker's LRU
+    threading.Thread(target=embedding_cache.preload, name="embedding-cache-preload", daemon=True).start()
+
+
+@app.on_event("startup")
+def load_transcript_index():
+    threading.Thread(target=transcript_index.sync, name="transcript-index-load", daemon=True).start()
+
+
+@app.on_event("shutdown")
+def stop_job_workers():
+    job_workers.stop()
+
+
+async def upload_recording(file: UploadFile) -> dict:
+    """Stream a recording to S3 and return the job payload describing it."""
+    original_filename = os.path.basename(file.filename)
+    call_id = os.path.splitext(original_filename)[0]  # e.g. mycall.wav → call_id = "mycall"
+    s3_key = f"recordings/{original_filename}"
+
+    # Parts go to S3 as they are read, the whole file is never held in memory
+    upload = await stream_upload_to_s3(file, s3, BUCKET_NAME, s3_key)
+    return {
+        "call_id": call_id,
+        "original_filename": original_filename,
+        "s3_key": s3_key,
+        "size": upload["size"],
+        "sha256": upload["sha256"],
+        "audio": upload["audio"]
+    }
+
+
+def format_sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str, ensure_ascii=False)}\n\n"
+
+
+@app.post("/upload-audio-s3/", status_code=202)
 async def upload_audio_s3(file: UploadFile = File(...)):
+    """Stream a recording to S3, queue it for processing and return the job id straight away."""
     try:
-        contents = await file.read()
-        original_filename = file.filename
-        call_id = os.path.splitext(original_filename)[0]  # e.g. mycall.wav → call_id = "mycall"
-        s3_key = f"recordings/{original_filename}"
-        local_path = os.path.join("uploads", original_filename)
-        print(f"Processing file: {local_path}")
-        # Save locally
-        os.makedirs("uploads", exist_ok=True)
-        with open(local_path, "wb") as f:
-            f.write(contents)
- 
-        # Get duration
-        call_duration = await get_audio_duration(local_path)
- 
-        # Upload to S3
-        s3.put_object(
-            Bucket=BUCKET_NAME,
-            Key=s3_key,
-            Body=contents
-        )
- 
-        # Transcribe
-        s3_uri = f"s3://{BUCKET_NAME}/{s3_key}"
-        transcript_result = transcribe_audio_aws(s3_uri, original_filename)
-        print("Transcription successful")
-        if transcript_result["status"] == "error":
-            raise Exception(transcript_result["error"])
- 
-        transcript_text = transcript_result.get("transcript", "")
- 
-        # Summarize & QA
-        summary_result = await summarize_conversation_bedrock(transcript_text)
-        print(f"Summary successful {summary_result}")
-        QA_pairs = await extract_customer_qa_pairs(transcript_text)
-        print("QA extraction successful")
-        answers = await validate_answer(QA_pairs)
-        print("Answers validated successfully")
-        # Save to DynamoDB
-        table.put_item(Item={
-            "call_id": call_id,
-            "call_duration": call_duration,
-            "s3_uri": s3_uri,
-            "CreatedOn": datetime.utcnow().isoformat(),
-            "Transcript": transcript_text,
-            "Summary": summary_result,
-            "QA_pairs": answers
-        })
-        print("Data saved to DynamoDB successfully")
-        # ✅ Delete the local file after everything is done
-        if os.path.exists(local_path):
-            os.remove(local_path)
- 
-        # Response
-        file_url = f"https://{BUCKET_NAME}.s3.{AWS_REGION}.amazonaws.com/{s3_key}"
+        payload = await upload_recording(file)
+        job_id = job_queue.enqueue(payload)
         return {
-            "message": "✅ File uploaded, transcribed, summarized, and saved to database!",
-            "call_id": call_id,
-            "call_duration": call_duration,
-            "s3_url": file_url,
-            "transcription": transcript_result,
-            "summary": summary_result,
-            "QA_Pairs": QA_pairs
+            "message": "✅ File uploaded and queued for processing",
+            "job_id": job_id,
+            "call_id": payload["call_id"],
+            "sha256": payload["sha256"],
+            "status_url": f"/jobs/{job_id}"
         }
- 
+
     except Exception as e:
-        # Optional: clean up local file on failure as well
-        if os.path.exists(local_path):
-            os.remove(local_path)
-        return {"error": str(e)}
- 
- 
-    
+        return JSONResponse(status_code=500, content={"error": str(e)})
+
+
+@app.post("/upload-audio-s3/stream")
+async def upload_audio_s3_stream(file: UploadFile = File(...)):
+    """
+    Upload and process a recording right away, streaming progress as server-sent events.
+
+    Events: uploaded, stage, transcribed, summary_delta (raw model text),
+    summary_field (each Summary field once complete), summary_reset (the model
+    call was retried, discard earlier deltas), summary, qa_pairs, qa_pair (each
+    validated pair), then done with the same result a queued job returns, or error.
+    Processing is not queued: it finishes and saves even if the client disconnects,
+    but is not retried if this process dies.
+    """
+    try:
+        payload = await upload_recording(file)
+    except Exception as e:
+        return JSONResponse(status_code=500, content={"error": str(e)})
+
+    events = asyncio.Queue()
+
+    def emit(event, data):
+        events.put_nowait((event, data))
+
+    async def process():
+        try:
+            emit("done", await process_call_job(None, payload, emit))
+        except Exception as e:
+            emit("error", {"error": str(e)})
+        finally:
+            events.put_nowait(None)
+
+    emit("uploaded", {"call_id": payload["call_id"], "s3_key": payload["s3_key"], "sha256": payload["sha256"]})
+    task = asyncio.create_task(process())
+    streaming_tasks.add(task)
+    task.add_done_callback(streaming_tasks.discard)
+
+    async def event_stream():
+        while True:
+            try:
+                item = await asyncio.wait_for(events.get(), SSE_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            if item is None:
+                break
+            yield format_sse(*item)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.get("/jobs/{job_id}")
+async def get_job_status(job_id: str):
+    job = job_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job
+
+
+@app.get("/search")
+async def search_calls(q: str = Query(..., min_length=1), k: int = Query(10, ge=1, le=100)):
+    """Top-k calls whose transcripts match the query, with the best matching snippets."""
+    started = time.perf_counter()
+    query_embedding = await run_on_bedrock_pool(generate_embeddings, q)
+    if not query_embedding:
+        raise HTTPException(status_code=502, detail="Failed to generate query embedding.")
+    embedded = time.perf_counter()
+    results = await asyncio.to_thread(transcript_index.search, query_embedding, k)
+    return {
+        "query": q,
+        "results": results,
+        "timings_ms": {
+            "embedding": round((embedded - started) * 1000, 2),
+            "search": round((time.perf_counter() - embedded) * 1000, 2)
+        }
+    }
+
+
+@app.get("/search/stats")
+async def get_search_stats():
+    return transcript_index.stats()
+
+
+@app.get("/knowledge-base/stats")
+async def get_knowledge_base_stats():
+    return knowledge_base.stats()
+
+
+@app.get("/answer-cache/stats")
+async def get_answer_cache_stats():
+    return answer_cache.stats()
+
+
+@app.get("/bedrock/stats")
+async def get_bedrock_stats():
+    """Per-model request counts, throttles, retries, queue wait and current concurrency limit."""
+    return bedrock_limits.stats()
+
+
+@app.get("/llm-cache/stats")
+async def get_llm_cache_stats():
+    """Hits, misses and size of the Bedrock response cache, and the model time it saved."""
+    return await asyncio.to_thread(llm_cache.stats)
+
+
+@app.get("/embedding-cache/stats")
+async def get_embedding_cache_stats():
+    return embedding_cache.stats()
+
+
 class CallIDRequest(BaseModel):
     call_id: str
     
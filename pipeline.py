@@ -0,0 +1,121 @@
+import os
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+load_dotenv()
+
+PIPELINE_THREADS = int(os.getenv("PIPELINE_THREADS", "16"))
+
+# Shared by every pipeline run so concurrent jobs draw from one bounded pool
+stage_executor = ThreadPoolExecutor(max_workers=PIPELINE_THREADS, thread_name_prefix="pipeline-stage")
+
+
+class Stage:
+    """
+    One step of a pipeline.
+
+    Args:
+        name: Key the stage result is stored under
+        fn: Function or coroutine function called with the results of `depends_on`, in order
+        depends_on: Names of pipeline inputs or other stages this stage needs
+        run_in_thread: Run on the shared thread pool; use for functions that block,
+            including async functions that make synchronous network calls
+    """
+
+    def __init__(self, name: str, fn, depends_on=(), run_in_thread: bool = True):
+        self.name = name
+        self.fn = fn
+        self.depends_on = tuple(depends_on)
+        self.run_in_thread = run_in_thread
+
+
+class Pipeline:
+    """
+    Runs a DAG of stages, starting each one as soon as its dependencies are done.
+
+    Independent stages run concurrently, so total latency follows the critical
+    path instead of the sum of all stages. Per-stage timings are returned
+    alongside the results.
+    """
+
+    def __init__(self, stages, executor: ThreadPoolExecutor = stage_executor):
+        self.stages = {stage.name: stage for stage in stages}
+        self.executor = executor
+        if len(self.stages) != len(stages):
+            raise ValueError("Stage names must be unique")
+        self._check_acyclic()
+
+    def _check_acyclic(self):
+        visiting, done = set(), set()
+
+        def visit(name):
+            if name in done or name not in self.stages:
+                return
+            if name in visiting:
+                raise ValueError(f"Pipeline has a dependency cycle through '{name}'")
+            visiting.add(name)
+            for dep in self.stages[name].depends_on:
+                visit(dep)
+            visiting.discard(name)
+            done.add(name)
+
+        for name in self.stages:
+            visit(name)
+
+    async def run(self, **inputs):
+        """
+        Run every stage.
+
+        Args:
+            inputs: Values stages can depend on by name
+
+        Returns:
+            Tuple of (results by stage name, timings by stage name). Each timing holds
+            `started` (seconds after the run began, i.e. time spent waiting on
+            dependencies) and `duration`; `total` holds the wall time of the run.
+        """
+        for stage in self.stages.values():
+            missing = [dep for dep in stage.depends_on if dep not in self.stages and dep not in inputs]
+            if missing:
+                raise ValueError(f"Stage '{stage.name}' depends on unknown {missing}")
+
+        results = dict(inputs)
+        timings = {}
+        tasks = {}
+        run_started = time.perf_counter()
+
+        async def run_stage(stage: Stage):
+            await asyncio.gather(*(tasks[dep] for dep in stage.depends_on if dep in tasks))
+            args = [results[dep] for dep in stage.depends_on]
+            started = time.perf_counter()
+            if stage.run_in_thread:
+                loop = asyncio.get_running_loop()
+                if asyncio.iscoroutinefunction(stage.fn):
+                    result = await loop.run_in_executor(self.executor, lambda: asyncio.run(stage.fn(*args)))
+                else:
+                    result = await loop.run_in_executor(self.executor, lambda: stage.fn(*args))
+            elif asyncio.iscoroutinefunction(stage.fn):
+                result = await stage.fn(*args)
+            else:
+                result = stage.fn(*args)
+            finished = time.perf_counter()
+            results[stage.name] = result
+            timings[stage.name] = {
+                "started": round(started - run_started, 3),
+                "duration": round(finished - started, 3)
+            }
+
+        for stage in self.stages.values():
+            tasks[stage.name] = asyncio.ensure_future(run_stage(stage))
+
+        try:
+            await asyncio.gather(*tasks.values())
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            raise
+
+        timings["total"] = {"duration": round(time.perf_counter() - run_started, 3)}
+        return {name: results[name] for name in self.stages}, timings
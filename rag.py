@@ -2,17 +2,16 @@ import os
 import io
 import csv
 import shutil
-import boto3
 import json
 from typing import Optional
 from decimal import Decimal
-from PyPDF2 import PdfReader
 from fastapi import FastAPI, UploadFile, File, HTTPException
 from fastapi.responses import JSONResponse
 from dotenv import load_dotenv
 from botocore.exceptions import ClientError
-import pandas as pd
-from nltk.tokenize import sent_tokenize
+from chunking import chunk_text
+from embedding_cache import EmbeddingCache
+from aws_clients import invoke_model_json, lazy_client
 
 # Load environment variables
 load_dotenv()
@@ -29,83 +28,62 @@ AWS_SECRET_KEY = os.getenv("AWS_SECRET_KEY")
 AWS_REGION = os.getenv("AWS_REGION")
 BUCKET_NAME = os.getenv("BUCKET_NAME")
 
-# Initialize AWS clients
-s3 = boto3.client(
-    's3',
-    aws_access_key_id=AWS_ACCESS_KEY,
-    aws_secret_access_key=AWS_SECRET_KEY,
-    region_name=AWS_REGION
-)
-
-bedrock = boto3.client(
-    'bedrock-runtime',
-    aws_access_key_id=AWS_ACCESS_KEY,
-    aws_secret_access_key=AWS_SECRET_KEY,
-    region_name=AWS_REGION
-)
+# Shared, pooled AWS clients, created on first use
+s3 = lazy_client("s3")
+
+DEFAULT_EMBEDDING_MODEL = "amazon.titan-embed-text-v2:0"
+embedding_cache = EmbeddingCache()
 
 def chunks_string(text, tokens):
-    segments = []
-    len_sum = 0
-    k = 0
-    raw_list = sent_tokenize(text)
-
-    for i in range(len(raw_list)):
-        x1 = len(raw_list[i].split())
-        len_sum += x1
-        k += 1
-
-        if len_sum > tokens:
-            j = i-(k+1) if i-(k+1) >= 0 else 0
-            if len(" ".join(raw_list[j: i+1]).split()) > tokens:
-                j = i-k
-            segments.append(" ".join(raw_list[j: i]))
-            len_sum = 0
-            k = 0
-
-        if i == len(raw_list)-1:
-            j = i-(k+1) if i-(k+1) >= 0 else 0
-            if len(" ".join(raw_list[j: i+1]).split()) > tokens:
-                j = i-k
-            segments.append(" ".join(raw_list[j: i+1]))
-
-    return segments
+    """Sentence-aligned chunks of at most `tokens` words."""
+    return list(chunk_text(text, tokens))
 
 def chunks_string1(text, chunk_size):
-    words = text.split()
-    for i in range(0, len(words), chunk_size):
-        yield ' '.join(words[i:i + chunk_size])
+    """Fixed windows of `chunk_size` words, ignoring sentence boundaries."""
+    return chunk_text(text, chunk_size, align_sentences=False)
 
-async def extract_text_from_pdf(pdf_file, file_name):
+def extract_pdf_pages(pdf_file):
+    """Return (page_num, text) for every page of a PDF path or file object."""
+    from PyPDF2 import PdfReader  # Imported on first use to keep app startup fast
     reader = PdfReader(pdf_file)
+    return [(page_num, page.extract_text() or '') for page_num, page in enumerate(reader.pages, start=1)]
+
+def chunk_page(page_content, chunk_size=200, overlap=0, unit="words", align_sentences=False):
+    """Split one page into chunks, dropping fragments of two words or fewer."""
+    chunks = chunk_text(page_content, chunk_size, overlap, unit, align_sentences)
+    return [chunk for chunk in chunks if len(chunk.split()) > 2]
+
+async def extract_text_from_pdf(pdf_file, file_name):
     content_chunks = []
 
-    for page_num, page in enumerate(reader.pages, start=1):
-        page_content = page.extract_text() or ''
-        chunks = chunks_string1(page_content, 200)
+    for page_num, page_content in extract_pdf_pages(pdf_file):
         content_chunks.extend([
-            (page_num, file_name, chunk.strip())
-            for chunk in chunks if len(chunk.split()) > 2
+            (page_num, file_name, chunk)
+            for chunk in chunk_page(page_content, 200)
         ])
 
     return content_chunks
-def generate_embeddings(text, model_id="amazon.titan-embed-text-v2:0"):
+def generate_embeddings(text, model_id=DEFAULT_EMBEDDING_MODEL):
+    """Return the Titan embedding for text, served from the embedding cache when possible."""
+    vector = embedding_cache.get(model_id, text)
+    if vector is not None:
+        return vector
+
+    vector = _invoke_titan_embedding(text, model_id)
+    embedding_cache.put(model_id, text, vector)
+    return vector
+
+def _invoke_titan_embedding(text, model_id=DEFAULT_EMBEDDING_MODEL):
     try:
         # Titan expects input in this format
-        body = json.dumps({
-            "inputText": text
-        })
-
-        response = bedrock.invoke_model(
-            modelId=model_id,
-            body=body,
+        response_body = invoke_model_json(
+            model_id,
+            {"inputText": text},
+            use_cache=False,  # Embeddings have their own cache in embedding_cache.py
             contentType="application/json",
             accept="application/json"
         )
 
-        # Parse the response
-        response_body = json.loads(response['body'].read().decode('utf-8'))
-
         # Titan returns embeddings under 'embedding' key
         embedding_vector = response_body['embedding']
         return embedding_vector
@@ -0,0 +1,288 @@
+"""
+Per-model rate limiting and retries for Bedrock.
+
+Each model gets a ModelLimiter with three gates a call must pass before it is
+sent:
+
+    - a requests-per-minute token bucket
+    - a tokens-per-minute token bucket, charged with an estimate up front and
+      corrected with the usage the response reports
+    - an adaptive concurrency limit (AIMD): +1/limit per success, halved on
+      every throttle, between min and max concurrency
+
+Throttled and transient failures are retried with full-jitter exponential
+backoff. Limiters are shared by every thread and event loop in the process;
+async callers wait with asyncio.sleep, blocking callers with time.sleep.
+
+Budgets default to BEDROCK_DEFAULT_RPM / _TPM / _CONCURRENCY and can be set
+per model with BEDROCK_LIMITS, e.g.
+
+    BEDROCK_LIMITS='{"anthropic.claude-3-sonnet-20240229-v1:0": {"rpm": 100, "tpm": 200000, "concurrency": 8}}'
+"""
+import os
+import json
+import time
+import random
+import asyncio
+import threading
+from botocore.exceptions import ClientError, ConnectionError as BotoConnectionError, ReadTimeoutError
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BEDROCK_DEFAULT_RPM = float(os.getenv("BEDROCK_DEFAULT_RPM", "200"))
+BEDROCK_DEFAULT_TPM = float(os.getenv("BEDROCK_DEFAULT_TPM", "400000"))
+BEDROCK_DEFAULT_CONCURRENCY = int(os.getenv("BEDROCK_DEFAULT_CONCURRENCY", "16"))
+BEDROCK_LIMITS = json.loads(os.getenv("BEDROCK_LIMITS", "{}"))
+BEDROCK_MAX_RETRIES = int(os.getenv("BEDROCK_MAX_RETRIES", "6"))
+BEDROCK_BACKOFF_BASE = float(os.getenv("BEDROCK_BACKOFF_BASE", "0.5"))
+BEDROCK_BACKOFF_MAX = float(os.getenv("BEDROCK_BACKOFF_MAX", "20"))
+
+THROTTLE_CODES = {"ThrottlingException", "TooManyRequestsException", "ServiceQuotaExceededException"}
+TRANSIENT_CODES = {"ServiceUnavailableException", "ModelNotReadyException", "InternalServerException",
+                   "ModelTimeoutException"}
+
+# How often a caller blocked on the concurrency limit re-checks it
+_POLL_INTERVAL = 0.02
+# Throttles within this many seconds of the last decrease belong to the same burst and don't halve again
+_DECREASE_COOLDOWN = 1.0
+
+
+def classify_error(error: Exception):
+    """Return "throttle", "transient" or None (not retryable) for an exception from invoke_model."""
+    if isinstance(error, ClientError):
+        code = error.response.get("Error", {}).get("Code")
+        status = error.response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+        if code in THROTTLE_CODES or status == 429:
+            return "throttle"
+        if code in TRANSIENT_CODES or (status or 0) >= 500:
+            return "transient"
+        return None
+    if isinstance(error, (BotoConnectionError, ReadTimeoutError)):
+        return "transient"
+    return None
+
+
+def estimate_tokens(body: dict) -> int:
+    """Rough input plus reserved output tokens for a request body (about 4 characters per token)."""
+    reserved = int(body.get("max_tokens") or body.get("textGenerationConfig", {}).get("maxTokenCount") or 0)
+    return len(json.dumps(body)) // 4 + reserved
+
+
+def used_tokens(response_body: dict):
+    """Tokens the response reports as used, or None if it doesn't say."""
+    usage = response_body.get("usage")
+    if isinstance(usage, dict):
+        return int(usage.get("input_tokens", 0)) + int(usage.get("output_tokens", 0))
+    if "inputTextTokenCount" in response_body:
+        return int(response_body["inputTextTokenCount"])
+    return None
+
+
+class _TokenBucket:
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` is available; requests larger than the bucket wait for a full one."""
+        self._refill(now)
+        needed = min(amount, self.capacity) - self.level
+        return needed / self.rate if needed > 0 else 0.0
+
+    def take(self, amount: float):
+        self.level -= amount
+
+    def empty(self):
+        self.level = min(self.level, 0.0)
+
+
+class ModelLimiter:
+    def __init__(self, model_id: str, rpm: float = BEDROCK_DEFAULT_RPM, tpm: float = BEDROCK_DEFAULT_TPM,
+                 max_concurrency: int = BEDROCK_DEFAULT_CONCURRENCY, min_concurrency: int = 1):
+        self.model_id = model_id
+        self.requests = _TokenBucket(rpm)
+        self.tokens = _TokenBucket(tpm)
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.limit = float(max_concurrency)
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+        self._stats = {
+            "calls": 0, "succeeded": 0, "failed": 0, "throttles": 0, "retries": 0,
+            "queue_wait_seconds": 0.0, "max_queue_wait_seconds": 0.0, "tokens": 0
+        }
+
+    def _try_acquire(self, tokens: int) -> float:
+        """Take a slot and budget if all gates are open; otherwise return how long to wait."""
+        with self._lock:
+            if self.in_flight >= int(self.limit):
+                return _POLL_INTERVAL
+            now = time.monotonic()
+            wait = max(self.requests.wait_time(1, now), self.tokens.wait_time(tokens, now))
+            if wait > 0:
+                return wait
+            self.requests.take(1)
+            self.tokens.take(tokens)
+            self.in_flight += 1
+            return 0.0
+
+    def _record_wait(self, waited: float):
+        with self._lock:
+            self._stats["queue_wait_seconds"] += waited
+            self._stats["max_queue_wait_seconds"] = max(self._stats["max_queue_wait_seconds"], waited)
+
+    def acquire_blocking(self, tokens: int):
+        started = time.monotonic()
+        while True:
+            wait = self._try_acquire(tokens)
+            if not wait:
+                break
+            time.sleep(wait)
+        self._record_wait(time.monotonic() - started)
+
+    async def acquire(self, tokens: int):
+        started = time.monotonic()
+        while True:
+            wait = self._try_acquire(tokens)
+            if not wait:
+                break
+            await asyncio.sleep(wait)
+        self._record_wait(time.monotonic() - started)
+
+    def release(self, reserved: int, used: int = None, outcome: str = "success"):
+        """
+        Free the slot taken by acquire.
+
+        outcome is "success", "throttle", "transient" or "failed"; a throttle halves
+        the concurrency limit (once per burst) and empties the request bucket, a
+        success grows the limit by 1/limit.
+        """
+        with self._lock:
+            self.in_flight -= 1
+            if used is not None:
+                # Settle the up-front estimate against what the model actually used
+                self.tokens.take(used - reserved)
+                self._stats["tokens"] += used
+            if outcome == "success":
+                self.limit = min(self.max_concurrency, self.limit + 1.0 / self.limit)
+            elif outcome == "throttle":
+                now = time.monotonic()
+                if now - self._last_decrease >= _DECREASE_COOLDOWN:
+                    self.limit = max(self.min_concurrency, self.limit / 2)
+                    self._last_decrease = now
+                self.requests.empty()
+                self._stats["throttles"] += 1
+
+    def count(self, name: str, amount: int = 1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({
+                "concurrency_limit": round(self.limit, 2),
+                "in_flight": self.in_flight,
+                "rpm": self.requests.capacity,
+                "tpm": self.tokens.capacity
+            })
+        stats["queue_wait_seconds"] = round(stats["queue_wait_seconds"], 3)
+        stats["max_queue_wait_seconds"] = round(stats["max_queue_wait_seconds"], 3)
+        stats["avg_queue_wait_seconds"] = round(stats["queue_wait_seconds"] / stats["calls"], 4) if stats["calls"] else 0.0
+        return stats
+
+
+def backoff_delay(attempt: int, base: float = BEDROCK_BACKOFF_BASE, cap: float = BEDROCK_BACKOFF_MAX) -> float:
+    """Full-jitter exponential backoff: uniform between 0 and min(cap, base * 2^attempt)."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class BedrockRateController:
+    """Hands out one ModelLimiter per model and runs calls through it with retries."""
+
+    def __init__(self, limits: dict = None, max_retries: int = BEDROCK_MAX_RETRIES):
+        self.limits = BEDROCK_LIMITS if limits is None else limits
+        self.max_retries = max_retries
+        self._limiters = {}
+        self._lock = threading.Lock()
+
+    def limiter(self, model_id: str) -> ModelLimiter:
+        limiter = self._limiters.get(model_id)
+        if limiter is None:
+            with self._lock:
+                limiter = self._limiters.get(model_id)
+                if limiter is None:
+                    config = self.limits.get(model_id, {})
+                    limiter = self._limiters[model_id] = ModelLimiter(
+                        model_id,
+                        rpm=float(config.get("rpm", BEDROCK_DEFAULT_RPM)),
+                        tpm=float(config.get("tpm", BEDROCK_DEFAULT_TPM)),
+                        max_concurrency=int(config.get("concurrency", BEDROCK_DEFAULT_CONCURRENCY))
+                    )
+        return limiter
+
+    def _finish(self, limiter: ModelLimiter, reserved: int, attempt: int, result=None, error: Exception = None):
+        """Release the slot and decide what happens next: returns the retry delay, or None to stop."""
+        if error is None:
+            limiter.release(reserved, used_tokens(result) if isinstance(result, dict) else None)
+            limiter.count("succeeded")
+            return None
+        kind = classify_error(error)
+        limiter.release(reserved, outcome=kind or "failed")
+        if kind is None or attempt >= self.max_retries:
+            limiter.count("failed")
+            return None
+        limiter.count("retries")
+        return backoff_delay(attempt)
+
+    def call(self, model_id: str, body: dict, fn):
+        """Run the blocking fn() under the model's limits, retrying throttles and transient errors."""
+        limiter = self.limiter(model_id)
+        reserved = estimate_tokens(body)
+        limiter.count("calls")
+        for attempt in range(self.max_retries + 1):
+            limiter.acquire_blocking(reserved)
+            try:
+                result = fn()
+            except Exception as e:
+                delay = self._finish(limiter, reserved, attempt, error=e)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                continue
+            self._finish(limiter, reserved, attempt, result=result)
+            return result
+
+    async def call_async(self, model_id: str, body: dict, fn):
+        """Async call(): fn() returns an awaitable and waits happen without blocking the loop."""
+        limiter = self.limiter(model_id)
+        reserved = estimate_tokens(body)
+        limiter.count("calls")
+        for attempt in range(self.max_retries + 1):
+            await limiter.acquire(reserved)
+            try:
+                result = await fn()
+            except asyncio.CancelledError:
+                limiter.release(reserved, outcome="failed")
+                raise
+            except Exception as e:
+                delay = self._finish(limiter, reserved, attempt, error=e)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            self._finish(limiter, reserved, attempt, result=result)
+            return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            limiters = dict(self._limiters)
+        return {model_id: limiter.stats() for model_id, limiter in limiters.items()}
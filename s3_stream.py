@@ -0,0 +1,98 @@
+import os
+import asyncio
+import hashlib
+from dotenv import load_dotenv
+from audio_probe import HEADER_BYTES, probe_bytes
+
+load_dotenv()
+
+# S3 requires every part except the last to be at least 5 MB
+S3_PART_SIZE = int(os.getenv("S3_PART_SIZE", str(8 * 1024 * 1024)))
+S3_UPLOAD_CONCURRENCY = int(os.getenv("S3_UPLOAD_CONCURRENCY", "4"))
+
+
+async def stream_upload_to_s3(upload, s3_client, bucket: str, key: str,
+                              part_size: int = S3_PART_SIZE, concurrency: int = S3_UPLOAD_CONCURRENCY) -> dict:
+    """
+    Stream an UploadFile to S3 with a multipart upload.
+
+    The body is read one part at a time and up to `concurrency` parts are sent
+    in parallel, so no more than `concurrency + 1` parts are ever held in memory
+    regardless of the file size. The SHA-256 of the content and the audio header
+    are captured while the bytes pass through.
+
+    Starlette has already spooled the request body to a temporary file by the
+    time the endpoint runs, so this streams from that file to S3; it bounds
+    memory, not the time spent receiving the upload.
+
+    Returns:
+        Dictionary with the object size, content hash and audio metadata
+    """
+    created = await asyncio.to_thread(s3_client.create_multipart_upload, Bucket=bucket, Key=key)
+    upload_id = created["UploadId"]
+    sha256 = hashlib.sha256()
+    head = b""
+    tail = b""
+    total_size = 0
+    parts = []
+    in_flight = set()
+    slots = asyncio.Semaphore(concurrency)
+
+    async def send_part(part_number: int, data: bytes):
+        try:
+            response = await asyncio.to_thread(
+                s3_client.upload_part,
+                Bucket=bucket, Key=key, UploadId=upload_id, PartNumber=part_number, Body=data
+            )
+            parts.append({"PartNumber": part_number, "ETag": response["ETag"]})
+        finally:
+            slots.release()
+
+    try:
+        part_number = 0
+        while True:
+            data = await upload.read(part_size)
+            if not data:
+                break
+            part_number += 1
+            total_size += len(data)
+            sha256.update(data)
+            if len(head) < HEADER_BYTES:
+                head += data[:HEADER_BYTES - len(head)]
+            # Keep only the last HEADER_BYTES seen, some formats store the duration at the end
+            tail = (tail + data[-HEADER_BYTES:])[-HEADER_BYTES:]
+
+            # Wait for a free slot before reading more, which keeps memory bounded
+            await slots.acquire()
+            task = asyncio.create_task(send_part(part_number, data))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+            del data
+
+        await asyncio.gather(*in_flight)
+
+        if not parts:
+            # S3 rejects a multipart upload without parts, an empty file still needs one
+            await slots.acquire()
+            await send_part(1, b"")
+
+        parts.sort(key=lambda p: p["PartNumber"])
+        await asyncio.to_thread(
+            s3_client.complete_multipart_upload,
+            Bucket=bucket, Key=key, UploadId=upload_id, MultipartUpload={"Parts": parts}
+        )
+    except BaseException:
+        for task in in_flight:
+            task.cancel()
+        # A failed abort is only logged, the original error (or cancellation) is what the caller needs
+        try:
+            await asyncio.to_thread(s3_client.abort_multipart_upload, Bucket=bucket, Key=key, UploadId=upload_id)
+        except Exception as e:
+            print(f"⚠️ Could not abort multipart upload {upload_id} of {key}: {str(e)}")
+        raise
+
+    return {
+        "size": total_size,
+        "sha256": sha256.hexdigest(),
+        "audio": probe_bytes(head, total_size, tail)
+    }
@@ -0,0 +1,185 @@
+"""
+Deterministic merge of per-segment call summaries.
+
+Long transcripts are summarized in segments (see `summarize_conversation_bedrock`
+in utils.py); each segment yields a partial result in the full Summary schema.
+`merge_summaries` folds those partials, in transcript order, into one Summary:
+
+    - customer and agent details: first value a segment actually provides
+    - end-of-call state (next steps, follow-up, satisfaction, completion): last provided value
+    - agent scores and sentiment scores: averages weighted by segment size
+    - statement counts: summed; per-statement sentiment lists: concatenated
+    - product interest and competitors: ordered union of the listed names
+
+The same partials always produce the same Summary, so re-running a call does not
+reshuffle fields. `score` and the 10-point sentiment scale are left to the caller's
+usual post-processing.
+"""
+
+# Values meaning "the segment did not mention this"
+MISSING = {"", "not provided", "unknown", "n/a", "none", "null", "not mentioned"}
+
+# Fields describing where the call ended up; later segments win
+LATEST_FIELDS = (
+    "User_Satisfaction", "Next_Steps", "follow_up_call", "Customer_Tone",
+    "Overall_Customer_Emotion", "Call_Disconnected", "Call_Completion_Status"
+)
+AGENT_SCORE_FIELDS = ("Professionalism", "Product_Knowledge", "Communication_Skills", "Problem_Solving")
+SENTIMENTS = ("Positive", "Negative", "Neutral")
+STATEMENT_COUNT_FIELDS = ("Total_Customer_Statements", "Positive_Statements", "Negative_Statements", "Neutral_Statements")
+MAX_SUMMARY_POINTS = 8
+
+
+def is_missing(value) -> bool:
+    if value is None:
+        return True
+    if isinstance(value, str):
+        return value.strip().lower() in MISSING
+    if isinstance(value, (list, dict)):
+        return not value
+    return False
+
+
+def _number(value):
+    """A float for numbers and numeric strings, None for anything else."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(str(value).strip())
+    except (TypeError, ValueError):
+        return None
+
+
+def _first(values):
+    return next((value for value in values if not is_missing(value)), "not provided")
+
+
+def _last(values):
+    return _first(reversed(list(values)))
+
+
+def _merge_details(parts):
+    """Field-by-field first provided value for nested detail objects such as Customer."""
+    parts = [part for part in parts if isinstance(part, dict)]
+    merged = {}
+    for part in parts:
+        for key in part:
+            if key in merged:
+                continue
+            values = [other.get(key) for other in parts]
+            if any(isinstance(value, dict) for value in values):
+                merged[key] = _merge_details(values)
+            else:
+                merged[key] = _first(values)
+    return merged
+
+
+def _union(values):
+    """Ordered, case-insensitive union of comma-separated names."""
+    seen, names = set(), []
+    for value in values:
+        if is_missing(value):
+            continue
+        for name in (value if isinstance(value, list) else str(value).split(",")):
+            name = str(name).strip()
+            if not is_missing(name) and name.lower() not in seen:
+                seen.add(name.lower())
+                names.append(name)
+    return ", ".join(names) if names else "not provided"
+
+
+def _weighted_average(values, weights):
+    pairs = [(value, weight) for value, weight in zip(map(_number, values), weights) if value is not None and weight > 0]
+    total = sum(weight for _, weight in pairs)
+    return sum(value * weight for value, weight in pairs) / total if total else None
+
+
+def _summary_points(parts):
+    """Up to MAX_SUMMARY_POINTS distinct points, taking the same share from every segment."""
+    lists = [[point for point in part.get("Summary") or [] if not is_missing(point)] for part in parts]
+    share = max(1, MAX_SUMMARY_POINTS // max(1, len(lists)))
+    seen, points = set(), []
+    for points_of_segment in lists:
+        for point in points_of_segment[:share]:
+            key = str(point).strip().lower()
+            if key not in seen and len(points) < MAX_SUMMARY_POINTS:
+                seen.add(key)
+                points.append(point)
+    return points
+
+
+def _call_quality(values):
+    issues = []
+    for value in values:
+        if not is_missing(value) and str(value).strip().lower() != "good" and value not in issues:
+            issues.append(value)
+    return "; ".join(issues) if issues else "Good"
+
+
+def merge_summaries(parts, weights=None) -> dict:
+    """
+    Merge partial summaries of consecutive transcript segments into one Summary.
+
+    Args:
+        parts: Parsed Summary dicts, in transcript order
+        weights: Size of each segment (e.g. word count) used for the score averages;
+            equal weights when omitted
+
+    Returns:
+        One dict in the Summary schema
+    """
+    parts = [part for part in parts if isinstance(part, dict)]
+    if not parts:
+        return {}
+    weights = list(weights) if weights is not None else [1.0] * len(parts)
+
+    merged = {
+        "Customer": _merge_details(part.get("Customer") for part in parts),
+        "Sales_Agent": _merge_details(part.get("Sales_Agent") for part in parts),
+        "Purpose_of_call": _first(part.get("Purpose_of_call") for part in parts),
+        "Summary": _summary_points(parts),
+        "Competitor_Mention": _union(part.get("Competitor_Mention") for part in parts),
+        "Product_Interest": _union(part.get("Product_Interest") for part in parts),
+        "Call_Quality": _call_quality(part.get("Call_Quality") for part in parts),
+    }
+    for field in LATEST_FIELDS:
+        merged[field] = _last(part.get(field) for part in parts)
+
+    agent_scores = {}
+    for field in AGENT_SCORE_FIELDS:
+        average = _weighted_average([(part.get("Sales_Agent_Score") or {}).get(field) for part in parts], weights)
+        if average is not None:
+            agent_scores[field] = round(average)
+    merged["Sales_Agent_Score"] = agent_scores
+
+    statements = []
+    for part in parts:
+        statements.extend(item for item in part.get("Customer_Sentiment_Per_Statement") or [] if isinstance(item, dict))
+    merged["Customer_Sentiment_Per_Statement"] = statements
+
+    counts = {field: 0 for field in STATEMENT_COUNT_FIELDS}
+    for part in parts:
+        for field in STATEMENT_COUNT_FIELDS:
+            counts[field] += int(_number((part.get("Statement_Counts") or {}).get(field)) or 0)
+    merged["Statement_Counts"] = counts
+
+    # Segments with more customer statements say more about the customer's overall sentiment
+    statement_weights = [
+        _number((part.get("Statement_Counts") or {}).get("Total_Customer_Statements")) or weight
+        for part, weight in zip(parts, weights)
+    ]
+    sentiment_scores = {"Total_Sentiment_Score": 10}
+    for sentiment in SENTIMENTS:
+        field = f"{sentiment}_Sentiment_Score"
+        average = _weighted_average([(part.get("Sentiment_Scores") or {}).get(field) for part in parts], statement_weights)
+        sentiment_scores[field] = round(average, 1) if average is not None else 0
+    merged["Sentiment_Scores"] = sentiment_scores
+
+    # Dominant merged sentiment; ties go to Neutral, then Positive
+    ranked = sorted(SENTIMENTS, key=lambda s: (sentiment_scores[f"{s}_Sentiment_Score"], s == "Neutral", s == "Positive"))
+    merged["Overall_Customer_Sentiment"] = ranked[-1] if any(
+        sentiment_scores[f"{s}_Sentiment_Score"] for s in SENTIMENTS
+    ) else _last(part.get("Overall_Customer_Sentiment") for part in parts)
+    return merged
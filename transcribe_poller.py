@@ -0,0 +1,148 @@
+import os
+import time
+import asyncio
+import threading
+from concurrent.futures import Future
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Polling configuration
+TRANSCRIBE_POLL_MIN_INTERVAL = float(os.getenv("TRANSCRIBE_POLL_MIN_INTERVAL", "2"))
+TRANSCRIBE_POLL_MAX_INTERVAL = float(os.getenv("TRANSCRIBE_POLL_MAX_INTERVAL", "30"))
+TRANSCRIBE_MAX_WAIT = float(os.getenv("TRANSCRIBE_MAX_WAIT", str(3 * 60 * 60)))
+# Above this many in-flight jobs a few list calls are cheaper than one get call per job
+TRANSCRIBE_BATCH_THRESHOLD = int(os.getenv("TRANSCRIBE_BATCH_THRESHOLD", "5"))
+
+FINISHED_STATUSES = ("COMPLETED", "FAILED")
+
+
+class TranscribePoller:
+    """
+    Tracks every in-flight AWS Transcribe job from a single background event loop.
+
+    Callers register a job name and await the returned future, which resolves to
+    the final job summary once Transcribe reports COMPLETED or FAILED. The poll
+    interval grows while nothing changes and drops back as soon as a job finishes.
+    With many jobs in flight, status is read in batches via list_transcription_jobs
+    instead of one get_transcription_job call per job.
+    """
+
+    def __init__(self, client, name_prefix: str = "transcribe_"):
+        self.client = client
+        self.name_prefix = name_prefix
+        self._jobs = {}  # job_name -> (future, started_at)
+        self._lock = threading.Lock()
+        self._loop = None
+        self._wakeup = None
+        self._thread = None
+
+    def track(self, job_name: str) -> Future:
+        """Start tracking a job. Safe to call from any thread or event loop."""
+        future = Future()
+        with self._lock:
+            self._jobs[job_name] = (future, time.time())
+            self._ensure_running()
+        self._loop.call_soon_threadsafe(self._wakeup.set)
+        return future
+
+    async def wait(self, job_name: str) -> dict:
+        """Await the final job summary from the caller's own event loop."""
+        return await asyncio.wrap_future(self.track(job_name))
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._jobs)
+
+    def _ensure_running(self):
+        if self._thread and self._thread.is_alive():
+            return
+        ready = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            self._wakeup = asyncio.Event()
+            ready.set()
+            self._loop.run_until_complete(self._poll_forever())
+
+        self._thread = threading.Thread(target=run, name="transcribe-poller", daemon=True)
+        self._thread.start()
+        ready.wait()
+
+    async def _poll_forever(self):
+        interval = TRANSCRIBE_POLL_MIN_INTERVAL
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+            with self._lock:
+                pending = {name: entry for name, entry in self._jobs.items()}
+            if not pending:
+                interval = TRANSCRIBE_POLL_MIN_INTERVAL
+                continue
+
+            try:
+                if len(pending) > TRANSCRIBE_BATCH_THRESHOLD:
+                    finished = await self._check_batch(pending)
+                else:
+                    finished = await self._check_each(pending)
+            except Exception as e:
+                print(f"⚠️ Transcribe status check failed: {e}")
+                finished = {}
+
+            now = time.time()
+            for name, (future, started_at) in pending.items():
+                if name in finished:
+                    self._resolve(name, result=finished[name])
+                elif now - started_at > TRANSCRIBE_MAX_WAIT:
+                    self._resolve(name, error=TimeoutError(f"Transcription job {name} did not finish in time"))
+
+            # Back off while nothing changes, poll eagerly again once jobs complete
+            if finished:
+                interval = TRANSCRIBE_POLL_MIN_INTERVAL
+            else:
+                interval = min(interval * 1.5, TRANSCRIBE_POLL_MAX_INTERVAL)
+
+    async def _check_each(self, pending: dict) -> dict:
+        finished = {}
+        for name in pending:
+            response = await asyncio.to_thread(self.client.get_transcription_job, TranscriptionJobName=name)
+            job = response["TranscriptionJob"]
+            if job["TranscriptionJobStatus"] in FINISHED_STATUSES:
+                finished[name] = job
+        return finished
+
+    async def _check_batch(self, pending: dict) -> dict:
+        """List recently finished jobs, newest first, until all pending jobs are accounted for."""
+        finished = {}
+        oldest_start = min(started_at for _, started_at in pending.values())
+        for status in FINISHED_STATUSES:
+            kwargs = {"Status": status, "JobNameContains": self.name_prefix, "MaxResults": 100}
+            while True:
+                response = await asyncio.to_thread(self.client.list_transcription_jobs, **kwargs)
+                summaries = response.get("TranscriptionJobSummaries", [])
+                for summary in summaries:
+                    if summary["TranscriptionJobName"] in pending:
+                        finished[summary["TranscriptionJobName"]] = summary
+                reached_older_jobs = summaries and summaries[-1]["CreationTime"].timestamp() < oldest_start - 60
+                if len(finished) == len(pending) or reached_older_jobs or "NextToken" not in response:
+                    break
+                kwargs["NextToken"] = response["NextToken"]
+        return finished
+
+    def _resolve(self, job_name: str, result=None, error=None):
+        with self._lock:
+            entry = self._jobs.pop(job_name, None)
+        if entry is None:
+            return
+        future = entry[0]
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
@@ -0,0 +1,244 @@
+"""
+Semantic search across stored call transcripts.
+
+Every processed call's transcript is split into overlapping chunks, embedded,
+and appended to a local SQLite file shared by all workers on the host. Each
+process keeps the vectors in a normalized float32 matrix and pulls in rows
+added (or removed) by other processes before every search, so the index grows
+incrementally without rebuilds.
+
+Index calls that were stored before this existed with:
+
+    python transcript_index.py backfill
+"""
+import os
+import time
+import sqlite3
+import asyncio
+import argparse
+import threading
+import numpy as np
+from dotenv import load_dotenv
+from aws_clients import run_on_bedrock_pool
+from chunking import chunk_text
+
+load_dotenv()
+
+TRANSCRIPT_INDEX_PATH = os.getenv("TRANSCRIPT_INDEX_PATH", "transcript_index.db")
+TRANSCRIPT_CHUNK_WORDS = int(os.getenv("TRANSCRIPT_CHUNK_WORDS", "120"))
+TRANSCRIPT_CHUNK_OVERLAP = int(os.getenv("TRANSCRIPT_CHUNK_OVERLAP", "20"))
+# Embedding requests in flight while indexing one call
+TRANSCRIPT_EMBED_CONCURRENCY = int(os.getenv("TRANSCRIPT_EMBED_CONCURRENCY", "4"))
+
+
+class TranscriptIndex:
+    def __init__(self, path: str = TRANSCRIPT_INDEX_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._matrix = None
+        self._size = 0
+        self._alive = np.zeros(0, dtype=bool)
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._positions = {}      # chunk id -> matrix row
+        self._call_ids = []
+        self._chunk_nos = []
+        self._texts = []
+        self._last_chunk_id = 0
+        self._last_deletion_id = 0
+
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS transcript_chunks (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                call_id TEXT NOT NULL,
+                chunk_no INTEGER NOT NULL,
+                text TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS transcript_chunks_call ON transcript_chunks (call_id)")
+        # Ids of chunks removed when a call is re-indexed, so other processes can drop them too
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS transcript_deletions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                chunk_id INTEGER NOT NULL
+            )
+        """)
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            self._local.conn = conn
+        return conn
+
+    def add_call(self, call_id: str, chunks, vectors) -> int:
+        """Replace the indexed chunks of one call. Chunks whose embedding failed are skipped."""
+        rows = []
+        now = time.time()
+        for chunk_no, (text, vector) in enumerate(zip(chunks, vectors)):
+            if not vector:
+                continue
+            vector = np.asarray(vector, dtype=np.float32)
+            norm = np.linalg.norm(vector)
+            if norm:
+                rows.append((call_id, chunk_no, text, (vector / norm).tobytes(), now))
+
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT INTO transcript_deletions (chunk_id) SELECT id FROM transcript_chunks WHERE call_id = ?",
+                (call_id,)
+            )
+            conn.execute("DELETE FROM transcript_chunks WHERE call_id = ?", (call_id,))
+            conn.executemany(
+                "INSERT INTO transcript_chunks (call_id, chunk_no, text, vector, created_at) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self.sync()
+        return len(rows)
+
+    async def index_call(self, call_id: str, transcript: str, embed,
+                         concurrency: int = TRANSCRIPT_EMBED_CONCURRENCY) -> int:
+        """Chunk and embed a transcript with `embed(text)` and store it. Returns the number of chunks indexed."""
+        chunks = list(chunk_text(transcript or "", TRANSCRIPT_CHUNK_WORDS, TRANSCRIPT_CHUNK_OVERLAP))
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def embed_chunk(text):
+            async with semaphore:
+                return await run_on_bedrock_pool(embed, text)
+
+        vectors = await asyncio.gather(*(embed_chunk(text) for text in chunks))
+        return await asyncio.to_thread(self.add_call, call_id, chunks, vectors)
+
+    def sync(self):
+        """Load chunks added and drop chunks deleted since the last sync, by this or any other process."""
+        conn = self._connect()
+        with self._lock:
+            added = conn.execute(
+                "SELECT id, call_id, chunk_no, text, vector FROM transcript_chunks WHERE id > ? ORDER BY id",
+                (self._last_chunk_id,)
+            ).fetchall()
+            deleted = conn.execute(
+                "SELECT id, chunk_id FROM transcript_deletions WHERE id > ? ORDER BY id",
+                (self._last_deletion_id,)
+            ).fetchall()
+            if added:
+                self._append(added)
+            for deletion_id, chunk_id in deleted:
+                row = self._positions.pop(chunk_id, None)
+                if row is not None:
+                    self._alive[row] = False
+                self._last_deletion_id = deletion_id
+
+    def _append(self, records):
+        vectors = np.vstack([np.frombuffer(record[4], dtype=np.float32) for record in records])
+        if self._matrix is None:
+            self._matrix = np.zeros((max(1024, len(records)), vectors.shape[1]), dtype=np.float32)
+            self._alive = np.zeros(self._matrix.shape[0], dtype=bool)
+            self._ids = np.zeros(self._matrix.shape[0], dtype=np.int64)
+        needed = self._size + len(records)
+        if needed > self._matrix.shape[0]:
+            # Grow by doubling so appends stay amortized O(1) per row
+            capacity = max(needed, self._matrix.shape[0] * 2)
+            self._matrix = np.concatenate([self._matrix, np.zeros((capacity - self._matrix.shape[0], self._matrix.shape[1]), dtype=np.float32)])
+            self._alive = np.concatenate([self._alive, np.zeros(capacity - self._alive.shape[0], dtype=bool)])
+            self._ids = np.concatenate([self._ids, np.zeros(capacity - self._ids.shape[0], dtype=np.int64)])
+
+        start, end = self._size, needed
+        self._matrix[start:end] = vectors
+        self._alive[start:end] = True
+        for row, (chunk_id, call_id, chunk_no, text, _) in enumerate(records, start=start):
+            self._ids[row] = chunk_id
+            self._positions[chunk_id] = row
+            self._call_ids.append(call_id)
+            self._chunk_nos.append(chunk_no)
+            self._texts.append(text)
+        self._size = end
+        self._last_chunk_id = records[-1][0]
+
+    def search(self, query_embedding, k: int = 10, chunks_per_call: int = 3):
+        """
+        Return the k calls whose transcript chunks best match the query.
+
+        Returns:
+            List of {"call_id", "score", "snippets": [{"chunk_no", "score", "text"}]}
+            sorted by the best chunk score, at most chunks_per_call snippets each
+        """
+        self.sync()
+        with self._lock:
+            matrix, alive, size = self._matrix, self._alive, self._size
+            call_ids, chunk_nos, texts = self._call_ids, self._chunk_nos, self._texts
+        if matrix is None or size == 0 or k <= 0:
+            return []
+
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm == 0 or query.shape[0] != matrix.shape[1]:
+            return []
+        scores = matrix[:size] @ (query / norm)
+        scores[~alive[:size]] = -np.inf
+
+        # Enough top chunks that k distinct calls are very likely among them
+        depth = min(size, k * chunks_per_call * 4)
+        top = np.argpartition(-scores, depth - 1)[:depth] if depth < size else np.arange(size)
+        top = top[np.argsort(-scores[top])]
+
+        results = {}
+        for row in top:
+            if not np.isfinite(scores[row]):
+                break
+            call = results.get(call_ids[row])
+            if call is None:
+                if len(results) == k:
+                    continue
+                call = results[call_ids[row]] = {"call_id": call_ids[row], "score": float(scores[row]), "snippets": []}
+            if len(call["snippets"]) < chunks_per_call:
+                call["snippets"].append({"chunk_no": chunk_nos[row], "score": float(scores[row]), "text": texts[row]})
+        return list(results.values())
+
+    def stats(self) -> dict:
+        with self._lock:
+            live = int(self._alive[:self._size].sum()) if self._size else 0
+            calls = len({self._call_ids[row] for row in np.flatnonzero(self._alive[:self._size])}) if self._size else 0
+        return {
+            "chunks": live,
+            "calls": calls,
+            "dim": self._matrix.shape[1] if self._matrix is not None else None,
+            "memory_mb": round(self._matrix.nbytes / 1e6, 2) if self._matrix is not None else 0.0
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Transcript search index tools")
+    commands = parser.add_subparsers(dest="command", required=True)
+    backfill = commands.add_parser("backfill", help="Index every call already stored in DynamoDB")
+    backfill.add_argument("--table", default="call_audit")
+    backfill.add_argument("--skip-indexed", action="store_true", help="Leave calls that are already indexed alone")
+    args = parser.parse_args(argv)
+
+    if args.command == "backfill":
+        from dynamo_scan import scan_items
+        from rag import generate_embeddings
+
+        index = TranscriptIndex()
+        indexed = {row[0] for row in index._connect().execute("SELECT DISTINCT call_id FROM transcript_chunks")}
+        calls = chunks = 0
+        for item in scan_items(args.table, ["call_id", "Transcript"]):
+            if not item.get("Transcript") or (args.skip_indexed and item["call_id"] in indexed):
+                continue
+            chunks += asyncio.run(index.index_call(item["call_id"], item["Transcript"], generate_embeddings))
+            calls += 1
+        print(f"✅ Indexed {chunks} chunks from {calls} calls")
+
+
+if __name__ == "__main__":
+    main()
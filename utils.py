@@ -1,15 +1,19 @@
 import os
+import uuid
+import asyncio
 from dotenv import load_dotenv
-import boto3
 import time
 import json
 from datetime import datetime
 from urllib.parse import urlparse
-from PyPDF2 import PdfReader
 from decimal import Decimal
-from pydub import AudioSegment
 from botocore.exceptions import ClientError
 import regex as re
+from transcribe_poller import TranscribePoller
+from audio_probe import probe_file
+from aws_clients import invoke_model_async, lazy_client, lazy_resource, lazy_table, stream_model_async, text_parses
+from chunking import chunk_text, count_words
+from summary_merge import merge_summaries
 # Load environment variables
 load_dotenv()
 
@@ -19,43 +23,20 @@ AWS_SECRET_KEY = os.getenv("AWS_SECRET_KEY")
 AWS_REGION = os.getenv("AWS_REGION")
 BUCKET_NAME = os.getenv("BUCKET_NAME")\
 
+# Transcripts longer than this many words are summarized segment by segment and merged
+SUMMARY_LONG_CALL_WORDS = int(os.getenv("SUMMARY_LONG_CALL_WORDS", "3000"))
+SUMMARY_SEGMENT_WORDS = int(os.getenv("SUMMARY_SEGMENT_WORDS", "2000"))
+SUMMARY_SEGMENT_OVERLAP = int(os.getenv("SUMMARY_SEGMENT_OVERLAP", "100"))
+SUMMARY_SEGMENT_CONCURRENCY = int(os.getenv("SUMMARY_SEGMENT_CONCURRENCY", "4"))
 
-# Initialize AWS clients with proper configuration
-dynamodb = boto3.resource(
-    'dynamodb',
-    aws_access_key_id=AWS_ACCESS_KEY,
-    aws_secret_access_key=AWS_SECRET_KEY,
-    region_name=AWS_REGION
-)
-table = dynamodb.Table('call_audit')
-
-s3 = boto3.client(
-    "s3",
-    aws_access_key_id=AWS_ACCESS_KEY,
-    aws_secret_access_key=AWS_SECRET_KEY,
-    region_name=AWS_REGION
-)
-
-transcribe = boto3.client(
-    "transcribe",
-    aws_access_key_id=AWS_ACCESS_KEY,
-    aws_secret_access_key=AWS_SECRET_KEY,
-    region_name=AWS_REGION
-)
-
-s3 = boto3.client(
-    "s3",
-    aws_access_key_id=AWS_ACCESS_KEY,
-    aws_secret_access_key=AWS_SECRET_KEY,
-    region_name=AWS_REGION
-)
-
-bedrock_client = boto3.client(
-    service_name="bedrock-runtime",
-    region_name=AWS_REGION,
-    aws_access_key_id=AWS_ACCESS_KEY,
-    aws_secret_access_key=AWS_SECRET_KEY
-)
+
+# Shared, pooled AWS clients, created on first use
+dynamodb = lazy_resource("dynamodb")
+table = lazy_table('call_audit')
+s3 = lazy_client("s3")
+transcribe = lazy_client("transcribe")
+
+transcribe_poller = TranscribePoller(transcribe)
 
 def convert_floats_to_decimals(data):
     """Recursively convert all float values in a dictionary to Decimal"""
@@ -67,7 +48,7 @@ def convert_floats_to_decimals(data):
         return [convert_floats_to_decimals(item) for item in data]
     return data
 
-def transcribe_audio_aws(s3_uri: str, original_filename: str, save_folder: str = "transcripts") -> dict:
+async def transcribe_audio_aws(s3_uri: str, original_filename: str, save_folder: str = "transcripts") -> dict:
     """
     Transcribes audio file using AWS Transcribe service
     
@@ -80,10 +61,12 @@ def transcribe_audio_aws(s3_uri: str, original_filename: str, save_folder: str =
         Dictionary with status, transcript text, and path to saved transcript
     """
     try:
-        job_name = f"transcribe_{int(time.time())}"
+        # Unique per upload so concurrent jobs started in the same second never collide
+        job_name = f"transcribe_{uuid.uuid4().hex}"
 
         # Start transcription job
-        transcribe.start_transcription_job(
+        await asyncio.to_thread(
+            transcribe.start_transcription_job,
             TranscriptionJobName=job_name,
             Media={'MediaFileUri': s3_uri},
             MediaFormat=os.path.splitext(original_filename)[1][1:].lower(),
@@ -92,20 +75,14 @@ def transcribe_audio_aws(s3_uri: str, original_filename: str, save_folder: str =
             OutputKey=f"transcribe-output/{job_name}.json"
         )
 
-        # Wait for job to complete
-        while True:
-            status = transcribe.get_transcription_job(TranscriptionJobName=job_name)
-            job_status = status['TranscriptionJob']['TranscriptionJobStatus']
-            if job_status in ['COMPLETED', 'FAILED']:
-                break
-            time.sleep(5)
-
-        if job_status == 'FAILED':
-            return {"status": "error", "error": "Transcription failed."}
+        # Wait for job to complete without blocking the event loop
+        job = await transcribe_poller.wait(job_name)
+        if job['TranscriptionJobStatus'] == 'FAILED':
+            return {"status": "error", "error": f"Transcription failed. {job.get('FailureReason', '')}".strip()}
 
         # Get the transcript file from S3
         output_key = f"transcribe-output/{job_name}.json"
-        obj = s3.get_object(Bucket=BUCKET_NAME, Key=output_key)
+        obj = await asyncio.to_thread(s3.get_object, Bucket=BUCKET_NAME, Key=output_key)
         data = json.loads(obj['Body'].read().decode('utf-8'))
         transcript_text = data['results']['transcripts'][0]['transcript']
 
@@ -126,34 +103,33 @@ def transcribe_audio_aws(s3_uri: str, original_filename: str, save_folder: str =
     except Exception as e:
         return {"status": "error", "error": str(e)}
 
-def invoke_bedrock_claude(prompt: str, model_id: str = "anthropic.claude-3-haiku-20240307-v1:0") -> dict:
+async def invoke_bedrock_claude(prompt: str, model_id: str = "anthropic.claude-3-haiku-20240307-v1:0", on_text=None,
+                                validate=None) -> dict:
     """
     Invokes Claude 3 model on AWS Bedrock
     
     Args:
         prompt: The input prompt/text to send to Claude
         model_id: The Bedrock model ID to use
+        on_text: Optional callback streamed the generated text as it arrives (see stream_model_async)
+        validate: Optional check a response must pass to be cached (see invoke_model_json)
     
     Returns:
         Dictionary containing the model's response
     """
+    body = {
+        "anthropic_version": "bedrock-2023-05-31",
+        "max_tokens": 3000,
+        "temperature": 0,
+        "messages": [{
+            "role": "user",
+            "content": [{"type": "text", "text": prompt}]
+        }]
+    }
     try:
-        body = json.dumps({
-            "anthropic_version": "bedrock-2023-05-31",
-            "max_tokens": 3000,
-            "messages": [{
-                "role": "user",
-                "content": [{"type": "text", "text": prompt}]
-            }]
-        })
-
-        response = bedrock_client.invoke_model(
-            modelId=model_id,
-            body=body
-        )
-
-        response_body = json.loads(response['body'].read().decode('utf-8'))
-        return response_body
+        if on_text:
+            return await stream_model_async(model_id, body, on_text, validate=validate)
+        return await invoke_model_async(model_id, body, validate=validate)
 
     except Exception as e:
         return {"error": str(e)}
@@ -172,20 +148,7 @@ def convert_floats_to_decimals(obj):
         return [convert_floats_to_decimals(item) for item in obj]
     return obj
 
-async def summarize_conversation_bedrock(transcript_text: str, today_date: str = None) -> dict:
-    """
-    Summarizes a Leap Finance call transcript using Claude 3 on AWS Bedrock
- 
-    Args:
-        transcript_text: The conversation transcript to analyze
-        today_date: Reference date for analysis (YYYY-MM-DD format)
- 
-    Returns:
-        Dictionary containing structured analysis of the conversation
-    """
-    if not today_date:
-        today_date = datetime.now().strftime("%Y-%m-%d")
- 
+def _summary_prompt(transcript_text: str, today_date: str, segment_note: str = "") -> str:
     known_services = [
     "Education Loan Assistance", "GRE Preparation Support", "IELTS Coaching",
     "University Admission Guidance", "Forex Support", "Visa Counseling",
@@ -318,75 +281,151 @@ Return output in this exact JSON format:
     "Call_Disconnected": "True/False",
     "Call_Completion_Status": "True/False"
 }}
-Transcript for analysis:
+{segment_note}Transcript for analysis:
 {transcript_text}
 """
+    return prompt
+
+
+def _segment_note(index: int, total: int, context: str = "") -> str:
+    note = f"""This transcript is part {index} of {total} of one long call. Analyze only this part: return `not provided` for anything not stated in it, count only the customer statements in it, and score the agent on this part alone.
  
-    try:
-        response = invoke_bedrock_claude(prompt)
- 
-        if "error" in response:
-            return {"error": response["error"]}
- 
-        content = response.get("content", [])
-        if not content:
-            return {"error": "Empty response from Bedrock"}
- 
-        summary_text = content[0].get("text", "")
-        if not summary_text:
-            return {"error": "No analysis generated"}
- 
-        try:
-            summary_dict = json.loads(summary_text)
- 
-            if "Sentiment_Scores" in summary_dict:
-                total = 10
-                pos = summary_dict["Sentiment_Scores"].get("Positive_Sentiment_Score", 0)
-                neg = summary_dict["Sentiment_Scores"].get("Negative_Sentiment_Score", 0)
-                neu = summary_dict["Sentiment_Scores"].get("Neutral_Sentiment_Score", 0)
- 
-                current_sum = pos + neg + neu
-                if current_sum != total and current_sum > 0:
-                    scale = total / current_sum
-                    summary_dict["Sentiment_Scores"]["Positive_Sentiment_Score"] = round(pos * scale, 1)
-                    summary_dict["Sentiment_Scores"]["Negative_Sentiment_Score"] = round(neg * scale, 1)
-                    summary_dict["Sentiment_Scores"]["Neutral_Sentiment_Score"] = round(neu * scale, 1)
- 
-                summary_dict["Sentiment_Scores"]["Total_Sentiment_Score"] = total
- 
-            if "Sales_Agent_Score" in summary_dict:
-                scores = [
-                    summary_dict["Sales_Agent_Score"].get("Professionalism", 0),
-                    summary_dict["Sales_Agent_Score"].get("Product_Knowledge", 0),
-                    summary_dict["Sales_Agent_Score"].get("Communication_Skills", 0),
-                    summary_dict["Sales_Agent_Score"].get("Problem_Solving", 0)
-                ]
-                valid_scores = [s for s in scores if isinstance(s, (int, float))]
-                if valid_scores:
-                    summary_dict["score"] = round(sum(valid_scores) / len(valid_scores))
-                else:
-                    summary_dict["score"] = 0
- 
-            if "Customer" in summary_dict:
-                for field in ["Contact_Details", "Emergency_Contact_Details"]:
-                    if field in summary_dict["Customer"] and summary_dict["Customer"][field] not in [None, "not provided"]:
-                        cleaned = re.sub(r'[^\d]', '', str(summary_dict["Customer"][field]))
-                        if len(cleaned) > 10:
-                            cleaned = cleaned[-10:]
-                        summary_dict["Customer"][field] = cleaned if cleaned else "not provided"
- 
-            summary_dict = convert_floats_to_decimals(summary_dict)
-            return summary_dict
+"""
+    if context:
+        note += f"""For context only, part {index - 1} ended with the lines in <previous_part>. They are analyzed with part {index - 1}: do not count, list, summarize or score them.
+<previous_part>
+{context}
+</previous_part>
  
-        except json.JSONDecodeError as e:
-            return {"error": f"Failed to parse response: {str(e)}", "raw_response": summary_text}
+"""
+    return note
+
+
+def _finalize_summary(summary_dict: dict) -> dict:
+    """Rescale sentiment to 10 points, recompute the agent score and clean phone numbers."""
+    if "Sentiment_Scores" in summary_dict:
+        total = 10
+        pos = summary_dict["Sentiment_Scores"].get("Positive_Sentiment_Score", 0)
+        neg = summary_dict["Sentiment_Scores"].get("Negative_Sentiment_Score", 0)
+        neu = summary_dict["Sentiment_Scores"].get("Neutral_Sentiment_Score", 0)
+ 
+        current_sum = pos + neg + neu
+        if current_sum != total and current_sum > 0:
+            scale = total / current_sum
+            summary_dict["Sentiment_Scores"]["Positive_Sentiment_Score"] = round(pos * scale, 1)
+            summary_dict["Sentiment_Scores"]["Negative_Sentiment_Score"] = round(neg * scale, 1)
+            summary_dict["Sentiment_Scores"]["Neutral_Sentiment_Score"] = round(neu * scale, 1)
+ 
+        summary_dict["Sentiment_Scores"]["Total_Sentiment_Score"] = total
+ 
+    if "Sales_Agent_Score" in summary_dict:
+        scores = [
+            summary_dict["Sales_Agent_Score"].get("Professionalism", 0),
+            summary_dict["Sales_Agent_Score"].get("Product_Knowledge", 0),
+            summary_dict["Sales_Agent_Score"].get("Communication_Skills", 0),
+            summary_dict["Sales_Agent_Score"].get("Problem_Solving", 0)
+        ]
+        valid_scores = [s for s in scores if isinstance(s, (int, float))]
+        if valid_scores:
+            summary_dict["score"] = round(sum(valid_scores) / len(valid_scores))
+        else:
+            summary_dict["score"] = 0
  
-    except Exception as e:
-        return {"error": f"Unexpected error: {str(e)}"}
+    if "Customer" in summary_dict:
+        for field in ["Contact_Details", "Emergency_Contact_Details"]:
+            if field in summary_dict["Customer"] and summary_dict["Customer"][field] not in [None, "not provided"]:
+                cleaned = re.sub(r'[^\d]', '', str(summary_dict["Customer"][field]))
+                if len(cleaned) > 10:
+                    cleaned = cleaned[-10:]
+                summary_dict["Customer"][field] = cleaned if cleaned else "not provided"
+ 
+    return convert_floats_to_decimals(summary_dict)
+
+
+async def _analyze_transcript(prompt: str, on_text=None) -> dict:
+    """Run one summary prompt and return the parsed JSON, or a dict with an "error" key."""
+    response = await invoke_bedrock_claude(prompt, on_text=on_text, validate=text_parses(json.loads))
+ 
+    if "error" in response:
+        return {"error": response["error"]}
  
+    content = response.get("content", [])
+    if not content:
+        return {"error": "Empty response from Bedrock"}
  
+    summary_text = content[0].get("text", "")
+    if not summary_text:
+        return {"error": "No analysis generated"}
+ 
+    try:
+        return json.loads(summary_text)
+    except json.JSONDecodeError as e:
+        return {"error": f"Failed to parse response: {str(e)}", "raw_response": summary_text}
 
 
+async def _summarize_long_conversation(transcript_text: str, today_date: str) -> dict:
+    """
+    Summarize consecutive segments in parallel and merge the partial results in transcript order.
+
+    Segments do not overlap, so no statement is counted twice; the last SUMMARY_SEGMENT_OVERLAP
+    words of the previous segment are shown to the model as context it must not count.
+    """
+    segments = list(chunk_text(transcript_text, SUMMARY_SEGMENT_WORDS))
+    contexts = [""] + [
+        " ".join(segment.split()[-SUMMARY_SEGMENT_OVERLAP:]) if SUMMARY_SEGMENT_OVERLAP > 0 else ""
+        for segment in segments[:-1]
+    ]
+    semaphore = asyncio.Semaphore(SUMMARY_SEGMENT_CONCURRENCY)
+
+    async def analyze_segment(index, segment):
+        note = _segment_note(index, len(segments), contexts[index - 1])
+        async with semaphore:
+            return await _analyze_transcript(_summary_prompt(segment, today_date, note))
+
+    results = await asyncio.gather(*(analyze_segment(i, segment) for i, segment in enumerate(segments, start=1)))
+    parts, weights = [], []
+    for index, (segment, result) in enumerate(zip(segments, results), start=1):
+        if "error" in result:
+            print(f"⚠️ Summary of segment {index}/{len(segments)} failed: {result['error']}")
+            continue
+        parts.append(result)
+        weights.append(count_words(segment))
+    if not parts:
+        return results[0] if results else {"error": "Empty transcript"}
+    return merge_summaries(parts, weights)
+
+
+async def summarize_conversation_bedrock(transcript_text: str, today_date: str = None, on_text=None) -> dict:
+    """
+    Summarizes a Leap Finance call transcript using Claude 3 on AWS Bedrock
+
+    Transcripts over SUMMARY_LONG_CALL_WORDS words are split into segments that
+    are analyzed in parallel and merged with summary_merge.merge_summaries.
+ 
+    Args:
+        transcript_text: The conversation transcript to analyze
+        today_date: Reference date for analysis (YYYY-MM-DD format)
+        on_text: Optional callback streamed the model's JSON output as it is generated;
+            long calls are merged from segments, so they stream nothing
+ 
+    Returns:
+        Dictionary containing structured analysis of the conversation
+    """
+    if not today_date:
+        today_date = datetime.now().strftime("%Y-%m-%d")
+ 
+    try:
+        if count_words(transcript_text or "") > SUMMARY_LONG_CALL_WORDS:
+            summary_dict = await _summarize_long_conversation(transcript_text, today_date)
+        else:
+            summary_dict = await _analyze_transcript(_summary_prompt(transcript_text, today_date), on_text)
+        if "error" in summary_dict:
+            return summary_dict
+        return _finalize_summary(summary_dict)
+ 
+    except Exception as e:
+        return {"error": f"Unexpected error: {str(e)}"}
+
 def convert_floats_to_decimals(obj):
     """Recursively convert all floats in a structure to Decimals"""
     if isinstance(obj, float):
@@ -399,6 +438,7 @@ def convert_floats_to_decimals(obj):
 
 
 async def extract_text_from_pdf(pdf_file, file_name):
+    from PyPDF2 import PdfReader  # Imported on first use to keep app startup fast
     reader = PdfReader(pdf_file)
     content_chunks = []
  
@@ -422,6 +462,21 @@ async def extract_text_from_pdf(pdf_file, file_name):
     # print("Extracted and chunked content:", content_chunks)
     return content_chunks
    
+def format_duration(duration_seconds: float, format_type: str = "m.s") -> str:
+    """
+    Format a duration in seconds as M.S (e.g., 3.18) or float seconds (e.g., 198.12).
+    """
+    if format_type == "m.s":
+        minutes = int(duration_seconds // 60)  # Get minutes
+        seconds = int(duration_seconds % 60)   # Get remaining seconds
+        return f"{minutes}.{seconds}"  # Example: 3.18 (3 minutes 18 seconds)
+
+    elif format_type == "float":
+        return str(round(duration_seconds, 2))  # Example: 198.12
+
+    else:
+        raise ValueError("Invalid format_type. Choose 'm.s' or 'float'.")
+
 async def get_audio_duration(file_path: str, format_type: str = "m.s") -> str:
     """
     Get the duration of an audio file in M.S format (e.g., 3.18) or float seconds.
@@ -434,19 +489,15 @@ async def get_audio_duration(file_path: str, format_type: str = "m.s") -> str:
         str: Duration in the specified format.
     """
     try:
+        # Container headers are enough for the common formats, decode only as a fallback
+        metadata = probe_file(file_path)
+        if metadata and metadata.get("duration_seconds") is not None:
+            return format_duration(metadata["duration_seconds"], format_type)
+
+        from pydub import AudioSegment  # Only needed for formats the header probe can't read
         audio = AudioSegment.from_file(file_path)
         duration_seconds = len(audio) / 1000  # Convert milliseconds to seconds
- 
-        if format_type == "m.s":    
-            minutes = int(duration_seconds // 60)  # Get minutes
-            seconds = int(duration_seconds % 60)   # Get remaining seconds
-            return f"{minutes}.{seconds}"  # Example: 3.18 (3 minutes 18 seconds)
- 
-        elif format_type == "float":
-            return str(round(duration_seconds, 2))  # Example: 198.12
- 
-        else:
-            raise ValueError("Invalid format_type. Choose 'm.s' or 'float'.")
+        return format_duration(duration_seconds, format_type)
  
     except Exception as e:
         print(f"Error fetching audio duration: {e}")